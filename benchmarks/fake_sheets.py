@@ -0,0 +1,572 @@
+"""
+Google Sheets falso en memoria para medir sin red.
+
+Implementa, sobre un libro en memoria, los endpoints REST de la API de Sheets
+que usa gspread: metadatos del libro, values.get / batchGet / update /
+append / clear / batchUpdate y spreadsheets.batchUpdate (format). Se conecta
+como la ``requests.Session`` del cliente gspread, asi que todo lo demas es el
+codigo real: ``open_by_key``, ``worksheets``, ``worksheet``,
+``get_worksheet``, ``get_all_records``, ``get_all_values``, ``row_values``,
+``col_values``, ``update``, ``update_cell``, ``format``, ``clear``... pasan
+por ``QuotaAwareHTTPClient`` (token bucket, reintentos, instantanea por
+peticion, metricas y Server-Timing) igual que en produccion.
+
+Simula:
+
+- latencia por llamada (``latency``), mas ``latency_per_row`` por fila leida
+  o escrita, con ``jitter`` relativo;
+- cuota por minuto de lecturas y escrituras (``read_quota`` /
+  ``write_quota``): al superarla responde 429 como Google.
+
+Cuenta cada llamada por ``(operacion, hoja)`` con la misma clasificacion que
+las metricas de Prometheus (``sheets_metrics.classify``).
+
+Limitaciones: guarda los valores tal como llegan (no interpreta formulas ni
+USER_ENTERED), ``format`` no cambia nada y los rangos con nombre no existen.
+
+Uso::
+
+    backend = FakeSheetsBackend(build_workbook(socios=10000), latency=0.1)
+    install(backend)  # el cliente del proceso pasa a ser el falso
+"""
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from urllib.parse import unquote, urlsplit
+
+from capig_form.services.sheets_metrics import classify
+
+SPREADSHEET_ID = "benchmark-sheet"
+
+_CELL = re.compile(r"^([A-Za-z]*)(\d*)$")
+
+
+# ==========================
+# RANGOS A1
+# ==========================
+def col_letter(col):
+    """1 -> A, 27 -> AA."""
+    letters = ""
+    while col > 0:
+        col, rem = divmod(col - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def _col_number(letters):
+    number = 0
+    for char in letters.upper():
+        number = number * 26 + ord(char) - 64
+    return number
+
+
+def split_range(a1_range):
+    """"'HOJA'!A1:B2" -> ("HOJA", "A1:B2"); sin "!" es la hoja completa."""
+    a1_range = a1_range.strip()
+    if a1_range.startswith("'"):
+        pos = 1
+        while pos < len(a1_range):
+            if a1_range[pos] == "'":
+                if a1_range[pos + 1:pos + 2] == "'":
+                    pos += 2
+                    continue
+                break
+            pos += 1
+        title = a1_range[1:pos].replace("''", "'")
+        rest = a1_range[pos + 1:]
+        return title, rest[1:] if rest.startswith("!") else ""
+    if "!" in a1_range:
+        title, cells = a1_range.split("!", 1)
+        return title, cells
+    return a1_range, ""
+
+
+def _parse_cell(text):
+    match = _CELL.match(text.strip())
+    if match is None or not any(match.groups()):
+        raise ValueError(text)
+    letters, digits = match.groups()
+    return (_col_number(letters) if letters else None,
+            int(digits) if digits else None)
+
+
+def parse_cells(cells):
+    """
+    Limites 0-based semiabiertos ``(fila0, fila1, col0, col1)`` de "A1:B2",
+    "1:1", "B3:B", "A:A" o "A5"; los extremos abiertos vienen como None.
+    """
+    if not cells:
+        return 0, None, 0, None
+    start, _, end = cells.partition(":")
+    col0, row0 = _parse_cell(start)
+    if end:
+        col1, row1 = _parse_cell(end)
+    else:
+        col1, row1 = col0, row0
+    return ((row0 or 1) - 1, row1, (col0 or 1) - 1, col1)
+
+
+def _blank(value):
+    return value is None or str(value) == ""
+
+
+def _trim(row):
+    row = list(row)
+    while row and _blank(row[-1]):
+        row.pop()
+    return row
+
+
+# ==========================
+# LIBRO EN MEMORIA
+# ==========================
+class FakeWorksheet:
+    def __init__(self, title, rows, sheet_id, index):
+        self.title = title
+        self.rows = [list(row) for row in rows]
+        self.sheet_id = sheet_id
+        self.index = index
+
+    def properties(self):
+        width = max((len(row) for row in self.rows), default=0)
+        return {
+            "sheetId": self.sheet_id,
+            "title": self.title,
+            "index": self.index,
+            "sheetType": "GRID",
+            "gridProperties": {
+                "rowCount": max(len(self.rows) + 100, 1000),
+                "columnCount": max(width, 26),
+            },
+        }
+
+    def read(self, cells, render="FORMATTED_VALUE", major="ROWS"):
+        row0, row1, col0, col1 = parse_cells(cells)
+        values = []
+        for row in self.rows[row0:row1]:
+            cut = row[col0:col1]
+            if render not in ("UNFORMATTED_VALUE", "FORMULA"):
+                cut = ["" if value is None else str(value) for value in cut]
+            values.append(_trim(cut))
+        while values and not values[-1]:
+            values.pop()
+        if major == "COLUMNS":
+            width = max((len(row) for row in values), default=0)
+            values = [_trim(row[col] if col < len(row) else "" for row in values)
+                      for col in range(width)]
+            while values and not values[-1]:
+                values.pop()
+        return values
+
+    def write(self, row0, col0, values):
+        for offset, new in enumerate(values):
+            target = row0 + offset
+            while len(self.rows) <= target:
+                self.rows.append([])
+            row = self.rows[target]
+            if len(row) < col0 + len(new):
+                row.extend([""] * (col0 + len(new) - len(row)))
+            row[col0:col0 + len(new)] = list(new)
+
+    def last_row(self):
+        """Ultima fila con datos (1-based; 0 si la hoja esta vacia)."""
+        for number in range(len(self.rows), 0, -1):
+            if not all(_blank(value) for value in self.rows[number - 1]):
+                return number
+        return 0
+
+    def clear(self, cells):
+        if not cells:
+            self.rows = []
+            return
+        row0, row1, col0, col1 = parse_cells(cells)
+        for row in self.rows[row0:row1]:
+            end = len(row) if col1 is None else min(col1, len(row))
+            for col in range(col0, end):
+                row[col] = ""
+
+
+class FakeSpreadsheet:
+    def __init__(self, worksheets, spreadsheet_id=SPREADSHEET_ID, title="Benchmark"):
+        """``worksheets`` es una lista ordenada de ``(titulo, filas)``."""
+        self.id = spreadsheet_id
+        self.title = title
+        self.worksheets = [
+            FakeWorksheet(name, rows, sheet_id=1000 + pos, index=pos)
+            for pos, (name, rows) in enumerate(worksheets)
+        ]
+
+    def worksheet(self, title):
+        for worksheet in self.worksheets:
+            if worksheet.title == title:
+                return worksheet
+        return None
+
+    def metadata(self):
+        return {
+            "spreadsheetId": self.id,
+            "properties": {"title": self.title, "locale": "es_EC",
+                           "timeZone": "America/Guayaquil"},
+            "sheets": [{"properties": ws.properties()} for ws in self.worksheets],
+        }
+
+
+# ==========================
+# DATOS DE PRUEBA
+# ==========================
+CIUDADES = ("GUAYAQUIL", "QUITO", "CUENCA", "MANTA", "MACHALA", "DURAN")
+SECTORES = (
+    "ALIMENTOS", "BEBIDAS", "CONSTRUCCION", "METALMECANICA", "PLASTICOS",
+    "QUIMICOS", "TEXTIL", "MADERA", "PAPEL Y CARTON", "FARMACEUTICO",
+    "AGROINDUSTRIA", "ACUACULTURA", "LOGISTICA", "TECNOLOGIA", "SERVICIOS",
+)
+ESTADOS = ("ACTIVO", "INACTIVO", "SUSPENDIDO")
+ANIOS = ("2021", "2022", "2023", "2024")
+SERVICIO_HEADER = [
+    "FECHA", "HORA", "RUC", "RAZON_SOCIAL", "SERVICIO", "TEMA", "MODALIDAD",
+    "RESPONSABLE", "PARTICIPANTES", "DURACION", "OBSERVACIONES", "ESTADO",
+]
+
+
+def ruc_for(number):
+    """RUC de 13 digitos del socio ``number``."""
+    return f"09{number:08d}001"
+
+
+def build_workbook(socios=1000, seed=1, estado_ratio=0.5, ventas_por_socio=1):
+    """
+    Libro con las hojas que usa la app: EMPRESAS (primera hoja, columna B
+    desde la fila 3), SOCIOS (encabezado en la fila 2 con columnas por año),
+    ESTADO_SOCIO (una fila por ``estado_ratio`` de los socios),
+    VENTAS_SOCIO, SECTOR, ASESORIAS y CAPACITACIONES.
+    """
+    rng = random.Random(seed)
+    nombres = [f"EMPRESA {number:06d} {rng.choice(SECTORES)} S.A." for number in range(socios)]
+
+    empresas = [["LISTADO DE EMPRESAS"], ["NO", "RAZON_SOCIAL"]]
+    empresas += [[str(number + 1), nombre] for number, nombre in enumerate(nombres)]
+
+    socios_header = [
+        "RUC", "RAZON_SOCIAL", "FECHA_AFILIACION", "CIUDAD", "DIRECCION",
+        "TELEFONO_EMPRESA_1", "EMAIL", "NOMBRE_REP_LEGAL", "CARGO", "GENERO",
+        "NO._COLABORADORES", "SECTOR", "TAMAÑO", "ESTADO", *ANIOS,
+    ]
+    socios_rows = [["BASE DE SOCIOS"], socios_header]
+    estado_rows = [["RUC", "RAZON_SOCIAL", "FECHA_AFILIACION", "ESTADO", "CIUDAD",
+                    "ACTUALIZACION_ESTADO"]]
+    ventas_rows = [["REGISTRO DE VENTAS"], [
+        "RUC", "RAZON_SOCIAL", "CIUDAD", "FECHA_AFILIACION", "REGISTRO_VENTAS",
+        "COMPARATIVO", "MONTO_ESTIMADO", "OBSERVACIONES", "FECHA_REGISTRO", "ANIO",
+    ]]
+    for number, nombre in enumerate(nombres):
+        ruc = ruc_for(number)
+        ciudad = rng.choice(CIUDADES)
+        fecha = f"20{rng.randint(10, 24):02d}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        socios_rows.append([
+            ruc, nombre, fecha, ciudad, f"AV. {number} Y CALLE {number % 97}",
+            f"04{rng.randint(2000000, 2999999)}", f"contacto{number}@example.com",
+            f"REPRESENTANTE {number}", "GERENTE", rng.choice("MF"),
+            rng.randint(1, 500), rng.choice(SECTORES),
+            rng.choice(("MICRO", "PEQUEÑA", "MEDIANA", "GRANDE")),
+            rng.choice(ESTADOS),
+            *[rng.randint(10000, 5000000) for _ in ANIOS],
+        ])
+        if rng.random() < estado_ratio:
+            estado_rows.append([ruc, nombre, fecha, rng.choice(ESTADOS), ciudad,
+                                "2024-01-15 10:00"])
+        for _ in range(ventas_por_socio):
+            ventas_rows.append([
+                ruc, nombre, ciudad, fecha, "SI", rng.choice(("AUMENTO", "IGUAL", "DISMINUYO")),
+                rng.randint(10000, 5000000), "", "2024-02-01 09:30", rng.choice(ANIOS),
+            ])
+
+    return FakeSpreadsheet([
+        ("EMPRESAS", empresas),
+        ("SOCIOS", socios_rows),
+        ("ESTADO_SOCIO", estado_rows),
+        ("VENTAS_SOCIO", ventas_rows),
+        ("SECTOR", [["SECTOR"]] + [[sector] for sector in SECTORES]),
+        ("ASESORIAS", [SERVICIO_HEADER]),
+        ("CAPACITACIONES", [SERVICIO_HEADER]),
+    ])
+
+
+# ==========================
+# RESPUESTAS HTTP
+# ==========================
+class FakeResponse:
+    """Lo que gspread y el servicio leen de una ``requests.Response``."""
+
+    def __init__(self, status_code, payload, url, headers=None):
+        self.status_code = status_code
+        self.url = url
+        self.headers = dict(headers or {}, **{"Content-Type": "application/json"})
+        self.content = json.dumps(payload).encode("utf-8")
+        self.reason = "OK" if status_code < 400 else "Error"
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8")
+
+    def json(self):
+        # Cada llamada parsea de nuevo, como requests.
+        return json.loads(self.content)
+
+
+class _ApiError(Exception):
+    def __init__(self, code, status, message):
+        super().__init__(message)
+        self.code = code
+        self.status = status
+        self.message = message
+
+    def payload(self):
+        return {"error": {"code": self.code, "message": self.message, "status": self.status}}
+
+
+def _first(value):
+    if isinstance(value, (list, tuple)):
+        return value[0] if value else None
+    return value
+
+
+# ==========================
+# BACKEND
+# ==========================
+class FakeSheetsBackend:
+    def __init__(self, spreadsheet, latency=0.0, latency_per_row=0.0, jitter=0.0,
+                 read_quota=None, write_quota=None, quota_window=60.0, seed=1):
+        self.spreadsheets = {spreadsheet.id: spreadsheet}
+        self.latency = latency
+        self.latency_per_row = latency_per_row
+        self.jitter = jitter
+        self.quotas = {"read": read_quota, "write": write_quota}
+        self.quota_window = quota_window
+        self._random = random.Random(seed)
+        self._recent = {"read": deque(), "write": deque()}
+        self._lock = threading.Lock()
+        self.calls = Counter()
+        self.throttled = 0
+        self.rows = Counter()
+
+    # ---------- contadores ----------
+    def call_counts(self):
+        """Copia de ``{(operacion, hoja): llamadas}``, incluidas las rechazadas."""
+        with self._lock:
+            return dict(self.calls)
+
+    def stats(self):
+        with self._lock:
+            return {"calls": sum(self.calls.values()), "throttled": self.throttled,
+                    "rows_read": self.rows["read"], "rows_written": self.rows["written"]}
+
+    # ---------- transporte ----------
+    def handle(self, method, url, params=None, body=None):
+        """Atiende una llamada HTTP; devuelve ``FakeResponse``."""
+        method = method.upper()
+        params = {key: value for key, value in (params or {}).items() if value is not None}
+        kind = "read" if method == "GET" else "write"
+        with self._lock:
+            self.calls[classify(method, url, params, body)] += 1
+            throttled = self._over_quota(kind)
+            if throttled:
+                self.throttled += 1
+            else:
+                try:
+                    status, payload, rows = 200, *self._dispatch(method, url, params, body)
+                except _ApiError as exc:
+                    status, payload, rows = exc.code, exc.payload(), 0
+                self.rows["read" if kind == "read" else "written"] += rows
+        if throttled:
+            status, rows = 429, 0
+            payload = _ApiError(
+                429, "RESOURCE_EXHAUSTED",
+                f"Quota exceeded for quota metric '{kind.title()} requests'.").payload()
+        self._sleep(rows)
+        return FakeResponse(status, payload, url)
+
+    def _over_quota(self, kind):
+        limit = self.quotas[kind]
+        if not limit:
+            return False
+        now = time.monotonic()
+        recent = self._recent[kind]
+        while recent and now - recent[0] >= self.quota_window:
+            recent.popleft()
+        if len(recent) >= limit:
+            return True
+        recent.append(now)
+        return False
+
+    def _sleep(self, rows):
+        delay = self.latency + self.latency_per_row * rows
+        if delay <= 0:
+            return
+        if self.jitter:
+            with self._lock:
+                delay *= self._random.uniform(1 - self.jitter, 1 + self.jitter)
+        time.sleep(max(delay, 0.0))
+
+    # ---------- endpoints ----------
+    def _spreadsheet(self, spreadsheet_id):
+        spreadsheet = self.spreadsheets.get(spreadsheet_id)
+        if spreadsheet is None:
+            raise _ApiError(404, "NOT_FOUND", "Requested entity was not found.")
+        return spreadsheet
+
+    def _range(self, spreadsheet, a1_range):
+        title, cells = split_range(a1_range)
+        worksheet = spreadsheet.worksheet(title)
+        if worksheet is None:
+            raise _ApiError(400, "INVALID_ARGUMENT", f"Unable to parse range: {a1_range}")
+        try:
+            parse_cells(cells)
+        except ValueError:
+            raise _ApiError(400, "INVALID_ARGUMENT", f"Unable to parse range: {a1_range}")
+        return worksheet, cells
+
+    def _dispatch(self, method, url, params, body):
+        """``(payload, filas)`` de la llamada; lanza ``_ApiError``."""
+        path = urlsplit(url).path
+        if "/v4/spreadsheets/" not in path:
+            raise _ApiError(404, "NOT_FOUND", "Requested entity was not found.")
+        resource = path.split("/v4/spreadsheets/", 1)[1]
+        spreadsheet_id, _, rest = resource.partition("/")
+        if not rest:
+            spreadsheet_id, _, action = spreadsheet_id.partition(":")
+            spreadsheet = self._spreadsheet(unquote(spreadsheet_id))
+            if action == "batchUpdate" and method == "POST":
+                replies = [{} for _ in (body or {}).get("requests", [])]
+                return {"spreadsheetId": spreadsheet.id, "replies": replies}, 0
+            if not action and method == "GET":
+                return spreadsheet.metadata(), 0
+            raise _ApiError(400, "INVALID_ARGUMENT", f"Unsupported call {method} {path}")
+
+        spreadsheet = self._spreadsheet(unquote(spreadsheet_id))
+        if rest == "values:batchGet":
+            return self._batch_get(spreadsheet, params)
+        if rest == "values:batchUpdate":
+            return self._batch_update(spreadsheet, body or {})
+        if rest.startswith("values/"):
+            a1_range = rest[len("values/"):]
+            for suffix, handler in ((":append", self._append), (":clear", self._clear)):
+                if a1_range.endswith(suffix):
+                    return handler(spreadsheet, unquote(a1_range[:-len(suffix)]), params, body)
+            if method == "GET":
+                return self._get(spreadsheet, unquote(a1_range), params)
+            if method == "PUT":
+                return self._update(spreadsheet, unquote(a1_range), (body or {}).get("values", []))
+        raise _ApiError(400, "INVALID_ARGUMENT", f"Unsupported call {method} {path}")
+
+    def _value_range(self, spreadsheet, a1_range, params):
+        worksheet, cells = self._range(spreadsheet, a1_range)
+        major = _first(params.get("majorDimension")) or "ROWS"
+        values = worksheet.read(
+            cells, render=_first(params.get("valueRenderOption")) or "FORMATTED_VALUE",
+            major=major)
+        value_range = {"range": a1_range, "majorDimension": major}
+        if values:
+            value_range["values"] = values
+        return value_range, len(values)
+
+    def _get(self, spreadsheet, a1_range, params):
+        return self._value_range(spreadsheet, a1_range, params)
+
+    def _batch_get(self, spreadsheet, params):
+        ranges = params.get("ranges") or []
+        if isinstance(ranges, str):
+            ranges = [ranges]
+        value_ranges, rows = [], 0
+        for a1_range in ranges:
+            value_range, count = self._value_range(spreadsheet, a1_range, params)
+            value_ranges.append(value_range)
+            rows += count
+        return {"spreadsheetId": spreadsheet.id, "valueRanges": value_ranges}, rows
+
+    def _update(self, spreadsheet, a1_range, values):
+        worksheet, cells = self._range(spreadsheet, a1_range)
+        row0, _, col0, _ = parse_cells(cells)
+        worksheet.write(row0, col0, values)
+        return self._updated(spreadsheet, worksheet, row0, col0, values), len(values)
+
+    @staticmethod
+    def _updated(spreadsheet, worksheet, row0, col0, values):
+        width = max((len(row) for row in values), default=0)
+        title = worksheet.title.replace("'", "''")
+        end = f"{col_letter(col0 + max(width, 1))}{row0 + max(len(values), 1)}"
+        return {
+            "spreadsheetId": spreadsheet.id,
+            "updatedRange": f"'{title}'!{col_letter(col0 + 1)}{row0 + 1}:{end}",
+            "updatedRows": len(values),
+            "updatedColumns": width,
+            "updatedCells": sum(len(row) for row in values),
+        }
+
+    def _batch_update(self, spreadsheet, body):
+        responses, rows = [], 0
+        for item in body.get("data", []):
+            response, count = self._update(spreadsheet, item["range"], item.get("values", []))
+            responses.append(response)
+            rows += count
+        return {
+            "spreadsheetId": spreadsheet.id,
+            "totalUpdatedRows": rows,
+            "totalUpdatedCells": sum(r["updatedCells"] for r in responses),
+            "responses": responses,
+        }, rows
+
+    def _append(self, spreadsheet, a1_range, params, body):
+        worksheet, cells = self._range(spreadsheet, a1_range)
+        row0, _, col0, _ = parse_cells(cells)
+        values = (body or {}).get("values", [])
+        # Despues de la ultima fila con datos de la tabla que empieza en el rango.
+        target = max(worksheet.last_row(), row0)
+        worksheet.write(target, col0, values)
+        return {
+            "spreadsheetId": spreadsheet.id,
+            "tableRange": a1_range,
+            "updates": self._updated(spreadsheet, worksheet, target, col0, values),
+        }, len(values)
+
+    def _clear(self, spreadsheet, a1_range, params, body):
+        worksheet, cells = self._range(spreadsheet, a1_range)
+        worksheet.clear(cells)
+        return {"spreadsheetId": spreadsheet.id, "clearedRange": a1_range}, 0
+
+
+class FakeSession:
+    """Reemplazo de ``requests.Session`` para ``gspread.HTTPClient``."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.headers = {}
+
+    def request(self, method, url, params=None, data=None, json=None, files=None,
+                headers=None, timeout=None, **kwargs):
+        return self.backend.handle(method, url, params=params, body=json)
+
+    def close(self):
+        pass
+
+
+def install(backend):
+    """
+    Crea un cliente gspread real (con ``QuotaAwareHTTPClient``) sobre
+    ``backend`` y lo deja como cliente del proceso. Devuelve el cliente.
+    """
+    import gspread
+
+    from capig_form.services import google_sheets_service as service
+    from capig_form.services.sheets_client import QuotaAwareHTTPClient
+
+    client = gspread.authorize(None, http_client=QuotaAwareHTTPClient,
+                               session=FakeSession(backend))
+    service.set_client(client)
+    return client
@@ -0,0 +1,461 @@
+"""
+Benchmarks de busquedas, escrituras y vistas completas contra el Google
+Sheets falso en memoria (``fake_sheets.py``): sin red ni credenciales.
+
+Para cada tamaño de SOCIOS (``--rows``) arma un libro nuevo, calienta el
+proceso como el hook de gunicorn (hojas, indices, listas, autocompletado) y
+mide cada escenario: latencia (p50, p90, p99, max) y llamadas a la API por
+iteracion, por operacion. ``arranque_en_frio`` vacia antes las caches del
+proceso y la copia local. Las vistas se recorren con el cliente de pruebas
+de Django, con todos los middlewares.
+
+    python benchmarks/sheets_suite.py --rows 1000 10000 100000
+    python benchmarks/sheets_suite.py --latency 0.15 --save-baseline main
+    python benchmarks/sheets_suite.py --latency 0.15 --baseline main
+
+Las lineas base se guardan en benchmarks/baselines/<nombre>.json junto con
+la configuracion; solo se compara contra una linea base medida con la misma
+configuracion. No se incluye ninguna: se generan en el equipo donde se va a
+comparar (p. ej. en la rama principal antes de un cambio).
+
+Requiere las dependencias de la app (Django, gspread). Usa una base de datos
+de prueba en memoria y el outbox no se vacia solo. Las llamadas que hacen los
+hilos en segundo plano (refresco de indices y listas) se cuentan en la
+iteracion en que ocurren.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, namedtuple
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+BASELINES = Path(__file__).resolve().parent / "baselines"
+sys.path.insert(0, str(ROOT))
+
+from fake_sheets import (  # noqa: E402 - necesita la raiz en sys.path
+    ESTADOS,
+    SPREADSHEET_ID,
+    FakeSheetsBackend,
+    build_workbook,
+    install,
+    ruc_for,
+)
+from startup import _env  # noqa: E402
+
+Scenario = namedtuple("Scenario", ["name", "run", "prepare", "cold"])
+
+
+# ==========================
+# ENTORNO
+# ==========================
+def _setup_django():
+    os.environ.update(_env())
+    os.environ.update({
+        # El libro falso; se impone aunque el entorno tenga el real.
+        "SHEET_PATH": SPREADSHEET_ID,
+        "SHEETS_OUTBOX_AUTOFLUSH": "false",
+        "SHEETS_MIRROR_SYNC_INTERVAL": "0",
+        "SLOW_REQUEST_THRESHOLD_MS": "0",
+    })
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "capig_form.settings")
+
+    import django
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    django.setup()
+    setup_test_environment()
+    return connection, connection.creation.create_test_db(verbosity=0)
+
+
+def _settings_overrides(args, quota_db):
+    from django.test import override_settings
+
+    # Sin cuota simulada, el limitador local no debe ser lo que se mide.
+    return override_settings(
+        SHEETS_QUOTA_DB=quota_db,
+        SHEETS_READ_QUOTA_PER_MINUTE=args.read_quota or 10 ** 6,
+        SHEETS_WRITE_QUOTA_PER_MINUTE=args.write_quota or 10 ** 6,
+    )
+
+
+def _reset_worker_state():
+    """Worker recien arrancado y sin copia local: sin handles, indices ni listas."""
+    from capig_form.services import google_sheets_service as service
+    from forms import utils
+    from forms.models import SheetMirrorRow, SheetMirrorState
+    from forms.services import typeahead
+    from forms.services.sheet_index import all_indexes
+
+    service.invalidate_sheet_cache()
+    for index in all_indexes().values():
+        with index._lock:
+            index._loaded_at = index._full_loaded_at = index._data_time = None
+    with utils._listas_lock:
+        utils._listas.clear()
+    typeahead._estado = (None, None, None)
+    SheetMirrorRow.objects.all().delete()
+    SheetMirrorState.objects.all().delete()
+
+
+def _warm_up():
+    from forms.services import warmup
+
+    # Lo mismo que post_worker_init, salvo autenticar (el cliente es falso).
+    for nombre, paso in warmup.PASOS:
+        if nombre != "auth":
+            paso()
+
+
+# ==========================
+# ESCENARIOS
+# ==========================
+class Context:
+    """Datos del libro para elegir RUCs y consultas en cada iteracion."""
+
+    def __init__(self, spreadsheet, seed):
+        self.random = random.Random(seed)
+        self.sheet_id = spreadsheet.id
+        socios = spreadsheet.worksheet("SOCIOS").rows[2:]
+        con_estado = {row[0] for row in spreadsheet.worksheet("ESTADO_SOCIO").rows[1:]}
+        self.rucs = {
+            "socios": [row[0] for row in socios],
+            "estado": [row[0] for row in socios if row[0] in con_estado],
+            "sin_estado": [row[0] for row in socios if row[0] not in con_estado],
+        }
+        self.nombres = [row[1] for row in socios]
+        self._missing = 0
+
+    def ruc(self, kind="socios"):
+        return self.random.choice(self.rucs[kind] or self.rucs["socios"])
+
+    def ruc_inexistente(self):
+        self._missing += 1
+        return ruc_for(10 ** 8 - self._missing)
+
+    def consulta(self):
+        """Prefijo de una razon social, como lo teclea el usuario."""
+        nombre = self.random.choice(self.nombres)
+        return nombre[:self.random.randint(4, len(nombre))].lower()
+
+    def estado(self):
+        return self.random.choice(ESTADOS)
+
+    def fila_servicio(self):
+        return [self.random.choice(self.nombres), "DIAGNOSTICO", "FINANCIERO", "",
+                "Sí", "2024-05-02", "10:15:00"]
+
+    def ventas(self, ruc, anios=("2023", "2024")):
+        return [{
+            "ruc": ruc, "razon_social": "EMPRESA", "ciudad": "GUAYAQUIL",
+            "fecha_afiliacion": "2020-01-01", "registro_ventas": "SI",
+            "comparativo": "AUMENTO", "ventas_estimadas": "150000",
+            "observaciones": "", "anio": anio,
+        } for anio in anios]
+
+    def nuevo_afiliado(self):
+        self._missing += 1
+        return {
+            "razon_social": f"NUEVA EMPRESA {self._missing}", "ruc": self.ruc_inexistente(),
+            "ciudad": "QUITO", "direccion": "AV. AMAZONAS", "telefono": "022000000",
+            "email": "nueva@example.com", "representante": "REPRESENTANTE",
+            "cargo": "GERENTE", "genero": "F", "colaboradores": "12",
+            "sector": "SERVICIOS", "tamano": "PEQUEÑA", "estado": "ACTIVO",
+            "fecha_afiliacion": "2024-05-02",
+        }
+
+
+def _ok(result):
+    """Falla la iteracion si la operacion o la vista fallo."""
+    status = getattr(result, "status_code", None)
+    if result is False or (status is not None and status >= 500):
+        raise RuntimeError(f"La operacion fallo: {status or result}")
+    return result
+
+
+def _scenarios():
+    from django.test import Client
+    from django.urls import reverse
+
+    from capig_form.services.google_sheets_service import insert_rows_to_sheet
+    from forms import utils
+    from forms.afiliacion_handler import guardar_nuevo_afiliado_en_google_sheets
+    from forms.services import outbox
+    from forms.services.typeahead import buscar_empresas
+
+    client = Client()
+
+    def arranque_en_frio(ctx):
+        utils.buscar_afiliado_por_ruc(ctx.ruc("estado"))
+        utils.obtener_sectores()
+        buscar_empresas(ctx.consulta())
+
+    def actualizar_estado(ctx):
+        ruc = ctx.ruc("estado")
+        utils.actualizar_estado_afiliado(
+            ruc, ctx.estado(), afiliado=utils.buscar_afiliado_por_ruc(ruc))
+
+    def llenar_outbox(ctx):
+        outbox.flush_outbox()
+        for _ in range(10):
+            outbox.submit("insert_row", {
+                "sheet_id": ctx.sheet_id, "worksheet": "CAPACITACIONES",
+                "row": ctx.fila_servicio()}, queue="CAPACITACIONES")
+
+    def vista_asesoria(ctx):
+        return client.post(reverse("forms:diag_form"), {
+            "razon_social": ctx.random.choice(ctx.nombres),
+            "tipo_diagnostico": "FINANCIERO", "se_diagnostico": "true"})
+
+    return [
+        # Lecturas con el proceso caliente.
+        Scenario("busqueda_estado", lambda ctx: utils.buscar_afiliado_por_ruc(ctx.ruc("estado")),
+                 None, False),
+        Scenario("busqueda_solo_socios",
+                 lambda ctx: utils.buscar_afiliado_por_ruc(ctx.ruc("sin_estado")), None, False),
+        Scenario("busqueda_inexistente",
+                 lambda ctx: utils.buscar_afiliado_por_ruc(ctx.ruc_inexistente()), None, False),
+        Scenario("historial_ventas", lambda ctx: utils.obtener_ventas_por_ruc(ctx.ruc()),
+                 None, False),
+        Scenario("autocompletado", lambda ctx: buscar_empresas(ctx.consulta()), None, False),
+        Scenario("arranque_en_frio", arranque_en_frio,
+                 lambda ctx: _reset_worker_state(), True),
+        # Escrituras directas (lo que hace el outbox al vaciarse).
+        Scenario("actualizar_estado", actualizar_estado, None, False),
+        Scenario("insertar_asesoria", lambda ctx: _ok(insert_rows_to_sheet(
+            ctx.sheet_id, "ASESORIAS", [ctx.fila_servicio()])), None, False),
+        Scenario("guardar_ventas",
+                 lambda ctx: utils.guardar_ventas_afiliado_bulk(ctx.ventas(ctx.ruc())),
+                 None, False),
+        Scenario("nuevo_afiliado", lambda ctx: _ok(
+            guardar_nuevo_afiliado_en_google_sheets(ctx.nuevo_afiliado())), None, False),
+        Scenario("vaciar_outbox_10", lambda ctx: outbox.flush_outbox(), llenar_outbox, False),
+        # Vistas completas (middlewares, sesion, plantillas).
+        Scenario("vista_estado_busqueda", lambda ctx: _ok(client.post(
+            reverse("forms:estado_afiliado"), {"ruc": ctx.ruc()})), None, False),
+        Scenario("vista_estado_actualizar", lambda ctx: _ok(client.post(
+            reverse("forms:estado_afiliado"), {"ruc": ctx.ruc(), "estado": ctx.estado()})),
+                 None, False),
+        Scenario("vista_ventas_busqueda", lambda ctx: _ok(client.post(
+            reverse("forms:ventas_afiliado"), {"ruc": ctx.ruc()})), None, False),
+        Scenario("vista_asesoria_envio", lambda ctx: _ok(vista_asesoria(ctx)), None, False),
+        Scenario("vista_autocompletado", lambda ctx: _ok(client.get(
+            reverse("forms:empresas_autocomplete"), {"q": ctx.consulta()})), None, False),
+        Scenario("vista_nuevo_afiliado", lambda ctx: _ok(client.get(
+            reverse("forms:nuevo_afiliado"))), None, False),
+    ]
+
+
+# ==========================
+# MEDICION
+# ==========================
+def _percentile(values, q):
+    """Percentil por rango mas cercano de una lista ordenada."""
+    return values[min(len(values) - 1, max(math.ceil(q * len(values)) - 1, 0))]
+
+
+def _summary(latencies, calls, throttled, iterations):
+    values = sorted(latencies)
+    by_operation = Counter()
+    for (operation, _worksheet), count in calls.items():
+        by_operation[operation] += count
+    return {
+        "iterations": iterations,
+        "p50_ms": _percentile(values, 0.50) * 1000,
+        "p90_ms": _percentile(values, 0.90) * 1000,
+        "p99_ms": _percentile(values, 0.99) * 1000,
+        "max_ms": values[-1] * 1000,
+        "mean_ms": sum(values) / len(values) * 1000,
+        "calls_per_iteration": sum(calls.values()) / iterations,
+        "calls_by_operation": {op: count / iterations
+                               for op, count in sorted(by_operation.items())},
+        "calls_by_worksheet": {f"{op}:{ws or '-'}": count / iterations
+                               for (op, ws), count in sorted(calls.items())},
+        "throttled": throttled,
+    }
+
+
+def run_scenario(scenario, backend, ctx, iterations):
+    if scenario.cold:
+        iterations = max(iterations // 10, 3)
+    latencies, calls, throttled = [], Counter(), 0
+    for _ in range(iterations):
+        if scenario.prepare is not None:
+            scenario.prepare(ctx)
+        before, throttled_before = backend.call_counts(), backend.stats()["throttled"]
+        start = time.perf_counter()
+        scenario.run(ctx)
+        latencies.append(time.perf_counter() - start)
+        calls.update(backend.call_counts())
+        calls.subtract(before)
+        throttled += backend.stats()["throttled"] - throttled_before
+    calls = Counter({key: count for key, count in calls.items() if count})
+    return _summary(latencies, calls, throttled, iterations)
+
+
+def run_size(rows, args, only=None):
+    spreadsheet = build_workbook(socios=rows, seed=args.seed)
+    backend = FakeSheetsBackend(
+        spreadsheet, latency=args.latency, latency_per_row=args.latency_per_row,
+        jitter=args.jitter, read_quota=args.read_quota, write_quota=args.write_quota,
+        seed=args.seed)
+    install(backend)
+    _reset_worker_state()
+    _warm_up()
+
+    ctx = Context(spreadsheet, args.seed)
+    results = {}
+    for scenario in _scenarios():
+        if only and scenario.name not in only:
+            continue
+        results[scenario.name] = run_scenario(scenario, backend, ctx, args.iterations)
+        if scenario.cold:
+            # Los siguientes escenarios vuelven a medir con el proceso caliente.
+            _warm_up()
+    return results
+
+
+# ==========================
+# REPORTE Y LINEAS BASE
+# ==========================
+def _config(args):
+    return {
+        "latency": args.latency,
+        "latency_per_row": args.latency_per_row,
+        "jitter": args.jitter,
+        "read_quota": args.read_quota,
+        "write_quota": args.write_quota,
+        "seed": args.seed,
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              check=True, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _operations(summary):
+    return " ".join(f"{op}={count:.2f}" for op, count in summary["calls_by_operation"].items()
+                    if count >= 0.01)
+
+
+def _report(results, config):
+    print(f"Latencia simulada: {config['latency'] * 1000:.0f} ms + "
+          f"{config['latency_per_row'] * 1000:.3f} ms/fila (jitter {config['jitter']:.0%}); "
+          f"cuota lectura={config['read_quota'] or '-'} escritura={config['write_quota'] or '-'}")
+    for rows, scenarios in results.items():
+        print(f"\n== SOCIOS = {rows} filas")
+        print(f"{'escenario':<26}{'n':>5}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}"
+              f"{'max ms':>10}{'llamadas':>10}{'429':>5}  operaciones")
+        for name, s in scenarios.items():
+            print(f"{name:<26}{s['iterations']:>5}{s['p50_ms']:>10.1f}{s['p90_ms']:>10.1f}"
+                  f"{s['p99_ms']:>10.1f}{s['max_ms']:>10.1f}{s['calls_per_iteration']:>10.2f}"
+                  f"{s['throttled']:>5}  {_operations(s)}")
+
+
+def _delta(now, before):
+    if not before:
+        return "   n/a"
+    return f"{(now - before) / before:+6.0%}"
+
+
+def _compare(results, baseline):
+    print(f"\n== Comparacion con la linea base '{baseline['name']}' "
+          f"(rev {baseline.get('git_revision') or '?'}, {baseline['created_at']})")
+    print(f"{'filas':>7} {'escenario':<26}{'p50 ms':>16}{'p90 ms':>16}{'llamadas':>14}")
+    for rows, scenarios in results.items():
+        base_scenarios = baseline["results"].get(str(rows), {})
+        for name, s in scenarios.items():
+            b = base_scenarios.get(name)
+            if b is None:
+                continue
+            print(f"{rows:>7} {name:<26}"
+                  f"{s['p50_ms']:>9.1f}{_delta(s['p50_ms'], b['p50_ms'])}"
+                  f"{s['p90_ms']:>9.1f}{_delta(s['p90_ms'], b['p90_ms'])}"
+                  f"{s['calls_per_iteration']:>7.2f} ({b['calls_per_iteration']:.2f})")
+
+
+def _load_baseline(name, config):
+    path = BASELINES / f"{name}.json"
+    if not path.exists():
+        raise SystemExit(f"No existe la linea base {path}.")
+    baseline = json.loads(path.read_text(encoding="utf-8"))
+    if baseline["config"] != config:
+        raise SystemExit(
+            f"La linea base '{name}' se midio con otra configuracion: {baseline['config']}")
+    return baseline
+
+
+def _save_baseline(name, results, config):
+    BASELINES.mkdir(exist_ok=True)
+    path = BASELINES / f"{name}.json"
+    path.write_text(json.dumps({
+        "name": name,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "config": config,
+        "results": {str(rows): scenarios for rows, scenarios in results.items()},
+    }, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"\nLinea base guardada en {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000],
+                        help="Filas de SOCIOS (un libro por tamaño).")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--scenario", action="append",
+                        help="Solo estos escenarios (se puede repetir).")
+    parser.add_argument("--latency", type=float, default=0.1,
+                        help="Segundos por llamada a la API.")
+    parser.add_argument("--latency-per-row", type=float, default=0.00002,
+                        help="Segundos extra por fila leida o escrita.")
+    parser.add_argument("--jitter", type=float, default=0.2,
+                        help="Variacion relativa de la latencia (0.2 = +-20%%).")
+    parser.add_argument("--read-quota", type=int, default=0,
+                        help="Lecturas por minuto antes de responder 429 (0 = sin limite).")
+    parser.add_argument("--write-quota", type=int, default=0,
+                        help="Escrituras por minuto antes de responder 429 (0 = sin limite).")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="Salida en JSON.")
+    parser.add_argument("--save-baseline", metavar="NOMBRE")
+    parser.add_argument("--baseline", metavar="NOMBRE",
+                        help="Compara contra benchmarks/baselines/NOMBRE.json.")
+    args = parser.parse_args()
+
+    config = _config(args)
+    baseline = _load_baseline(args.baseline, config) if args.baseline else None
+    connection, test_db = _setup_django()
+    try:
+        with tempfile.TemporaryDirectory() as tmp, \
+                _settings_overrides(args, os.path.join(tmp, "quota.sqlite3")):
+            results = {rows: run_size(rows, args, only=args.scenario) for rows in args.rows}
+    finally:
+        connection.creation.destroy_test_db(test_db, verbosity=0)
+
+    if args.json:
+        print(json.dumps({"config": config,
+                          "results": {str(rows): s for rows, s in results.items()}}, indent=2))
+    else:
+        _report(results, config)
+    if baseline is not None:
+        _compare(results, baseline)
+    if args.save_baseline:
+        _save_baseline(args.save_baseline, results, config)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Tiempo de arranque: importacion de Django + URLconf (lo que paga cada worker
+de gunicorn y cada ``manage.py``) y si ese arranque carga gspread/google-auth.
+
+Cada medicion corre en un proceso nuevo para no medir modulos ya cargados.
+Con ``--compare REV`` mide tambien otra revision (p. ej. la anterior a la
+carga diferida del servicio) en un ``git worktree`` temporal:
+
+    python benchmarks/startup.py --runs 20
+    python benchmarks/startup.py --runs 20 --compare HEAD~1
+
+Si el entorno no define SECRET_KEY, ENVIRONMENT, SHEET_PATH o SERVICE se usan
+valores de prueba (SERVICE con campos ficticios: nunca se llama a Google).
+"""
+import argparse
+import base64
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Se ejecuta en un proceso hijo con cwd = raiz del arbol medido.
+PROBE = r"""
+import json, os, sys, time
+sys.path.insert(0, os.getcwd())
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "capig_form.settings")
+t0 = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+t1 = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+t2 = time.perf_counter()
+print(json.dumps({
+    "setup": t1 - t0,
+    "urlconf": t2 - t1,
+    "total": t2 - t0,
+    "gspread_loaded": "gspread" in sys.modules,
+    "google_auth_loaded": "google.oauth2" in sys.modules,
+}))
+"""
+
+PHASES = ("setup", "urlconf", "total", "manage_check")
+
+
+def _env():
+    env = dict(os.environ)
+    fake_service = base64.b64encode(json.dumps({
+        "type": "service_account",
+        "project_id": "benchmark",
+        "private_key": "benchmark",
+        "client_email": "benchmark@example.invalid",
+    }).encode()).decode()
+    env.setdefault("SECRET_KEY", "benchmark")
+    env.setdefault("ENVIRONMENT", "dev")
+    env.setdefault("SHEET_PATH", "benchmark")
+    env.setdefault("SERVICE", fake_service)
+    # No arrancar hilos en segundo plano durante la medicion.
+    env.setdefault("SHEETS_MIRROR_SYNC_INTERVAL", "0")
+    return env
+
+
+def _run_probe(tree, env):
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=tree, env=env,
+        check=True, capture_output=True, text=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def _run_manage_check(tree, env):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "manage.py", "check"], cwd=tree, env=env,
+                   check=True, capture_output=True)
+    return time.perf_counter() - start
+
+
+def measure(tree, runs):
+    env = _env()
+    samples = {phase: [] for phase in PHASES}
+    flags = {}
+    for _ in range(runs):
+        result = _run_probe(tree, env)
+        for phase in ("setup", "urlconf", "total"):
+            samples[phase].append(result[phase])
+        flags = {k: v for k, v in result.items() if k.endswith("_loaded")}
+        samples["manage_check"].append(_run_manage_check(tree, env))
+    return samples, flags
+
+
+def _summary(values):
+    values = sorted(values)
+    p90 = values[min(len(values) - 1, int(round(0.9 * (len(values) - 1))))]
+    return {"min": values[0], "median": statistics.median(values), "p90": p90}
+
+
+def _report(label, samples, flags):
+    print(f"\n== {label}")
+    print(f"{'fase':<14}{'min ms':>10}{'mediana ms':>12}{'p90 ms':>10}")
+    for phase in PHASES:
+        s = _summary(samples[phase])
+        print(f"{phase:<14}{s['min'] * 1000:>10.1f}{s['median'] * 1000:>12.1f}"
+              f"{s['p90'] * 1000:>10.1f}")
+    for name, loaded in flags.items():
+        print(f"{name}: {loaded}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--compare", metavar="REV",
+                        help="Revision de git a medir tambien (p. ej. HEAD~1).")
+    parser.add_argument("--json", action="store_true", help="Salida en JSON.")
+    args = parser.parse_args()
+
+    results = {"actual": measure(ROOT, args.runs)}
+    if args.compare:
+        with tempfile.TemporaryDirectory() as tmp:
+            tree = Path(tmp) / "tree"
+            subprocess.run(["git", "worktree", "add", "--detach", str(tree), args.compare],
+                           cwd=ROOT, check=True, capture_output=True)
+            try:
+                results[args.compare] = measure(tree, args.runs)
+            finally:
+                subprocess.run(["git", "worktree", "remove", "--force", str(tree)],
+                               cwd=ROOT, check=False, capture_output=True)
+
+    if args.json:
+        print(json.dumps({
+            label: {"phases": {p: _summary(v) for p, v in samples.items()}, **flags}
+            for label, (samples, flags) in results.items()
+        }, indent=2))
+        return
+    for label, (samples, flags) in results.items():
+        _report(label, samples, flags)
+
+
+if __name__ == "__main__":
+    main()
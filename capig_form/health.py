@@ -1,4 +1,8 @@
-from django.http import JsonResponse
+import hmac
+import os
+
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 
@@ -11,3 +15,99 @@ def health_check(request):
     Retorna 200 OK si la aplicación está funcionando correctamente.
     """
     return JsonResponse({"status": "healthy"}, status=200)
+
+
+def _es_interno(request):
+    """
+    True si la peticion puede ver los detalles internos: trae el token de
+    INTERNAL_ENDPOINTS_TOKEN como "Authorization: Bearer <token>", o no hay
+    token configurado y DEBUG esta activo (desarrollo local).
+    """
+    token = getattr(settings, "INTERNAL_ENDPOINTS_TOKEN", "")
+    if not token:
+        return settings.DEBUG
+    esquema, _, enviado = request.headers.get("Authorization", "").partition(" ")
+    return esquema.lower() == "bearer" and hmac.compare_digest(enviado.strip(), token)
+
+
+def _edad(segundos):
+    return round(segundos, 1) if segundos is not None else None
+
+
+@csrf_exempt
+@require_http_methods(["GET", "HEAD"])
+def readiness_check(request):
+    """
+    Readiness del worker: 200 cuando tiene datos que servir (indices y
+    listas, de Google o de la copia local), 503 durante el primer
+    calentamiento o si no hay datos. Si el calentamiento fallo o esta
+    desactivado cuenta lo que ya cargaron las peticiones, y el fallido se
+    reintenta cada SHEETS_WARMUP_RETRY_INTERVAL segundos. Con el token
+    interno (ver ``_es_interno``) informa ademas la edad de cada cache y la
+    ultima llamada a Sheets ("degraded" si fallo: se sirven datos en cache);
+    sin el solo responde el status.
+    """
+    from capig_form.services.google_sheets_service import get_client_stats, get_last_call
+    from forms.services import warmup
+    from forms.services.sheet_index import all_indexes
+    from forms.services.sheet_mirror import last_synced_age
+    from forms.utils import edades_listas
+
+    if warmup.retry_due():
+        # Sin hook de gunicorn (runserver, otro servidor) o tras un fallo; a
+        # lo sumo un intento cada SHEETS_WARMUP_RETRY_INTERVAL segundos.
+        warmup.warm_up(wait=0)
+    state = warmup.get_state()
+
+    last_call = get_last_call()
+    primer_calentamiento = state["status"] == warmup.RUNNING and state["attempts"] <= 1
+    listo = not primer_calentamiento and warmup.hay_datos()
+    if not listo:
+        status = "warming" if state["status"] == warmup.RUNNING else "not_ready"
+    elif state["status"] == warmup.FAILED or (last_call is not None and not last_call["ok"]):
+        status = "degraded"
+    else:
+        status = "ready"
+    codigo = 200 if listo else 503
+
+    if not _es_interno(request):
+        return JsonResponse({"status": status}, status=codigo)
+    indices = {
+        nombre: {
+            "age": _edad(index.age()),
+            "source": index.source,
+            "rows": len(index._records),
+        }
+        for nombre, index in all_indexes().items()
+    }
+    return JsonResponse({
+        "status": status,
+        "pid": os.getpid(),
+        "warmup": state,
+        "caches": {
+            "indices": indices,
+            "listas": {nombre: _edad(edad) for nombre, edad in edades_listas().items()},
+            "mirror_age": _edad(last_synced_age()),
+        },
+        "sheets": {"last_call": last_call, "stats": get_client_stats()},
+    }, status=codigo)
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def metrics_view(request):
+    """
+    Metricas de las llamadas a Google Sheets en formato de texto de
+    Prometheus. Requiere el token interno (ver ``_es_interno``).
+    """
+    from capig_form.services import sheets_metrics
+
+    if not _es_interno(request):
+        return HttpResponse(status=403)
+
+    rendered = sheets_metrics.render()
+    if rendered is None:
+        return HttpResponse("prometheus_client no esta instalado o las metricas estan desactivadas.\n",
+                            status=501, content_type="text/plain")
+    body, content_type = rendered
+    return HttpResponse(body, content_type=content_type)
@@ -0,0 +1,90 @@
+import json
+import logging
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from capig_form.services import request_timing
+from capig_form.services.google_sheets_service import sheet_snapshot
+
+slow_request_logger = logging.getLogger("capig_form.slow_requests")
+
+
+class ServerTimingMiddleware:
+    """
+    Mide cada peticion (va primero en MIDDLEWARE para contar todo) y agrega
+    el header ``Server-Timing`` con los tramos de ``request_timing``: auth,
+    lecturas/escrituras/descubrimiento de Sheets, outbox, render y total.
+    Si la peticion supera SLOW_REQUEST_THRESHOLD_MS escribe una linea JSON en
+    el logger ``capig_form.slow_requests`` con los tramos y las llamadas a
+    Sheets por hoja. Como SheetSnapshotMiddleware, atiende en modo async sin
+    pasar la peticion a un hilo.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with request_timing.collect() as timing:
+            response = self.get_response(request)
+        return self._finish(request, response, timing)
+
+    async def __acall__(self, request):
+        with request_timing.collect() as timing:
+            response = await self.get_response(request)
+        return self._finish(request, response, timing)
+
+    def _finish(self, request, response, timing):
+        total = timing.elapsed()
+        if getattr(settings, "SERVER_TIMING_ENABLED", False):
+            response["Server-Timing"] = timing.header(total)
+        threshold = getattr(settings, "SLOW_REQUEST_THRESHOLD_MS", 2000)
+        if threshold and total * 1000 >= threshold:
+            self._log_slow_request(request, response, total, timing)
+        return response
+
+    def _log_slow_request(self, request, response, total, timing):
+        match = getattr(request, "resolver_match", None)
+        entry = {
+            "event": "slow_request",
+            "method": request.method,
+            "path": request.path,
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            "total_ms": round(total * 1000, 1),
+        }
+        entry.update(timing.as_dict())
+        slow_request_logger.warning(json.dumps(entry, ensure_ascii=False))
+
+
+class SheetSnapshotMiddleware:
+    """
+    Abre una instantanea de Google Sheets por peticion: las lecturas repetidas
+    de la misma hoja dentro de una vista salen de memoria. Funciona en modo
+    sincronico y async: bajo ASGI las vistas async no pasan por un hilo.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with sheet_snapshot():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with sheet_snapshot():
+            return await self.get_response(request)
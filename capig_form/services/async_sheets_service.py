@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+Variante asyncio del servicio de Google Sheets para el punto de entrada ASGI.
+
+Habla directo con la API REST de Sheets mediante un ``httpx.AsyncClient`` con
+pool de conexiones (uno por event loop), asi una llamada lenta no ocupa un
+hilo. Comparte con ``google_sheets_service`` las credenciales, el token
+bucket entre workers, la politica de reintentos (429/5xx con backoff y
+Retry-After), los contadores y la instantanea por peticion; los errores de
+la API se lanzan como ``gspread.exceptions.APIError`` igual que en la
+version sincronica. Como el servicio sincronico, no importa gspread ni
+google-auth hasta la primera llamada.
+"""
+import asyncio
+import logging
+import time
+import weakref
+
+from django.conf import settings
+
+from capig_form.services import google_sheets_service as sheets
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - dependencia opcional
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+SHEETS_API = "https://sheets.googleapis.com/v4/spreadsheets"
+
+# Un cliente y un lock de token por event loop: ni el AsyncClient ni el
+# asyncio.Lock pueden usarse desde otro loop.
+_clients = weakref.WeakKeyDictionary()
+_token_locks = weakref.WeakKeyDictionary()
+
+
+# ==========================
+# CLIENTE HTTP
+# ==========================
+def _get_async_client():
+    if httpx is None:
+        raise RuntimeError("El cliente async de Google Sheets requiere httpx.")
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            base_url=SHEETS_API,
+            timeout=getattr(settings, "SHEETS_ASYNC_TIMEOUT", 30.0),
+            limits=httpx.Limits(
+                max_connections=getattr(settings, "SHEETS_ASYNC_MAX_CONNECTIONS", 20)),
+        )
+        _clients[loop] = client
+    return client
+
+
+async def _auth_header():
+    """Cabecera Authorization; el intercambio de token se hace en un hilo."""
+    from google.auth.transport.requests import Request
+
+    creds = sheets.get_credentials()
+    if not creds.valid:
+        loop = asyncio.get_running_loop()
+        token_lock = _token_locks.get(loop)
+        if token_lock is None:
+            token_lock = _token_locks[loop] = asyncio.Lock()
+        async with token_lock:
+            if not creds.valid:
+                # SharedCredentials serializa el refresh con los hilos sincronicos.
+                await asyncio.to_thread(creds.refresh, Request())
+    return {"Authorization": f"Bearer {creds.token}"}
+
+
+async def _acquire(bucket):
+    """
+    Como SharedTokenBucket.acquire, pero esperando con asyncio.sleep. El
+    bucket es una transaccion SQLite que puede esperar el lock de otro worker
+    (hasta 10 s): se consulta en un hilo para no frenar el event loop.
+    """
+    waited = 0.0
+    while True:
+        wait = await asyncio.to_thread(bucket.try_acquire)
+        if not wait:
+            if waited:
+                sheets._count("limiter_waits")
+            return
+        if waited + wait > bucket.max_wait:
+            logger.warning("Cuota local '%s' agotada tras %.1fs; se llama igual.",
+                           bucket.name, waited)
+            return
+        await asyncio.sleep(wait)
+        waited += wait
+
+
+async def request(method, path, params=None, json=None):
+    """
+    Llamada a la API de Sheets con cuota compartida y reintentos. Devuelve el
+    JSON de la respuesta. Dentro de ``sheet_snapshot()`` las lecturas GET
+    identicas se sirven desde memoria y las escrituras vacian la instantanea.
+    """
+    from gspread.exceptions import APIError
+
+    is_read = method.upper() == "GET"
+    snapshot = sheets._snapshot.get()
+    key = None
+    if snapshot is not None:
+        if not is_read:
+            snapshot.clear()
+        else:
+            key = sheets._snapshot_key(path, {"params": params})
+            if key in snapshot:
+                sheets._count("snapshot_hits")
+                return snapshot[key]
+
+    bucket = sheets._bucket("read" if is_read else "write")
+    retryable = sheets.RETRYABLE_READ_STATUS if is_read else sheets.RETRYABLE_WRITE_STATUS
+    max_retries = getattr(settings, "SHEETS_MAX_RETRIES", 5)
+    client = _get_async_client()
+    attempt = 0
+
+    while True:
+        await _acquire(bucket)
+        headers = await _auth_header()
+        start = time.monotonic()
+        try:
+            response = await client.request(
+                method, path, params=params, json=json, headers=headers)
+            sheets._record_call(
+                method, path, response.status_code, time.monotonic() - start,
+                error=None if response.status_code < 400 else APIError(response),
+                params=params, body=json, response=response)
+            if response.status_code < 400:
+                data = response.json() if response.content else {}
+                if key is not None:
+                    snapshot[key] = data
+                return data
+            if response.status_code not in retryable or attempt >= max_retries:
+                raise APIError(response)
+            delay = sheets._backoff_delay(attempt, sheets._retry_after(response))
+            if response.status_code == 429:
+                sheets._count("throttled")
+                await asyncio.to_thread(bucket.penalize, delay)
+        except httpx.TransportError as exc:
+            # Conexion, timeout, lectura cortada o protocolo: como cualquier
+            # requests.ConnectionError en el cliente sincronico.
+            sheets._record_call(method, path, None, time.monotonic() - start,
+                                error=exc, params=params, body=json)
+            if not is_read or attempt >= max_retries:
+                raise
+            delay = sheets._backoff_delay(attempt)
+
+        sheets._count("retried")
+        logger.warning("Reintentando %s %s en %.1fs (intento %s).",
+                       method, path, delay, attempt + 1)
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+async def _title(sheet_id, worksheet_name):
+    """
+    Titulo real de la hoja, resuelto como en ``get_google_sheet`` (sin
+    distinguir mayusculas ni espacios sobrantes). Sale de la cache de handles;
+    si no esta, el descubrimiento de hojas se hace en un hilo.
+    """
+    key = (sheet_id, sheets._normalize_title(worksheet_name))
+    worksheet = sheets._cache_lookup(sheets._worksheet_cache, key)
+    if worksheet is None:
+        worksheet = await asyncio.to_thread(sheets.get_google_sheet, sheet_id, worksheet_name)
+    return worksheet.title
+
+
+# ==========================
+# LECTURA
+# ==========================
+async def values_batch_get(sheet_id, ranges, value_render_option="UNFORMATTED_VALUE",
+                           major_dimension="ROWS"):
+    """Igual que ``google_sheets_service.values_batch_get``, sin bloquear."""
+    from gspread.utils import absolute_range_name
+
+    if not ranges:
+        return []
+    titles = [await _title(sheet_id, worksheet) for worksheet, _ in ranges]
+    response = await request("GET", f"/{sheet_id}/values:batchGet", params={
+        "ranges": [absolute_range_name(title, rng)
+                   for title, (_, rng) in zip(titles, ranges)],
+        "valueRenderOption": value_render_option,
+        "majorDimension": major_dimension,
+    })
+    value_ranges = response.get("valueRanges", [])
+    return [
+        value_ranges[i].get("values", []) if i < len(value_ranges) else []
+        for i in range(len(ranges))
+    ]
+
+
+# ==========================
+# ESCRITURA
+# ==========================
+async def batch_update_values(sheet_id, data, value_input_option="USER_ENTERED"):
+    """
+    Escribe varios rangos en una sola llamada values:batchUpdate. ``data`` es
+    una lista de ``(hoja, rango, valores)``.
+    """
+    from gspread.utils import absolute_range_name
+
+    titles = [await _title(sheet_id, worksheet) for worksheet, _, _ in data]
+    return await request("POST", f"/{sheet_id}/values:batchUpdate", json={
+        "valueInputOption": value_input_option,
+        "data": [
+            {"range": absolute_range_name(title, rng), "values": values}
+            for title, (_, rng, values) in zip(titles, data)
+        ],
+    })
+
+
+async def _first_empty_row(sheet_id, worksheet_name, start_row):
+    """
+    Como ``google_sheets_service.find_first_empty_row``: una fila cuenta como
+    vacia solo si todas sus celdas estan en blanco, no solo la columna A.
+    """
+    values = (await values_batch_get(sheet_id, [(worksheet_name, None)]))[0]
+    if not values:
+        return start_row
+    for idx, row in enumerate(values[start_row - 1:], start=start_row):
+        if not any(str(cell or "").strip() for cell in row):
+            return idx
+    return len(values) + 1
+
+
+async def write_rows(sheet_id, worksheet_name, rows, mode=None, start_row=2,
+                     table_range="A1", value_input_option="USER_ENTERED"):
+    """
+    Igual que ``google_sheets_service.write_rows`` (mismos modos por hoja),
+    recibiendo el nombre de la hoja en lugar del handle. Devuelve la primera
+    fila escrita o None.
+    """
+    from gspread.utils import absolute_range_name, rowcol_to_a1
+
+    if not rows:
+        return None
+    mode = sheets._insert_mode(worksheet_name, mode)
+
+    if mode == sheets.INSERT_MODE_FIRST_EMPTY:
+        width = max(len(row) for row in rows)
+        target_row = await _first_empty_row(sheet_id, worksheet_name, start_row)
+        end = rowcol_to_a1(target_row + len(rows) - 1, width)
+        await batch_update_values(
+            sheet_id, [(worksheet_name, f"A{target_row}:{end}", rows)],
+            value_input_option=value_input_option)
+        return target_row
+
+    if mode != sheets.INSERT_MODE_APPEND:
+        raise ValueError(f"Modo de insercion desconocido: {mode}")
+
+    title = await _title(sheet_id, worksheet_name)
+    response = await request(
+        "POST",
+        f"/{sheet_id}/values/{absolute_range_name(title, table_range)}:append",
+        params={"valueInputOption": value_input_option,
+                "insertDataOption": "INSERT_ROWS"},
+        json={"values": rows},
+    )
+    return sheets._first_row_from_range(
+        (response or {}).get("updates", {}).get("updatedRange"))
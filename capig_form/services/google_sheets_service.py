@@ -1,21 +1,28 @@
 ﻿# -*- coding: utf-8 -*-
 import base64
+import contextvars
 import json
 import logging
+import os
+import random
 import re
+import threading
+import time
 import traceback
+from collections import namedtuple
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from contextlib import contextmanager
 
-import gspread
 from django.conf import settings
-from google.oauth2.service_account import Credentials
-from gspread.utils import rowcol_to_a1
-from gspread.exceptions import APIError, SpreadsheetNotFound, WorksheetNotFound
+from email.utils import parsedate_to_datetime
 
-try:
-    from googleapiclient.errors import HttpError
-except ImportError:  # pragma: no cover - dependencia opcional
-    HttpError = Exception
+from capig_form.services import request_timing, sheets_metrics
+from capig_form.services.rate_limiter import SharedTokenBucket
 
+# gspread, google-auth y requests no se importan aqui: el cliente
+# (sheets_client) se carga en la primera llamada real a Google, y las
+# funciones que necesitan utilidades o excepciones de gspread las importan
+# al ejecutarse. Asi importar el servicio no cuesta nada al arrancar.
 
 logger = logging.getLogger(__name__)
 
@@ -43,12 +50,10 @@ def _print_utf8(message):
 
 
 def _load_service_account_info():
-    try:
-        raw_service = settings.SERVICE
-    except AttributeError as exc:
-        logger.exception("La variable SERVICE no esta definida en settings.")
-        raise RuntimeError(
-            "SERVICE no esta configurado en settings.py") from exc
+    raw_service = getattr(settings, "SERVICE", "")
+    if not raw_service:
+        logger.error("La variable SERVICE no esta definida en settings.")
+        raise RuntimeError("SERVICE no esta configurado en settings.py")
 
     try:
         # Intentar decodificar desde base64 primero
@@ -76,48 +81,562 @@ def _load_service_account_info():
     return info
 
 
-SERVICE_ACCOUNT_INFO = _load_service_account_info()
+_service_account_info = None
+
+
+def get_service_account_info():
+    """
+    Datos de la cuenta de servicio (SERVICE), validados en el primer uso y no
+    al importar el modulo. ``manage.py check_sheets`` los valida a pedido.
+    """
+    global _service_account_info
+    if _service_account_info is None:
+        _service_account_info = _load_service_account_info()
+    return _service_account_info
 
 
 # ======================
 # CLIENTE DE AUTENTICACION
 # ======================
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+_client_stats = {
+    "clients_created": 0,
+    "token_refreshes": 0,
+    "throttled": 0,
+    "retried": 0,
+    "limiter_waits": 0,
+    "snapshot_hits": 0,
+}
+# Los contadores se suman desde varios hilos (gunicorn, run_parallel, outbox).
+_client_stats_lock = threading.Lock()
+# Ultima llamada HTTP a Sheets de este proceso (para /ready/).
+_last_call = None
+
+
+def _record_call(method, endpoint, status, latency, error=None, params=None,
+                 body=None, response=None):
+    """
+    Registra una llamada HTTP a Sheets (ultima llamada, metricas y tiempos
+    de la peticion en curso); ``status`` None = error de red.
+    """
+    global _last_call
+    sheets_metrics.record(method, endpoint, latency, status=status, error=error,
+                          params=params, body=body, response=response)
+    request_timing.record_sheets_call(
+        *sheets_metrics.classify(method, endpoint, params, body), latency)
+    _last_call = {
+        "method": method.upper(),
+        "endpoint": str(endpoint),
+        "status": status,
+        "ok": status is not None and status < 400,
+        "latency_ms": round(latency * 1000, 1),
+        "at": time.time(),
+    }
+
+
+# ======================
+# CUOTA Y REINTENTOS
+# ======================
+# Cuota de Sheets API por usuario (la cuenta de servicio): 60 lecturas y 60
+# escrituras por minuto. Los buckets se comparten entre workers via SQLite.
+RETRYABLE_READ_STATUS = {429, 500, 502, 503, 504}
+# Una escritura que devolvio 5xx pudo haberse aplicado; reintentarla podria
+# duplicar filas. Solo se reintenta el 429, que Google garantiza rechazado.
+RETRYABLE_WRITE_STATUS = {429}
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def _bucket(kind):
+    with _buckets_lock:
+        bucket = _buckets.get(kind)
+        if bucket is None:
+            per_minute = getattr(
+                settings, f"SHEETS_{kind.upper()}_QUOTA_PER_MINUTE", 60)
+            path = getattr(settings, "SHEETS_QUOTA_DB", None) or os.path.join(
+                str(getattr(settings, "BASE_DIR", ".")), "sheets_quota.sqlite3")
+            bucket = SharedTokenBucket(
+                path, f"sheets_{kind}", per_minute,
+                max_wait=getattr(settings, "SHEETS_LIMITER_MAX_WAIT", 20.0))
+            _buckets[kind] = bucket
+        return bucket
+
+
+def _retry_after(response):
+    """Segundos indicados por Retry-After (numero o fecha HTTP), o None."""
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff_delay(attempt, retry_after=None):
+    """Backoff exponencial con jitter completo; Retry-After actua como minimo."""
+    base = getattr(settings, "SHEETS_BACKOFF_BASE", 1.0)
+    cap = getattr(settings, "SHEETS_BACKOFF_MAX", 32.0)
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+# ==========================
+# INSTANTANEA POR PETICION
+# ==========================
+# Dentro de ``sheet_snapshot()`` (el middleware lo abre en cada peticion) las
+# lecturas GET identicas se responden desde memoria, asi una vista nunca baja
+# dos veces la misma hoja. Cualquier escritura del mismo contexto vacia la
+# instantanea para que las lecturas siguientes vean lo escrito. Los hilos en
+# segundo plano no heredan el contexto y siempre leen de Google.
+_snapshot = contextvars.ContextVar("sheets_snapshot", default=None)
+
+
+@contextmanager
+def sheet_snapshot():
+    """Memoiza las lecturas a Sheets durante el bloque (reentrante)."""
+    if _snapshot.get() is not None:
+        yield
+        return
+    token = _snapshot.set({})
+    try:
+        yield
+    finally:
+        _snapshot.reset(token)
+
+
+def _snapshot_key(endpoint, kwargs):
+    params = kwargs.get("params")
+    return endpoint, json.dumps(params, sort_keys=True, default=str)
+
+
 def _get_client():
+    """
+    Devuelve el cliente gspread del proceso, creandolo una sola vez.
+    El cliente mantiene su AuthorizedSession (pool de conexiones HTTP) y
+    renueva el token solo cerca de su expiracion. Si el proceso cambio
+    (fork de gunicorn), se crea un cliente nuevo para no compartir sockets.
+    """
+    global _client, _client_pid
+
+    pid = os.getpid()
+    client = _client
+    if client is not None and _client_pid == pid:
+        return client
+
+    with _client_lock:
+        if _client is not None and _client_pid == pid:
+            return _client
+        info = get_service_account_info()
+        try:
+            from capig_form.services.sheets_client import build_client
+
+            _client = build_client(info)
+            _client_pid = pid
+            _count("clients_created")
+            return _client
+        except Exception as exc:
+            logger.exception("Error autenticando con Google Sheets.")
+            _print_utf8(traceback.format_exc())
+            raise RuntimeError(
+                "No fue posible autenticarse con Google Sheets.") from exc
+
+
+def get_credentials():
+    """Credenciales del cliente compartido (para clientes HTTP alternativos)."""
+    return _get_client().http_client.auth
+
+
+def reset_client():
+    """Descarta el cliente actual; el siguiente uso vuelve a autenticarse."""
+    global _client, _client_pid
+    with _client_lock:
+        _client = None
+        _client_pid = None
+
+
+def set_client(client):
+    """
+    Usa ``client`` como cliente del proceso en lugar de autenticarse (p. ej.
+    el backend en memoria de ``benchmarks/fake_sheets.py``). Descarta los
+    handles cacheados del cliente anterior; ``reset_client`` vuelve al real.
+    """
+    global _client, _client_pid
+    with _client_lock:
+        _client = client
+        _client_pid = os.getpid()
+    invalidate_sheet_cache()
+
+
+def get_client_stats():
+    """
+    Contadores del cliente compartido: clientes creados en este proceso,
+    intercambios de token reales, respuestas 429 (throttled), reintentos,
+    llamadas que esperaron al limitador local y lecturas servidas desde la
+    instantanea de la peticion.
+    """
+    with _client_stats_lock:
+        return dict(_client_stats, pid=os.getpid())
+
+
+def _count(stat):
+    """Suma uno al contador ``stat`` y devuelve el nuevo valor."""
+    with _client_stats_lock:
+        _client_stats[stat] += 1
+        return _client_stats[stat]
+
+
+def get_last_call():
+    """Ultima llamada HTTP a Sheets (metodo, status, latencia) o None."""
+    return dict(_last_call) if _last_call is not None else None
+
+
+# ==========================
+# LECTURAS EN PARALELO
+# ==========================
+# Pool pequeño y acotado por proceso para lanzar lecturas independientes a la
+# vez: la latencia de la peticion pasa a ser la de la lectura mas lenta y no
+# la suma. Cada tarea corre con una copia del contexto del llamador, asi que
+# comparte la instantanea de la peticion.
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+_in_fanout = contextvars.ContextVar("sheets_in_fanout", default=False)
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is not None and _executor_pid == pid:
+        return _executor
+    with _executor_lock:
+        if _executor is None or _executor_pid != pid:
+            # Tras un fork los hilos del pool del padre no existen en el hijo.
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "SHEETS_FANOUT_WORKERS", 4),
+                thread_name_prefix="sheets-read")
+            _executor_pid = pid
+    return _executor
+
+
+def _run_in_fanout(call):
+    _in_fanout.set(True)
+    return call()
+
+
+def run_parallel(calls, timeout=None):
+    """
+    Ejecuta a la vez funciones sin argumentos (lecturas independientes) y
+    devuelve sus resultados en el mismo orden.
+
+    ``timeout`` es el plazo total en segundos (SHEETS_FANOUT_TIMEOUT por
+    defecto): al vencer se cancelan las tareas que no empezaron y se lanza
+    TimeoutError. Si una tarea falla se cancelan las pendientes y se relanza
+    su excepcion. Las tareas ya iniciadas no se pueden interrumpir: terminan
+    en segundo plano y su resultado se descarta.
+    """
+    calls = list(calls)
+    # Una sola tarea, o llamadas anidadas desde el pool: en linea, sin riesgo
+    # de que el pool se bloquee esperandose a si mismo.
+    if len(calls) <= 1 or _in_fanout.get():
+        return [call() for call in calls]
+    if timeout is None:
+        timeout = getattr(settings, "SHEETS_FANOUT_TIMEOUT", 30)
+
+    executor = _get_executor()
+    futures = [
+        executor.submit(contextvars.copy_context().run, _run_in_fanout, call)
+        for call in calls
+    ]
+    done, not_done = wait(futures, timeout=timeout, return_when=FIRST_EXCEPTION)
+    for future in not_done:
+        future.cancel()
+    for future in futures:
+        if future in done and future.exception() is not None:
+            raise future.exception()
+    if not_done:
+        raise TimeoutError(
+            f"{len(not_done)} lecturas de Google Sheets superaron {timeout}s.")
+    return [future.result() for future in futures]
+
+
+# ==========================
+# CACHE DE HOJAS (HANDLES)
+# ==========================
+# Los objetos Spreadsheet/Worksheet de gspread solo guardan metadatos, asi que
+# se pueden reutilizar entre requests. Se guardan por (sheet_id, titulo
+# normalizado) y expiran tras SHEETS_HANDLE_TTL segundos.
+_handle_lock = threading.Lock()
+_spreadsheet_cache = {}
+_worksheet_cache = {}
+_worksheet_order = {}
+
+
+def _reset_locks_after_fork():
+    """
+    En el hijo de un fork los locks que otro hilo del padre tenia tomados
+    quedarian tomados para siempre: se reemplazan por locks nuevos.
+    """
+    global _client_lock, _client_stats_lock, _buckets_lock, _executor_lock, _handle_lock
+    _client_lock = threading.Lock()
+    _client_stats_lock = threading.Lock()
+    _buckets_lock = threading.Lock()
+    _executor_lock = threading.Lock()
+    _handle_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_locks_after_fork)
+
+
+def _handle_ttl():
+    return getattr(settings, "SHEETS_HANDLE_TTL", 600)
+
+
+def _normalize_title(title):
+    """Titulo comparable: sin espacios sobrantes y en minusculas."""
+    return " ".join(str(title or "").split()).lower()
+
+
+def invalidate_sheet_cache(sheet_id=None, worksheet_name=None):
+    """
+    Elimina handles cacheados. Sin argumentos limpia todo; con solo sheet_id
+    limpia ese documento; con ambos, solo esa hoja.
+    """
+    with _handle_lock:
+        for key in [k for k in _header_cache
+                    if sheet_id in (None, k[0])
+                    and (worksheet_name is None
+                         or k[1] == _normalize_title(worksheet_name))]:
+            del _header_cache[key]
+        if sheet_id is None:
+            _spreadsheet_cache.clear()
+            _worksheet_cache.clear()
+            _worksheet_order.clear()
+            return
+        if worksheet_name is not None:
+            _worksheet_cache.pop((sheet_id, _normalize_title(worksheet_name)), None)
+            _worksheet_order.pop(sheet_id, None)
+            return
+        _spreadsheet_cache.pop(sheet_id, None)
+        _worksheet_order.pop(sheet_id, None)
+        for key in [k for k in _worksheet_cache if k[0] == sheet_id]:
+            del _worksheet_cache[key]
+
+
+def _cache_lookup(cache, key):
+    with _handle_lock:
+        entry = cache.get(key)
+    if entry and entry[1] > time.monotonic():
+        return entry[0]
+    return None
+
+
+def _get_spreadsheet(sheet_id):
+    spreadsheet = _cache_lookup(_spreadsheet_cache, sheet_id)
+    if spreadsheet is None:
+        spreadsheet = _get_client().open_by_key(sheet_id)
+        with _handle_lock:
+            _spreadsheet_cache[sheet_id] = (
+                spreadsheet, time.monotonic() + _handle_ttl())
+    return spreadsheet
+
+
+def _load_worksheets(sheet_id):
+    """Descarga la lista de hojas una sola vez y cachea todos sus handles."""
+    worksheets = _get_spreadsheet(sheet_id).worksheets()
+    expires_at = time.monotonic() + _handle_ttl()
+    _print_utf8(
+        f"Hojas disponibles en {sheet_id}: {[ws.title for ws in worksheets]}")
+    with _handle_lock:
+        for key in [k for k in _worksheet_cache if k[0] == sheet_id]:
+            del _worksheet_cache[key]
+        for ws in worksheets:
+            _worksheet_cache[(sheet_id, _normalize_title(ws.title))] = (
+                ws, expires_at)
+        _worksheet_order[sheet_id] = (worksheets, expires_at)
+    return worksheets
+
+
+def get_worksheet_by_index(sheet_id, worksheet_index=0):
+    """Equivalente cacheado de spreadsheet.get_worksheet(index)."""
+    worksheets = _cache_lookup(_worksheet_order, sheet_id)
+    if worksheets is None:
+        worksheets = _load_worksheets(sheet_id)
     try:
-        creds = Credentials.from_service_account_info(
-            SERVICE_ACCOUNT_INFO, scopes=SCOPES)
-        return gspread.authorize(creds)
-    except Exception as exc:
-        logger.exception("Error autenticando con Google Sheets.")
-        _print_utf8(traceback.format_exc())
-        raise RuntimeError(
-            "No fue posible autenticarse con Google Sheets.") from exc
+        return worksheets[worksheet_index]
+    except IndexError:
+        from gspread.exceptions import WorksheetNotFound
+
+        invalidate_sheet_cache(sheet_id)
+        raise WorksheetNotFound(f"index {worksheet_index}")
+
+
+# ==========================
+# LECTURA DE VARIAS HOJAS
+# ==========================
+def values_batch_get(sheet_id, ranges, value_render_option="UNFORMATTED_VALUE",
+                     major_dimension="ROWS"):
+    """
+    Lee varios rangos, de una o varias hojas del mismo libro, con una sola
+    llamada values.batchGet. ``ranges`` es una lista de pares
+    ``(hoja, rango)``; con rango None se lee la hoja completa. Los nombres se
+    resuelven como en get_google_sheet (sin distinguir mayusculas). Devuelve
+    las matrices de valores en el mismo orden (lista vacia si el rango no
+    tiene datos).
+    """
+    from gspread.utils import absolute_range_name
+
+    if not ranges:
+        return []
+    response = _get_spreadsheet(sheet_id).values_batch_get(
+        [absolute_range_name(get_google_sheet(sheet_id, worksheet).title, rng)
+         for worksheet, rng in ranges],
+        params={"valueRenderOption": value_render_option,
+                "majorDimension": major_dimension},
+    )
+    value_ranges = response.get("valueRanges", [])
+    return [
+        value_ranges[i].get("values", []) if i < len(value_ranges) else []
+        for i in range(len(ranges))
+    ]
+
+
+# ==========================
+# LECTURA PROYECTADA POR COLUMNAS
+# ==========================
+# Para hojas anchas (SOCIOS): se piden solo las columnas que se usan, por
+# nombre. El encabezado se cachea SHEETS_HANDLE_TTL segundos para resolver
+# nombres a letras sin leerlo cada vez; la lectura lo vuelve a traer y, si
+# las columnas se movieron, repite la lectura con el encabezado nuevo.
+ProjectedColumns = namedtuple(
+    "ProjectedColumns", ["header", "header_row", "first_row", "columns"])
+
+_header_cache = {}
+
+
+def _column_letters(header, names):
+    """Nombre logico -> letra de columna (gana la primera coincidencia)."""
+    from gspread.utils import rowcol_to_a1
+
+    positions = {}
+    for col, title in enumerate(header, start=1):
+        positions.setdefault(str(title).strip().upper(), col)
+    letters = {}
+    for name in names:
+        col = positions.get(str(name).strip().upper())
+        if col is not None:
+            letters[name] = rowcol_to_a1(1, col)[:-1]
+    return letters
+
+
+def _trim_header(cells):
+    header = [str(cell) for cell in cells]
+    while header and not header[-1].strip():
+        header.pop()
+    return header
+
+
+def _store_header(key, header):
+    with _handle_lock:
+        _header_cache[key] = (header, time.monotonic() + _handle_ttl())
+
+
+def get_header(sheet_id, worksheet_name, header_row=1, fresh=False):
+    """
+    Encabezado de la hoja (fila ``header_row``), cacheado SHEETS_HANDLE_TTL
+    segundos. Con ``fresh=True`` lo relee (una lectura de un solo rango) y
+    actualiza el cache, p. ej. antes de escribir una fila armada con el.
+    """
+    key = (sheet_id, _normalize_title(worksheet_name), header_row)
+    header = None if fresh else _cache_lookup(_header_cache, key)
+    if header is None:
+        rows = values_batch_get(
+            sheet_id, [(worksheet_name, f"{header_row}:{header_row}")])[0]
+        header = _trim_header(rows[0] if rows else [])
+        _store_header(key, header)
+    return header
+
+
+def read_columns(sheet_id, worksheet_name, names, header_row=1):
+    """
+    Lee solo las columnas ``names`` (debajo de ``header_row``) en una llamada.
+    ``names`` puede ser una funcion que recibe el encabezado y devuelve los
+    nombres (p. ej. las columnas por año). Devuelve ``ProjectedColumns`` con
+    una lista de valores por nombre, todas del mismo largo; la primera
+    corresponde a la fila ``first_row``. Un nombre que no esta en la hoja
+    viene como columna vacia.
+    """
+    key = (sheet_id, _normalize_title(worksheet_name), header_row)
+    header = get_header(sheet_id, worksheet_name, header_row)
+    header_range = (worksheet_name, f"{header_row}:{header_row}")
+
+    for _ in range(2):
+        wanted = list(names(header) if callable(names) else names)
+        letters = _column_letters(header, wanted)
+        found = [name for name in wanted if name in letters]
+        result = values_batch_get(
+            sheet_id,
+            [header_range] + [
+                (worksheet_name, f"{letters[name]}{header_row + 1}:{letters[name]}")
+                for name in found],
+            major_dimension="COLUMNS",
+        )
+        header_now = _trim_header(col[0] if col else "" for col in result[0])
+        _store_header(key, header_now)
+        if _column_letters(header_now, wanted) == letters:
+            break
+        header = header_now
+
+    data = {name: (values[0] if values else [])
+            for name, values in zip(found, result[1:])}
+    length = max((len(values) for values in data.values()), default=0)
+    columns = {
+        name: list(data.get(name, [])) + [""] * (length - len(data.get(name, [])))
+        for name in wanted
+    }
+    return ProjectedColumns(header_now, header_row, header_row + 1, columns)
 
 
 # ==========================
 # OBTENER HOJA POR NOMBRE
 # ==========================
 def get_google_sheet(sheet_id, worksheet_name):
-    try:
-        client = _get_client()
-        spreadsheet = client.open_by_key(sheet_id)
-        worksheets = spreadsheet.worksheets()
-        available_titles = [ws.title for ws in worksheets]
+    """
+    Devuelve la hoja pedida usando la cache de handles. El titulo se compara
+    sin distinguir mayusculas ni espacios sobrantes.
+    """
+    from gspread.exceptions import SpreadsheetNotFound, WorksheetNotFound
 
-        _print_utf8(f"sheet_id solicitado: {sheet_id}")
-        _print_utf8(f"worksheet_name solicitado: {repr(worksheet_name)}")
-        _print_utf8(f"Hojas disponibles en el documento: {available_titles}")
+    key = (sheet_id, _normalize_title(worksheet_name))
+    try:
+        worksheet = _cache_lookup(_worksheet_cache, key)
+        if worksheet is not None:
+            return worksheet
 
-        if worksheet_name not in available_titles:
+        worksheets = _load_worksheets(sheet_id)
+        worksheet = _cache_lookup(_worksheet_cache, key)
+        if worksheet is None:
             logger.warning(
-                "El nombre de hoja '%s' no coincide exactamente con las hojas disponibles: %s",
+                "El nombre de hoja '%s' no coincide con las hojas disponibles: %s",
                 worksheet_name,
-                available_titles,
+                [ws.title for ws in worksheets],
             )
-
-        return spreadsheet.worksheet(worksheet_name)
+            raise WorksheetNotFound(worksheet_name)
+        return worksheet
 
     except WorksheetNotFound as exc:
+        invalidate_sheet_cache(sheet_id, worksheet_name)
         msg = f"La hoja '{worksheet_name}' no fue encontrada. Revisa mayusculas y espacios."
         logger.exception(msg)
         _print_utf8(msg)
@@ -125,6 +644,7 @@ def get_google_sheet(sheet_id, worksheet_name):
         raise
 
     except SpreadsheetNotFound as exc:
+        invalidate_sheet_cache(sheet_id)
         msg = f"No se encontro el Google Sheet con ID: {sheet_id}"
         logger.exception(msg)
         _print_utf8(msg)
@@ -148,34 +668,110 @@ def find_first_empty_row(sheet, start_row=2):
     if not values:
         return start_row
     for idx, row in enumerate(values[start_row - 1:], start=start_row):
-        if not any((cell or "").strip() for cell in row):
+        if not any(str(cell or "").strip() for cell in row):
             return idx
     return len(values) + 1
 
 
 # ========================
-# INSERTAR UNA FILA
+# ESCRITURA DE FILAS NUEVAS
 # ========================
-def insert_row_to_sheet(sheet_id, worksheet_name, data):
+# "append": values.append con INSERT_ROWS. No lee la hoja antes de escribir y
+#           el servidor decide la fila, asi que dos workers nunca pisan la
+#           misma fila.
+# "first_empty": comportamiento anterior; descarga la hoja y escribe en la
+#           primera fila en blanco. Solo para hojas con filas preformateadas.
+INSERT_MODE_APPEND = "append"
+INSERT_MODE_FIRST_EMPTY = "first_empty"
+
+_UPDATED_RANGE_ROW = re.compile(r"![A-Za-z]*(\d+)")
+
+
+def _insert_mode(worksheet_name, mode=None):
+    if mode:
+        return mode
+    modes = getattr(settings, "SHEETS_INSERT_MODES", {}) or {}
+    for title, title_mode in modes.items():
+        if _normalize_title(title) == _normalize_title(worksheet_name):
+            return title_mode
+    return getattr(settings, "SHEETS_DEFAULT_INSERT_MODE", INSERT_MODE_APPEND)
+
+
+def _first_row_from_range(updated_range):
+    """Extrae la fila inicial de un rango como "'HOJA'!A120:J121"."""
+    match = _UPDATED_RANGE_ROW.search(updated_range or "")
+    return int(match.group(1)) if match else None
+
+
+def write_rows(sheet, rows, mode=None, start_row=2, table_range="A1",
+               value_input_option="USER_ENTERED"):
+    """
+    Escribe filas nuevas contiguas y devuelve el numero de la primera fila
+    escrita (None si la API no lo informa). El modo se toma de
+    SHEETS_INSERT_MODES / SHEETS_DEFAULT_INSERT_MODE si no se indica.
+    """
+    from gspread.utils import rowcol_to_a1
+
+    if not rows:
+        return None
+    mode = _insert_mode(sheet.title, mode)
+
+    if mode == INSERT_MODE_FIRST_EMPTY:
+        width = max(len(row) for row in rows)
+        target_row = find_first_empty_row(sheet, start_row=start_row)
+        end = rowcol_to_a1(target_row + len(rows) - 1, width)
+        sheet.update(f"A{target_row}:{end}", rows,
+                     value_input_option=value_input_option)
+        return target_row
+
+    if mode != INSERT_MODE_APPEND:
+        raise ValueError(f"Modo de insercion desconocido: {mode}")
+
+    response = sheet.append_rows(
+        rows,
+        value_input_option=value_input_option,
+        insert_data_option="INSERT_ROWS",
+        table_range=table_range,
+    )
+    return _first_row_from_range(
+        (response or {}).get("updates", {}).get("updatedRange"))
+
+
+# ========================
+# INSERTAR FILAS
+# ========================
+def _fit_to_header(row, header_len):
+    """Ajusta el tamaño de la fila al header."""
+    if len(row) < header_len:
+        return row + [""] * (header_len - len(row))
+    return row[:header_len]
+
+
+def insert_rows_to_sheet(sheet_id, worksheet_name, rows):
+    """
+    Inserta varias filas en una sola escritura. Devuelve True/False como
+    insert_row_to_sheet.
+    """
+    from gspread.exceptions import APIError, SpreadsheetNotFound, WorksheetNotFound
+
+    try:
+        from googleapiclient.errors import HttpError
+    except ImportError:  # pragma: no cover - dependencia opcional
+        HttpError = APIError
+
     try:
         sheet = get_google_sheet(sheet_id, worksheet_name)
-        header = sheet.row_values(1)
-        header_len = max(len(header), len(data))
-
-        # Ajustar tamaño de data al header
-        if len(data) < header_len:
-            data = data + [""] * (header_len - len(data))
-        elif len(data) > header_len:
-            data = data[:header_len]
-
-        target_row = find_first_empty_row(sheet, start_row=2)
-        start = f"A{target_row}"
-        end = rowcol_to_a1(target_row, header_len)
-        sheet.update(f"{start}:{end}", [data], value_input_option="USER_ENTERED")
-        logger.info("Insertando fila en hoja '%s': len=%s datos=%s",
-                    worksheet_name, len(data), data)
+        # Encabezado cacheado: rellenar filas cortas no justifica una lectura
+        # por escritura (una columna nueva solo deja celdas vacias al final).
+        header = get_header(sheet_id, worksheet_name)
+        header_len = max([len(header)] + [len(row) for row in rows])
+        rows = [_fit_to_header(list(row), header_len) for row in rows]
+
+        write_rows(sheet, rows)
+        logger.info("Insertando %s fila(s) en hoja '%s': %s",
+                    len(rows), worksheet_name, rows)
         _print_utf8(
-            f"Insertando {len(data)} valores en '{worksheet_name}': {data}")
+            f"Insertando {len(rows)} fila(s) de {header_len} valores en '{worksheet_name}'")
         return True
 
     except (WorksheetNotFound, SpreadsheetNotFound) as exc:
@@ -197,6 +793,10 @@ def insert_row_to_sheet(sheet_id, worksheet_name, data):
         return False
 
 
+def insert_row_to_sheet(sheet_id, worksheet_name, data):
+    return insert_rows_to_sheet(sheet_id, worksheet_name, [data])
+
+
 def update_sheet_with_dataframe(sheet_id, worksheet_name, df):
     """
     Borra la hoja indicada y sube el contenido del DataFrame.
@@ -227,7 +827,14 @@ def update_sheet_with_dataframe(sheet_id, worksheet_name, df):
 # ========================
 
 
-def get_column_data(sheet_id, worksheet_index=0, column='A', start_row=2):
+def get_column_data(sheet_id, worksheet_index=0, column='A', start_row=2,
+                    raise_errors=False):
+    """
+    Lee una columna desde start_row, sin vacios. Ante errores de Google
+    devuelve [] salvo que raise_errors sea True.
+    """
+    from gspread.exceptions import SpreadsheetNotFound, WorksheetNotFound
+
     try:
         column = column.strip()
         if not column:
@@ -236,8 +843,7 @@ def get_column_data(sheet_id, worksheet_index=0, column='A', start_row=2):
             raise ValueError(
                 "El parametro 'column' debe ser una sola letra de la A a la Z.")
 
-        client = _get_client()
-        sheet = client.open_by_key(sheet_id).get_worksheet(worksheet_index)
+        sheet = get_worksheet_by_index(sheet_id, worksheet_index)
 
         col_num = ord(column.upper()) - ord('A') + 1
         column_values = sheet.col_values(col_num)
@@ -255,7 +861,17 @@ def get_column_data(sheet_id, worksheet_index=0, column='A', start_row=2):
         _print_utf8(traceback.format_exc())
         raise
 
+    except (WorksheetNotFound, SpreadsheetNotFound) as exc:
+        invalidate_sheet_cache(sheet_id)
+        logger.exception("No se encontro la hoja para leer columna '%s'.", column)
+        _print_utf8(traceback.format_exc())
+        if raise_errors:
+            raise
+        return []
+
     except Exception as exc:
         logger.exception("Error al leer columna '%s'.", column)
         _print_utf8(traceback.format_exc())
+        if raise_errors:
+            raise
         return []
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Token bucket compartido entre los workers de gunicorn.
+
+El estado de cada bucket (tokens disponibles y ultima actualizacion) vive en
+un archivo SQLite pequeño; cada toma de token es una transaccion
+``BEGIN IMMEDIATE``, asi que los tres workers consumen la misma cuota.
+Si el archivo no se puede usar, el limitador deja pasar las llamadas
+(fail-open) para no tumbar los formularios.
+"""
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS token_bucket (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+
+class SharedTokenBucket:
+    def __init__(self, path, name, per_minute, max_wait=20.0):
+        self.path = str(path)
+        self.name = name
+        self.capacity = float(per_minute)
+        self.rate = float(per_minute) / 60.0
+        self.max_wait = max_wait
+        self._local = threading.local()
+        self._disabled = False
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _update(self, take=0.0, floor=None):
+        """
+        Recalcula los tokens del bucket, descuenta ``take`` si alcanza y
+        devuelve los segundos que faltan para tener un token (0 si se tomo).
+        ``floor`` fuerza el saldo a ese valor (p. ej. negativo tras un 429).
+        """
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT tokens, updated_at FROM token_bucket WHERE name = ?",
+                (self.name,),
+            ).fetchone()
+            if row is None:
+                tokens = self.capacity
+            else:
+                tokens = min(self.capacity,
+                             row[0] + max(now - row[1], 0) * self.rate)
+            if floor is not None:
+                tokens = min(tokens, floor)
+            wait = 0.0
+            if take:
+                if tokens >= take:
+                    tokens -= take
+                else:
+                    wait = (take - tokens) / self.rate
+            conn.execute(
+                "INSERT OR REPLACE INTO token_bucket (name, tokens, updated_at) "
+                "VALUES (?, ?, ?)",
+                (self.name, tokens, now),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def try_acquire(self):
+        """
+        Intenta tomar un token sin esperar: devuelve 0 si lo tomo o los
+        segundos que faltan para el proximo. Sirve para esperar con
+        ``asyncio.sleep`` en lugar de bloquear el hilo.
+        """
+        if self._disabled:
+            return 0.0
+        try:
+            return self._update(take=1.0)
+        except sqlite3.Error:
+            logger.exception(
+                "Limitador '%s' sin acceso a %s; se desactiva.", self.name, self.path)
+            self._disabled = True
+            return 0.0
+
+    def acquire(self):
+        """
+        Toma un token esperando lo necesario. Devuelve los segundos esperados.
+        Tras ``max_wait`` segundos deja pasar la llamada y que Google decida.
+        """
+        waited = 0.0
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return waited
+            if waited + wait > self.max_wait:
+                logger.warning(
+                    "Cuota local '%s' agotada tras %.1fs; se llama igual.",
+                    self.name, waited)
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    def penalize(self, seconds):
+        """Vacia el bucket para que todos los workers esperen ``seconds``."""
+        if self._disabled:
+            return
+        try:
+            self._update(floor=-seconds * self.rate)
+        except sqlite3.Error:
+            logger.exception("No se pudo penalizar el limitador '%s'.", self.name)
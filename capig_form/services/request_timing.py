@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Tiempos por peticion para el header Server-Timing y el log de peticiones
+lentas (ver ``ServerTimingMiddleware``).
+
+El middleware abre un ``RequestTiming`` en una ContextVar; el servicio de
+Sheets (cada llamada HTTP y cada renovacion de token), el outbox y el render
+de las vistas le suman tramos. Los hilos de ``run_parallel`` y
+``sync_to_async`` heredan el contexto, asi que sus llamadas cuentan para la
+peticion (los tramos son tiempo acumulado: en paralelo pueden sumar mas que
+el total). Las actualizaciones en segundo plano no cuentan. Fuera de una
+peticion registrar no hace nada.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Tramo de Server-Timing segun la operacion de la API (sheets_metrics.classify).
+SHEETS_SPANS = {
+    "values_get": "sheets-read",
+    "values_batchGet": "sheets-read",
+    "metadata": "sheets-meta",
+    "drive": "sheets-meta",
+}
+SPAN_DESCRIPTIONS = {
+    "auth": "token de Google",
+    "sheets-read": "lecturas de Sheets",
+    "sheets-write": "escrituras de Sheets",
+    "sheets-meta": "descubrimiento de hojas",
+    "outbox": "encolar escrituras",
+    "render": "plantillas",
+}
+
+_current = contextvars.ContextVar("request_timing", default=None)
+
+
+class RequestTiming:
+    def __init__(self):
+        self.started = time.monotonic()
+        # Tramo -> [segundos acumulados, veces].
+        self.spans = {}
+        # Hoja -> llamadas a la API ("-" si la llamada no indica hoja).
+        self.sheets_calls = {}
+        self._lock = threading.Lock()
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def add(self, name, seconds):
+        with self._lock:
+            span = self.spans.setdefault(name, [0.0, 0])
+            span[0] += seconds
+            span[1] += 1
+
+    def add_sheets_call(self, operation, worksheet, seconds):
+        self.add(SHEETS_SPANS.get(operation, "sheets-write"), seconds)
+        with self._lock:
+            key = worksheet or "-"
+            self.sheets_calls[key] = self.sheets_calls.get(key, 0) + 1
+
+    def header(self, total):
+        """Valor del header Server-Timing (duraciones en milisegundos)."""
+        with self._lock:
+            spans = sorted(self.spans.items())
+        entries = [
+            f'{name};dur={seconds * 1000:.1f};desc="{SPAN_DESCRIPTIONS.get(name, name)} x{count}"'
+            for name, (seconds, count) in spans
+        ]
+        entries.append(f'total;dur={total * 1000:.1f}')
+        return ", ".join(entries)
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "spans_ms": {
+                    name: {"ms": round(seconds * 1000, 1), "count": count}
+                    for name, (seconds, count) in sorted(self.spans.items())
+                },
+                "sheets_calls": dict(sorted(self.sheets_calls.items())),
+                "sheets_calls_total": sum(self.sheets_calls.values()),
+            }
+
+
+@contextmanager
+def collect():
+    """Abre la medicion de una peticion; devuelve el ``RequestTiming``."""
+    timing = RequestTiming()
+    token = _current.set(timing)
+    try:
+        yield timing
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(name):
+    """Suma la duracion del bloque al tramo ``name`` de la peticion actual."""
+    timing = _current.get()
+    if timing is None:
+        yield
+        return
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        timing.add(name, time.monotonic() - start)
+
+
+def record_sheets_call(operation, worksheet, seconds):
+    timing = _current.get()
+    if timing is not None:
+        timing.add_sheets_call(operation, worksheet, seconds)
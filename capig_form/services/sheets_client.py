@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Cliente gspread del proceso: credenciales compartidas y cliente HTTP con
+cuota y reintentos.
+
+Es la parte pesada del servicio (gspread, google-auth, requests), por eso
+``google_sheets_service`` solo la importa al crear el cliente, en la primera
+llamada real a Google; importar el servicio (URLconf, comandos de manage.py,
+arranque de workers) no carga nada de esto.
+"""
+import logging
+import os
+import threading
+import time
+
+import gspread
+from django.conf import settings
+from google.oauth2.service_account import Credentials
+from gspread.exceptions import APIError
+from gspread.http_client import HTTPClient
+from requests.exceptions import ConnectionError as RequestsConnectionError
+from requests.exceptions import Timeout as RequestsTimeout
+
+from capig_form.services import google_sheets_service as service
+from capig_form.services import request_timing
+
+logger = logging.getLogger(__name__)
+
+
+class SharedCredentials(Credentials):
+    """
+    Credenciales compartidas por todos los hilos del worker.
+    google-auth solo refresca cuando el token esta por expirar; aqui ademas se
+    serializa el refresh para que dos hilos no hagan el intercambio a la vez
+    y se contabiliza cada intercambio real.
+    """
+
+    _refresh_lock = threading.Lock()
+
+    def refresh(self, request):
+        with self._refresh_lock:
+            # Otro hilo pudo haber refrescado mientras esperabamos el lock.
+            if self.valid:
+                return
+            with request_timing.span("auth"):
+                super().refresh(request)
+            total = service._count("token_refreshes")
+            logger.info("Token de Google Sheets renovado (total=%s).", total)
+
+
+def _reset_refresh_lock_after_fork():
+    # Un hilo del padre pudo estar renovando el token al momento del fork.
+    SharedCredentials._refresh_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_refresh_lock_after_fork)
+
+
+class QuotaAwareHTTPClient(HTTPClient):
+    """
+    Cliente HTTP de gspread que pasa cada llamada por el token bucket
+    compartido y reintenta 429/5xx con backoff. Como todas las operaciones de
+    gspread (open, worksheets, get_all_records, update, format...) terminan
+    aqui, la politica aplica a cualquier uso del cliente.
+    """
+
+    def request(self, method, endpoint, *args, **kwargs):
+        is_read = method.upper() == "GET"
+        snapshot = service._snapshot.get()
+        if snapshot is not None:
+            if not is_read:
+                snapshot.clear()
+            elif not args:
+                key = service._snapshot_key(endpoint, kwargs)
+                if key in snapshot:
+                    service._count("snapshot_hits")
+                    return snapshot[key]
+                response = self._request_with_retries(method, endpoint, **kwargs)
+                snapshot[key] = response
+                return response
+        return self._request_with_retries(method, endpoint, *args, **kwargs)
+
+    def _request_with_retries(self, method, endpoint, *args, **kwargs):
+        is_read = method.upper() == "GET"
+        bucket = service._bucket("read" if is_read else "write")
+        retryable = (service.RETRYABLE_READ_STATUS if is_read
+                     else service.RETRYABLE_WRITE_STATUS)
+        max_retries = getattr(settings, "SHEETS_MAX_RETRIES", 5)
+        attempt = 0
+
+        while True:
+            if bucket.acquire():
+                service._count("limiter_waits")
+            start = time.monotonic()
+            try:
+                response = super().request(method, endpoint, *args, **kwargs)
+                service._record_call(
+                    method, endpoint, response.status_code, time.monotonic() - start,
+                    params=kwargs.get("params"), body=kwargs.get("json"),
+                    response=response)
+                return response
+            except APIError as exc:
+                status = getattr(exc, "code", None)
+                service._record_call(
+                    method, endpoint, status, time.monotonic() - start, error=exc,
+                    params=kwargs.get("params"), body=kwargs.get("json"),
+                    response=exc.response)
+                if status not in retryable or attempt >= max_retries:
+                    raise
+                delay = service._backoff_delay(attempt, service._retry_after(exc.response))
+                if status == 429:
+                    service._count("throttled")
+                    bucket.penalize(delay)
+            except (RequestsConnectionError, RequestsTimeout) as exc:
+                service._record_call(
+                    method, endpoint, None, time.monotonic() - start, error=exc,
+                    params=kwargs.get("params"), body=kwargs.get("json"))
+                if not is_read or attempt >= max_retries:
+                    raise
+                delay = service._backoff_delay(attempt)
+
+            service._count("retried")
+            logger.warning(
+                "Reintentando %s %s en %.1fs (intento %s).",
+                method, endpoint, delay, attempt + 1)
+            time.sleep(delay)
+            attempt += 1
+
+
+def build_client(service_account_info):
+    """Cliente gspread autenticado con la cuenta de servicio."""
+    creds = SharedCredentials.from_service_account_info(
+        service_account_info, scopes=service.SCOPES)
+    return gspread.authorize(creds, http_client=QuotaAwareHTTPClient)
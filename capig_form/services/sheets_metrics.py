@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+Metricas Prometheus de las llamadas a la API de Google Sheets.
+
+Se registran en la capa HTTP (cliente gspread y cliente async), por donde
+pasan todas las operaciones: open, worksheets, get_all_values, col_values,
+update, update_cell, format, append... Cada llamada suma:
+
+- ``sheets_api_requests_total``: conteo por operacion, hoja y status HTTP
+  ("error" si no hubo respuesta).
+- ``sheets_api_request_duration_seconds``: histograma de latencia.
+- ``sheets_api_errors_total``: errores por clase (APIError, ConnectionError...).
+- ``sheets_api_rows_total``: filas escritas.
+- ``sheets_api_payload_bytes_total``: bytes enviados o recibidos. Las
+  respuestas no se vuelven a parsear para contar filas leidas: basta el
+  tamano del cuerpo.
+
+La operacion sale del endpoint (``values_get``, ``values_append``,
+``values_batchGet``, ``batch_update``, ``metadata``...) y la hoja del rango
+A1. Con gunicorn, si SHEETS_METRICS_DIR esta definido se usa el modo
+multiproceso de prometheus_client y ``/metrics`` agrega todos los workers.
+prometheus_client es opcional: sin el, registrar no hace nada.
+"""
+import json
+import logging
+import os
+import threading
+from urllib.parse import unquote, urlsplit
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def metrics_dir():
+    """
+    Directorio del modo multiproceso, o "" si no se usa. Sale de los settings
+    (entorno y .env via django-environ); los hooks de gunicorn lo leen por
+    aqui para ver el mismo valor que los workers.
+    """
+    return getattr(settings, "SHEETS_METRICS_DIR", "") or ""
+
+
+def _get_metrics():
+    """Crea las metricas la primera vez (importa prometheus_client recien aqui)."""
+    global _metrics
+    if _metrics is not None:
+        return _metrics or None
+    with _metrics_lock:
+        if _metrics is not None:
+            return _metrics or None
+        if not getattr(settings, "SHEETS_METRICS_ENABLED", True):
+            _metrics = False
+            return None
+        directory = metrics_dir()
+        if directory:
+            # Debe estar definido antes de importar prometheus_client.
+            os.makedirs(directory, exist_ok=True)
+            os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", directory)
+        try:
+            from prometheus_client import Counter, Histogram
+        except ImportError:  # pragma: no cover - dependencia opcional
+            logger.info("prometheus_client no esta instalado; metricas de Sheets desactivadas.")
+            _metrics = False
+            return None
+        labels = ["operation", "worksheet"]
+        _metrics = {
+            "requests": Counter(
+                "sheets_api_requests_total", "Llamadas a la API de Google Sheets.",
+                labels + ["status"]),
+            "latency": Histogram(
+                "sheets_api_request_duration_seconds",
+                "Latencia de las llamadas a la API de Google Sheets.",
+                labels, buckets=LATENCY_BUCKETS),
+            "errors": Counter(
+                "sheets_api_errors_total", "Llamadas fallidas por clase de error.",
+                labels + ["error"]),
+            "rows": Counter(
+                "sheets_api_rows_total", "Filas escritas.",
+                labels + ["direction"]),
+            "bytes": Counter(
+                "sheets_api_payload_bytes_total", "Bytes enviados o recibidos.",
+                labels + ["direction"]),
+        }
+        return _metrics
+
+
+# ==========================
+# CLASIFICACION DEL ENDPOINT
+# ==========================
+def _worksheet(a1_range):
+    """Hoja de un rango A1 ("'SOCIOS'!A1:B" -> "SOCIOS"); "" si no la indica."""
+    a1_range = unquote(str(a1_range or ""))
+    if "!" in a1_range:
+        name = a1_range.rsplit("!", 1)[0]
+    elif a1_range.startswith("'"):
+        name = a1_range
+    else:
+        return ""
+    if name.startswith("'") and name.endswith("'"):
+        name = name[1:-1].replace("''", "'")
+    return name
+
+
+def _worksheet_of_many(ranges):
+    names = {_worksheet(rng) for rng in ranges or ()}
+    if len(names) == 1:
+        return names.pop()
+    return "multiple" if names else ""
+
+
+def classify(method, endpoint, params=None, body=None):
+    """``(operacion, hoja)`` de una llamada a la API."""
+    parts = urlsplit(str(endpoint))
+    path = parts.path
+    if "drive" in parts.netloc:
+        return "drive", ""
+    if "/values:" in path:
+        operation = "values_" + path.rsplit(":", 1)[1]
+        if operation == "values_batchGet":
+            ranges = (params or {}).get("ranges") or []
+        else:
+            ranges = [item.get("range", "") for item in (body or {}).get("data", [])]
+        return operation, _worksheet_of_many(ranges)
+    if "/values/" in path:
+        a1_range = path.split("/values/", 1)[1]
+        for suffix in (":append", ":clear"):
+            if a1_range.endswith(suffix):
+                return "values_" + suffix[1:], _worksheet(a1_range[:-len(suffix)])
+        operation = "values_get" if method.upper() == "GET" else "values_update"
+        return operation, _worksheet(a1_range)
+    if path.endswith(":batchUpdate"):
+        return "batch_update", ""
+    return "metadata", ""
+
+
+def _rows_in(payload):
+    """Filas de valores en el cuerpo de una escritura."""
+    if not isinstance(payload, dict):
+        return 0
+    if "values" in payload:
+        return len(payload["values"] or [])
+    if "updates" in payload:
+        return payload["updates"].get("updatedRows", 0) or 0
+    items = payload.get("valueRanges") or payload.get("data") or []
+    return sum(len(item.get("values") or []) for item in items)
+
+
+# ==========================
+# REGISTRO
+# ==========================
+def record(method, endpoint, seconds, status=None, error=None, params=None,
+           body=None, response=None):
+    """
+    Registra una llamada. ``status`` es el HTTP status (None si no hubo
+    respuesta), ``error`` la excepcion si fallo, ``body`` el JSON enviado y
+    ``response`` la respuesta (requests o httpx). Nunca lanza.
+    """
+    metrics = _get_metrics()
+    if metrics is None:
+        return
+    try:
+        operation, worksheet = classify(method, endpoint, params, body)
+        metrics["requests"].labels(operation, worksheet,
+                                   str(status) if status else "error").inc()
+        metrics["latency"].labels(operation, worksheet).observe(seconds)
+        if error is not None:
+            metrics["errors"].labels(operation, worksheet, type(error).__name__).inc()
+
+        if body is not None:
+            metrics["bytes"].labels(operation, worksheet, "sent").inc(
+                len(json.dumps(body, default=str)))
+            metrics["rows"].labels(operation, worksheet, "written").inc(_rows_in(body))
+        content = getattr(response, "content", None)
+        if content:
+            metrics["bytes"].labels(operation, worksheet, "received").inc(len(content))
+    except Exception:
+        logger.debug("No se pudo registrar la metrica de Sheets.", exc_info=True)
+
+
+def render():
+    """
+    ``(cuerpo, content_type)`` en formato de texto de Prometheus, o None si
+    prometheus_client no esta disponible. En modo multiproceso agrega los
+    archivos de todos los workers.
+    """
+    if _get_metrics() is None:
+        return None
+    from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest
+
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid):
+    """Para el hook child_exit de gunicorn en modo multiproceso."""
+    directory = metrics_dir()
+    if not directory:
+        return
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:  # pragma: no cover - dependencia opcional
+        return
+    multiprocess.mark_process_dead(pid, directory)
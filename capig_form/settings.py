@@ -56,6 +56,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'capig_form.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -64,6 +65,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'capig_form.middleware.SheetSnapshotMiddleware',
 ]
 
 ROOT_URLCONF = 'capig_form.urls'
@@ -97,6 +99,8 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Varios workers escriben el outbox a la vez; esperar el lock en lugar de fallar.
+        'OPTIONS': {'timeout': 20},
     }
 }
 
@@ -142,7 +146,100 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 SHEET_PATH = env.str('SHEET_PATH')
-SERVICE = env.str('SERVICE')
+# Cuenta de servicio de Google (JSON o JSON en base64). Se valida en el primer
+# uso o con `manage.py check_sheets`, no al arrancar.
+SERVICE = env.str('SERVICE', default='')
 
 # Código de seguridad para formularios (6 dígitos)
 SECURITY_CODE = env.str('SECURITY_CODE', default='123456')
+
+# ==========================
+# Google Sheets
+# ==========================
+# Segundos que se reutilizan los handles de documento/hoja antes de volver a listarlos.
+SHEETS_HANDLE_TTL = env.int('SHEETS_HANDLE_TTL', default=600)
+# Modo de insercion de filas nuevas: 'append' (values.append, sin lecturas previas)
+# o 'first_empty' (primera fila en blanco; para hojas con filas preformateadas).
+SHEETS_DEFAULT_INSERT_MODE = env.str('SHEETS_DEFAULT_INSERT_MODE', default='append')
+# Excepciones por hoja, p. ej. {'SOCIOS': 'first_empty'}.
+SHEETS_INSERT_MODES = {}
+
+# Outbox local (SQLite) para las escrituras de los formularios.
+SHEETS_OUTBOX_ENABLED = env.bool('SHEETS_OUTBOX_ENABLED', default=True)
+# Vaciar el outbox desde un hilo en cada worker (si no, usar manage.py flush_outbox).
+SHEETS_OUTBOX_AUTOFLUSH = env.bool('SHEETS_OUTBOX_AUTOFLUSH', default=True)
+SHEETS_OUTBOX_INTERVAL = env.int('SHEETS_OUTBOX_INTERVAL', default=5)
+SHEETS_OUTBOX_MAX_ATTEMPTS = env.int('SHEETS_OUTBOX_MAX_ATTEMPTS', default=12)
+SHEETS_OUTBOX_BACKOFF_BASE = env.int('SHEETS_OUTBOX_BACKOFF_BASE', default=5)
+SHEETS_OUTBOX_BACKOFF_MAX = env.int('SHEETS_OUTBOX_BACKOFF_MAX', default=900)
+
+# Filas maximas por escritura cuando el outbox agrupa entradas de una hoja.
+SHEETS_BATCH_MAX_ROWS = env.int('SHEETS_BATCH_MAX_ROWS', default=50)
+
+# Cuota de Sheets API compartida entre workers (token bucket en SQLite).
+SHEETS_READ_QUOTA_PER_MINUTE = env.int('SHEETS_READ_QUOTA_PER_MINUTE', default=60)
+SHEETS_WRITE_QUOTA_PER_MINUTE = env.int('SHEETS_WRITE_QUOTA_PER_MINUTE', default=60)
+SHEETS_QUOTA_DB = BASE_DIR / 'sheets_quota.sqlite3'
+SHEETS_LIMITER_MAX_WAIT = env.float('SHEETS_LIMITER_MAX_WAIT', default=20.0)
+# Reintentos ante 429/5xx: backoff exponencial con jitter, respetando Retry-After.
+SHEETS_MAX_RETRIES = env.int('SHEETS_MAX_RETRIES', default=5)
+SHEETS_BACKOFF_BASE = env.float('SHEETS_BACKOFF_BASE', default=1.0)
+SHEETS_BACKOFF_MAX = env.float('SHEETS_BACKOFF_MAX', default=32.0)
+
+# Indices en memoria por RUC (ESTADO_SOCIO, SOCIOS): TTL antes de recargar en
+# segundo plano y minimo entre recargas forzadas por un RUC no encontrado.
+SHEETS_INDEX_TTL = env.int('SHEETS_INDEX_TTL', default=300)
+SHEETS_INDEX_MISS_REFRESH_INTERVAL = env.float('SHEETS_INDEX_MISS_REFRESH_INTERVAL', default=2.0)
+# Las actualizaciones son incrementales (solo filas nuevas); cada tanto se
+# recarga la hoja completa para recoger ediciones a mitad de hoja.
+SHEETS_INDEX_FULL_RELOAD_EVERY = env.int('SHEETS_INDEX_FULL_RELOAD_EVERY', default=3600)
+
+# Copia local de las hojas (manage.py sync_sheets). Los indices y listas la usan
+# mientras no supere MAX_STALENESS segundos y, sin limite, si Google falla.
+SHEETS_MIRROR_ENABLED = env.bool('SHEETS_MIRROR_ENABLED', default=True)
+SHEETS_MIRROR_MAX_STALENESS = env.int('SHEETS_MIRROR_MAX_STALENESS', default=900)
+# Sincronizacion periodica dentro de los workers (0 = solo por comando).
+SHEETS_MIRROR_SYNC_INTERVAL = env.int('SHEETS_MIRROR_SYNC_INTERVAL', default=0)
+
+# Listas de los formularios (empresas, sectores): se sirven al instante y se
+# actualizan en segundo plano cuando superan este TTL (stale-while-revalidate).
+SHEETS_REFERENCE_TTL = env.int('SHEETS_REFERENCE_TTL', default=300)
+
+# Lecturas independientes en paralelo (p. ej. varias hojas de una consulta):
+# hilos del pool por worker y plazo total de espera en segundos.
+SHEETS_FANOUT_WORKERS = env.int('SHEETS_FANOUT_WORKERS', default=4)
+SHEETS_FANOUT_TIMEOUT = env.float('SHEETS_FANOUT_TIMEOUT', default=30.0)
+
+# Vistas async para los formularios que consultan Google Sheets. Requiere
+# servir por ASGI, p. ej.:
+#   gunicorn capig_form.asgi:application -k uvicorn.workers.UvicornWorker
+FORMS_ASYNC_VIEWS = env.bool('FORMS_ASYNC_VIEWS', default=False)
+# Cliente HTTP async (httpx) de Sheets: plazo por llamada y conexiones del pool.
+SHEETS_ASYNC_TIMEOUT = env.float('SHEETS_ASYNC_TIMEOUT', default=30.0)
+SHEETS_ASYNC_MAX_CONNECTIONS = env.int('SHEETS_ASYNC_MAX_CONNECTIONS', default=20)
+
+# Calentamiento al arrancar cada worker (gunicorn.conf.py): autenticacion,
+# hojas, indices y listas. Segundos que el hook espera antes de seguir en
+# segundo plano (debe ser menor que el --timeout de gunicorn).
+SHEETS_WARMUP_ENABLED = env.bool('SHEETS_WARMUP_ENABLED', default=True)
+SHEETS_WARMUP_TIMEOUT = env.float('SHEETS_WARMUP_TIMEOUT', default=60.0)
+# Segundos minimos entre reintentos de un calentamiento fallido (/ready/).
+SHEETS_WARMUP_RETRY_INTERVAL = env.float('SHEETS_WARMUP_RETRY_INTERVAL', default=30.0)
+
+# Metricas de Prometheus de cada llamada a Sheets en /metrics (requiere
+# prometheus_client). Con varios workers de gunicorn, SHEETS_METRICS_DIR es el
+# directorio del modo multiproceso (se vacia al arrancar el master).
+SHEETS_METRICS_ENABLED = env.bool('SHEETS_METRICS_ENABLED', default=True)
+SHEETS_METRICS_DIR = env.str('SHEETS_METRICS_DIR', default='')
+# Token para /metrics y el detalle de /ready/ (header "Authorization: Bearer
+# <token>"). Sin token solo se exponen con DEBUG; /ready/ publico responde
+# solo el status.
+INTERNAL_ENDPOINTS_TOKEN = env.str('INTERNAL_ENDPOINTS_TOKEN', default='')
+
+# Header Server-Timing con el desglose de cada peticion (Sheets, auth, render),
+# desactivado por defecto en prod para no exponerlo, y log JSON de las
+# peticiones que superan este umbral en milisegundos (logger
+# capig_form.slow_requests; 0 lo desactiva).
+SERVER_TIMING_ENABLED = env.bool('SERVER_TIMING_ENABLED',
+                                 default=env.str('ENVIRONMENT') != 'prod')
+SLOW_REQUEST_THRESHOLD_MS = env.int('SLOW_REQUEST_THRESHOLD_MS', default=2000)
@@ -17,8 +17,13 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from capig_form.health import health_check, metrics_view, readiness_check
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('health/', health_check, name='health'),  # liveness
+    path('ready/', readiness_check, name='ready'),  # calentamiento y caches
+    path('metrics', metrics_view, name='metrics'),  # Prometheus
     path('', include('forms.urls')),
 ]
 
@@ -0,0 +1,68 @@
+"""
+Configuracion de pytest: Django con una base de datos de prueba en memoria y
+el Google Sheets falso de ``benchmarks/fake_sheets.py`` (sin red ni
+credenciales). El outbox no se vacia solo: las pruebas llaman a
+``flush_outbox``.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+
+def pytest_configure(config):
+    from startup import _env
+
+    from fake_sheets import SPREADSHEET_ID
+
+    os.environ.update(_env())
+    os.environ.update({
+        "SHEET_PATH": SPREADSHEET_ID,
+        "SHEETS_OUTBOX_AUTOFLUSH": "false",
+        "SHEETS_WARMUP_ENABLED": "false",
+        "SHEETS_METRICS_ENABLED": "false",
+        "SLOW_REQUEST_THRESHOLD_MS": "0",
+        # El limitador local no es lo que se prueba.
+        "SHEETS_READ_QUOTA_PER_MINUTE": str(10 ** 6),
+        "SHEETS_WRITE_QUOTA_PER_MINUTE": str(10 ** 6),
+    })
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "capig_form.settings")
+
+    import django
+    from django.test.utils import override_settings, setup_test_environment
+
+    django.setup()
+    setup_test_environment()
+    override_settings(
+        SHEETS_QUOTA_DB=os.path.join(tempfile.mkdtemp(), "sheets_quota.sqlite3"),
+    ).enable()
+
+
+@pytest.fixture(scope="session")
+def django_db():
+    from django.db import connection
+
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0)
+    yield connection
+    connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+@pytest.fixture
+def sheets(django_db):
+    """Backend falso recien creado, instalado como cliente del proceso."""
+    from capig_form.services import google_sheets_service as service
+    from fake_sheets import FakeSheetsBackend, build_workbook, install
+    from forms.models import OutboxEntry
+
+    backend = FakeSheetsBackend(build_workbook(socios=20))
+    service.invalidate_sheet_cache()
+    install(backend)
+    yield backend
+    OutboxEntry.objects.all().delete()
+    service.invalidate_sheet_cache()
@@ -0,0 +1,134 @@
+"""
+Versiones asyncio de las consultas y escrituras de ``forms.utils`` para las
+vistas ASGI.
+
+Usan los mismos indices en memoria que la version sincronica; lo que va a
+Google (relecturas por un RUC no encontrado, upsert de ESTADO_SOCIO) pasa por
+``async_sheets_service`` y no ocupa un hilo mientras espera. La primera carga
+de un indice (que puede leer la copia local en la base de datos) se hace en
+un hilo.
+"""
+import asyncio
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+
+from capig_form.services import async_sheets_service as async_sheets
+from forms import utils
+from forms.services import sheet_schema
+from forms.services.sheet_index import _sheet_id, ensure_fresh_many
+
+ESTADO_SOCIO = "ESTADO_SOCIO"
+
+
+def _en_frio(*indexes):
+    return any(index.age() is None for index in indexes)
+
+
+async def _asegurar_cargados(*indexes):
+    """Como ``ensure_fresh_many``; solo bloquea un hilo si hay indices sin cargar."""
+    if _en_frio(*indexes):
+        await sync_to_async(ensure_fresh_many, thread_sensitive=False)(*indexes)
+    else:
+        ensure_fresh_many(*indexes)
+
+
+async def abuscar_afiliado_por_ruc(ruc):
+    """Igual que ``utils.buscar_afiliado_por_ruc``."""
+    ruc = utils.limpiar_ruc(ruc)
+    await _asegurar_cargados(utils._estado_index, utils._socios_index)
+
+    hit = utils._estado_index.peek(ruc)
+    base = None
+    if hit is None:
+        hit, base = await asyncio.gather(
+            utils._estado_index.aget(ruc),
+            utils._socios_index.aget(ruc),
+        )
+    return utils._resultado_busqueda(hit, base)
+
+
+async def abuscar_afiliado_por_ruc_base_datos(ruc):
+    """Igual que ``utils.buscar_afiliado_por_ruc_base_datos``."""
+    await _asegurar_cargados(utils._socios_index, utils._ventas_index)
+    return utils._afiliado_base(await utils._socios_index.aget(ruc))
+
+
+async def aobtener_ventas_por_ruc(ruc):
+    """Igual que ``utils.obtener_ventas_por_ruc``."""
+    if _en_frio(utils._ventas_index, utils._socios_index):
+        return await sync_to_async(
+            utils.obtener_ventas_por_ruc, thread_sensitive=False)(ruc)
+    # Con los indices cargados el historial se arma en memoria.
+    return utils.obtener_ventas_por_ruc(ruc)
+
+
+async def _aubicar_en_estado(sheet_id, ruc):
+    """Como ``utils._ubicar_en_estado``: una lectura de encabezado y columna RUC."""
+    columna = utils._columna_ruc(utils._estado_index.header) or "A"
+    encabezado, rucs = await async_sheets.values_batch_get(
+        sheet_id,
+        [(ESTADO_SOCIO, "1:1"), (ESTADO_SOCIO, f"{columna}2:{columna}")],
+        value_render_option="FORMATTED_VALUE",
+    )
+    header = list(encabezado[0]) if encabezado else []
+    if utils._columna_ruc(header) not in (None, columna):
+        # La columna RUC se movio desde la ultima carga del indice.
+        utils._estado_index.invalidate()
+        hit = await utils._estado_index.aget(ruc)
+        return utils._estado_index.header, (hit[0] if hit else None)
+
+    for offset, valores in enumerate(rucs):
+        if valores and utils.limpiar_ruc(valores[0]) == ruc:
+            return header, offset + 2
+    return header, None
+
+
+async def _averificar_fila_estado(sheet_id, ruc, fila):
+    """Como ``utils._verificar_fila_estado``: encabezado y celda RUC de ``fila``."""
+    columna = utils._columna_ruc(utils._estado_index.header)
+    if columna is None:
+        return None
+    encabezado, celda = await async_sheets.values_batch_get(
+        sheet_id,
+        [(ESTADO_SOCIO, "1:1"), (ESTADO_SOCIO, f"{columna}{fila}")],
+        value_render_option="FORMATTED_VALUE",
+    )
+    return utils._encabezado_si_coincide(encabezado, celda, columna, ruc)
+
+
+async def aactualizar_estado_afiliado(ruc, nuevo_estado, afiliado=None):
+    """
+    Igual que ``utils.actualizar_estado_afiliado``: un solo batchUpdate si el
+    RUC ya tiene fila en ESTADO_SOCIO, o un solo append si no.
+    """
+    ruc = utils.limpiar_ruc(ruc)
+    sheet_id = _sheet_id()
+    ahora = datetime.now().strftime("%Y-%m-%d %H:%M")
+
+    header_original = None
+    if afiliado is not None and afiliado.get("fila_estado") and utils._estado_index.header:
+        fila = afiliado["fila_estado"]
+        header_original = await _averificar_fila_estado(sheet_id, ruc, fila)
+    if header_original is None:
+        header_original, fila = await _aubicar_en_estado(sheet_id, ruc)
+    esquema = sheet_schema.ESTADO_SOCIO.compile(header_original)
+
+    if fila:
+        rangos, cambios = utils._cambios_de_estado(
+            esquema, header_original, fila, nuevo_estado, ahora)
+        if rangos:
+            await async_sheets.batch_update_values(
+                sheet_id, [(ESTADO_SOCIO, rango, [[valor]]) for rango, valor in rangos])
+        utils._estado_index.put(ruc, fila, cambios)
+        return
+
+    if afiliado is None:
+        base = await utils._socios_index.aget(ruc)
+        afiliado = utils._afiliado_desde_fila(base[1] if base else {})
+    new_row = utils._fila_de_estado(
+        esquema, header_original, ruc, afiliado, nuevo_estado, ahora)
+
+    fila = await async_sheets.write_rows(sheet_id, ESTADO_SOCIO, [new_row])
+    if fila:
+        utils._estado_index.put(ruc, fila, dict(zip(header_original, new_row)))
@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from capig_form.services.google_sheets_service import (
+    get_client_stats,
+    get_google_sheet,
+    get_service_account_info,
+)
+
+# Hojas que la app lee o escribe.
+HOJAS = ("SOCIOS", "ESTADO_SOCIO", "VENTAS_SOCIO", "SECTOR", "ASESORIAS", "CAPACITACIONES")
+
+
+class Command(BaseCommand):
+    help = ("Valida la configuracion de Google Sheets (SERVICE, SHEET_PATH) y, "
+            "salvo --offline, que la cuenta de servicio pueda abrir las hojas.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--offline", action="store_true",
+            help="Solo valida SERVICE y SHEET_PATH, sin llamar a Google.")
+
+    def handle(self, *args, **options):
+        try:
+            info = get_service_account_info()
+        except RuntimeError as exc:
+            raise CommandError(str(exc)) from exc
+        self.stdout.write(f"SERVICE: cuenta {info['client_email']} ({info['project_id']})")
+
+        sheet_id = getattr(settings, "SHEET_PATH", "")
+        if not sheet_id:
+            raise CommandError("SHEET_PATH no esta configurado.")
+        self.stdout.write(f"SHEET_PATH: {sheet_id}")
+
+        if options["offline"]:
+            return
+
+        faltantes = []
+        for hoja in HOJAS:
+            try:
+                get_google_sheet(sheet_id, hoja)
+            except Exception as exc:
+                faltantes.append(hoja)
+                self.stderr.write(f"{hoja}: {type(exc).__name__}: {exc}")
+            else:
+                self.stdout.write(f"{hoja}: ok")
+        self.stdout.write(f"Cliente: {get_client_stats()}")
+        if faltantes:
+            raise CommandError(f"No se pudieron abrir: {', '.join(faltantes)}")
+        self.stdout.write(self.style.SUCCESS("Google Sheets configurado correctamente."))
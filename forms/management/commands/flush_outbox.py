@@ -0,0 +1,39 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from forms.services.outbox import flush_outbox, outbox_stats, retry_failed
+
+
+class Command(BaseCommand):
+    help = "Envia a Google Sheets las escrituras pendientes del outbox local."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--stats", action="store_true",
+            help="Solo muestra profundidad y antiguedad de la cola.")
+        parser.add_argument(
+            "--retry-failed", action="store_true",
+            help="Vuelve a encolar las entradas que agotaron sus reintentos.")
+        parser.add_argument(
+            "--loop", action="store_true",
+            help="Sigue vaciando la cola cada --interval segundos.")
+        parser.add_argument("--interval", type=float, default=5.0)
+
+    def handle(self, *args, **options):
+        if options["stats"]:
+            self.stdout.write(json.dumps(outbox_stats(), indent=2))
+            return
+
+        if options["retry_failed"]:
+            count = retry_failed()
+            self.stdout.write(f"{count} entradas devueltas a pendiente.")
+
+        while True:
+            result = flush_outbox()
+            self.stdout.write(
+                "enviadas={sent} reintentos={retried} fallidas={failed}".format(**result))
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from forms.services.sheet_mirror import sync_sheets
+
+
+class Command(BaseCommand):
+    help = "Copia las hojas de Google Sheets a la base local (copia de solo lectura)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "hojas", nargs="*",
+            help="Hojas a sincronizar (SOCIOS, ESTADO_SOCIO, VENTAS_SOCIO, SECTOR, EMPRESAS). Por defecto todas.")
+
+    def handle(self, *args, **options):
+        result = sync_sheets(options["hojas"] or None)
+        for hoja, filas in result.items():
+            self.stdout.write(f"{hoja}: {filas} filas")
+        if not result:
+            self.stderr.write("No se sincronizo ninguna hoja; revisa los logs.")
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forms', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SheetMirrorState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('worksheet', models.CharField(max_length=128, unique=True)),
+                ('header', models.JSONField(default=list)),
+                ('header_row', models.PositiveIntegerField(default=1)),
+                ('row_count', models.PositiveIntegerField(default=0)),
+                ('synced_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SheetMirrorRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('worksheet', models.CharField(max_length=128)),
+                ('row_number', models.PositiveIntegerField()),
+                ('key', models.CharField(blank=True, default='', max_length=255)),
+                ('data', models.JSONField()),
+            ],
+            options={
+                'ordering': ['worksheet', 'row_number'],
+                'indexes': [models.Index(fields=['worksheet', 'key'], name='mirror_ws_key_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='sheetmirrorrow',
+            constraint=models.UniqueConstraint(fields=('worksheet', 'row_number'), name='mirror_unique_row'),
+        ),
+    ]
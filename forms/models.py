@@ -0,0 +1,68 @@
+from django.db import models
+
+
+class OutboxEntry(models.Model):
+    """
+    Escritura pendiente hacia Google Sheets. Las vistas guardan aqui la
+    operacion y responden de inmediato; el flusher la envia despues, en orden
+    por cola (una cola por hoja destino).
+    """
+
+    PENDING = "pending"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pendiente"),
+        (FAILED, "Fallido"),
+    ]
+
+    operation = models.CharField(max_length=64)
+    queue = models.CharField(max_length=128, db_index=True)
+    payload = models.JSONField()
+    status = models.CharField(
+        max_length=16, choices=STATUS_CHOICES, default=PENDING, db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(fields=["status", "id"], name="outbox_status_id_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.operation}#{self.pk} ({self.queue}, {self.status})"
+
+
+class SheetMirrorState(models.Model):
+    """Estado de la copia local de una hoja: encabezado y ultima sincronizacion."""
+
+    worksheet = models.CharField(max_length=128, unique=True)
+    header = models.JSONField(default=list)
+    header_row = models.PositiveIntegerField(default=1)
+    row_count = models.PositiveIntegerField(default=0)
+    synced_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.worksheet} ({self.row_count} filas, {self.synced_at:%Y-%m-%d %H:%M})"
+
+
+class SheetMirrorRow(models.Model):
+    """Fila de una hoja copiada localmente, indexada por su clave normalizada."""
+
+    worksheet = models.CharField(max_length=128)
+    row_number = models.PositiveIntegerField()
+    key = models.CharField(max_length=255, blank=True, default="")
+    data = models.JSONField()
+
+    class Meta:
+        ordering = ["worksheet", "row_number"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["worksheet", "row_number"], name="mirror_unique_row"),
+        ]
+        indexes = [
+            models.Index(fields=["worksheet", "key"], name="mirror_ws_key_idx"),
+        ]
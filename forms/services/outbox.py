@@ -0,0 +1,412 @@
+"""
+Outbox local de escrituras hacia Google Sheets.
+
+Las vistas llaman a ``submit`` en lugar de escribir en la hoja: la operacion se
+guarda en SQLite (modelo ``OutboxEntry``) y la respuesta sale de inmediato. Un
+hilo en segundo plano (o ``manage.py flush_outbox``) vacia la cola en orden,
+reintentando con backoff exponencial cuando Google falla o devuelve 429.
+"""
+import logging
+import os
+import random
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from capig_form.services import request_timing
+from forms.models import OutboxEntry
+
+logger = logging.getLogger(__name__)
+
+# Reserva minima de una entrada mientras un worker la envia (ver _lease_seconds).
+LEASE_SECONDS = 120
+# Entradas revisadas por ciclo de flush.
+BATCH_SIZE = 500
+
+_operations = {}
+_group_operations = {}
+_flusher = None
+_flusher_lock = threading.Lock()
+_wake_up = threading.Event()
+
+
+def _reset_after_fork():
+    # El flusher del padre no existe en el hijo; su lock pudo quedar tomado.
+    global _flusher, _flusher_lock
+    _flusher = None
+    _flusher_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class OutboxError(Exception):
+    """La operacion se ejecuto pero Google Sheets no confirmo la escritura."""
+
+
+def register_operation(name):
+    """Registra la funcion que ejecuta una operacion a partir de su payload."""
+    def decorator(func):
+        _operations[name] = func
+        return func
+    return decorator
+
+
+def register_group_operation(name, group_by, rows=None):
+    """
+    Registra una version agrupada de la operacion: recibe la lista de payloads
+    consecutivos de la misma cola con igual ``group_by(payload)`` y los envia
+    en una sola escritura (todo o nada). Si la misma funcion se registra para
+    varias operaciones, sus entradas se agrupan entre si. ``rows(payload)``
+    es el numero de filas que escribe cada payload (1 por defecto), para no
+    superar SHEETS_BATCH_MAX_ROWS filas por escritura.
+    """
+    def decorator(func):
+        _group_operations[name] = (group_by, func, rows or (lambda payload: 1))
+        return func
+    return decorator
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _run(operation, payload, handlers=None):
+    handler = (handlers or _operations).get(operation)
+    if handler is None:
+        raise OutboxError(f"Operacion de outbox desconocida: {operation}")
+    if handler(payload) is False:
+        raise OutboxError(f"La operacion '{operation}' devolvio False.")
+
+
+def submit(operation, payload, queue):
+    """
+    Encola una escritura y devuelve True. Si el outbox esta deshabilitado o la
+    tabla no esta disponible, ejecuta la operacion en linea y devuelve su
+    resultado (False si fallo), como antes de existir el outbox.
+    """
+    if _setting("SHEETS_OUTBOX_ENABLED", True):
+        try:
+            with request_timing.span("outbox"):
+                OutboxEntry.objects.create(
+                    operation=operation, queue=queue, payload=payload)
+        except DatabaseError:
+            logger.exception(
+                "No se pudo encolar '%s'; se escribe directamente.", operation)
+        else:
+            ensure_flusher()
+            _wake_up.set()
+            return True
+
+    try:
+        _run(operation, payload)
+        return True
+    except Exception:
+        logger.exception("Fallo la escritura directa '%s'.", operation)
+        return False
+
+
+def _backoff(attempts):
+    base = _setting("SHEETS_OUTBOX_BACKOFF_BASE", 5)
+    cap = _setting("SHEETS_OUTBOX_BACKOFF_MAX", 900)
+    delay = min(cap, base * (2 ** max(attempts - 1, 0)))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _lease_seconds():
+    """
+    Duracion de la reserva: el doble del peor caso de una llamada a Sheets
+    (espera del limitador en cada intento mas el backoff maximo entre
+    reintentos), y nunca menos de LEASE_SECONDS. Como una operacion puede
+    hacer varias llamadas o recibir un Retry-After largo, ademas se renueva
+    mientras corre (``_keep_lease``).
+    """
+    retries = _setting("SHEETS_MAX_RETRIES", 5)
+    max_wait = _setting("SHEETS_LIMITER_MAX_WAIT", 20.0)
+    base = _setting("SHEETS_BACKOFF_BASE", 1.0)
+    cap = _setting("SHEETS_BACKOFF_MAX", 32.0)
+    backoff = sum(min(cap, base * (2 ** attempt)) for attempt in range(retries))
+    return max(LEASE_SECONDS, 2 * ((retries + 1) * max_wait + backoff))
+
+
+def _claim(entry, now):
+    """Reserva la entrada para este proceso; False si otro worker la tomo."""
+    return OutboxEntry.objects.filter(
+        Q(locked_until__isnull=True) | Q(locked_until__lt=now),
+        pk=entry.pk,
+        status=OutboxEntry.PENDING,
+    ).update(locked_until=now + timedelta(seconds=_lease_seconds())) == 1
+
+
+@contextmanager
+def _keep_lease(entries):
+    """
+    Renueva la reserva de ``entries`` cada tercio de su duracion mientras se
+    ejecuta el bloque, para que otro worker no las vuelva a tomar (y duplique
+    la escritura) si el envio tarda mas que la reserva.
+    """
+    lease = _lease_seconds()
+    pks = [entry.pk for entry in entries]
+    stop = threading.Event()
+
+    def _renew():
+        try:
+            while not stop.wait(lease / 3):
+                OutboxEntry.objects.filter(
+                    pk__in=pks, status=OutboxEntry.PENDING,
+                ).update(locked_until=timezone.now() + timedelta(seconds=lease))
+        except DatabaseError:
+            logger.exception("Outbox: no se pudo renovar la reserva de %s.", pks)
+        finally:
+            close_old_connections()
+
+    thread = threading.Thread(target=_renew, name="sheets-outbox-lease", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _collect_group(entry, pending, now, max_rows):
+    """
+    Entrada mas las siguientes de su cola que pueden ir en la misma escritura:
+    misma funcion agrupada, misma clave y hasta ``max_rows`` filas en total.
+    """
+    group_by, send_group, rows = _group_operations[entry.operation]
+    key = group_by(entry.payload)
+    group = [entry]
+    total = rows(entry.payload)
+    for other in pending:
+        if other.pk <= entry.pk or other.queue != entry.queue:
+            continue
+        other_by, other_send, other_rows = _group_operations.get(
+            other.operation, (None, None, None))
+        if (other_send is not send_group
+                or other_by(other.payload) != key
+                or (other.next_attempt_at and other.next_attempt_at > now)):
+            break
+        size = other_rows(other.payload)
+        if total + size > max_rows:
+            break
+        group.append(other)
+        total += size
+    return group
+
+
+def _record_failure(entry, exc, now, max_attempts, result):
+    entry.attempts += 1
+    entry.last_error = f"{type(exc).__name__}: {exc}"
+    entry.locked_until = None
+    if entry.attempts >= max_attempts:
+        entry.status = OutboxEntry.FAILED
+        result["failed"] += 1
+        logger.error("Outbox: %s agoto sus reintentos: %s",
+                     entry, entry.last_error)
+    else:
+        entry.next_attempt_at = now + timedelta(
+            seconds=_backoff(entry.attempts))
+        result["retried"] += 1
+        logger.warning("Outbox: %s fallo (intento %s): %s",
+                       entry, entry.attempts, entry.last_error)
+    entry.save(update_fields=[
+        "attempts", "last_error", "locked_until", "status", "next_attempt_at",
+    ])
+
+
+def flush_outbox(limit=None, handlers=None):
+    """
+    Envia las entradas pendientes en orden de llegada. Dentro de una cola, una
+    entrada que falla (o que otro worker esta enviando) bloquea a las
+    siguientes hasta el proximo ciclo para no alterar el orden. Las entradas
+    consecutivas de una operacion agrupable se envian en una sola escritura
+    de hasta SHEETS_BATCH_MAX_ROWS filas.
+
+    ``handlers`` permite sustituir las operaciones registradas, por ejemplo
+    por un backend falso de Sheets en pruebas; en ese caso no se agrupa.
+    """
+    result = {"sent": 0, "retried": 0, "failed": 0}
+    max_attempts = _setting("SHEETS_OUTBOX_MAX_ATTEMPTS", 12)
+    max_rows = _setting("SHEETS_BATCH_MAX_ROWS", 50)
+    blocked = set()
+    processed = set()
+    now = timezone.now()
+
+    # Se materializa la lista: SQLite no aisla un cursor abierto de las
+    # escrituras hechas sobre la misma tabla durante la iteracion.
+    pending = list(OutboxEntry.objects.filter(
+        status=OutboxEntry.PENDING).order_by("id")[:BATCH_SIZE])
+    for entry in pending:
+        if limit is not None and result["sent"] >= limit:
+            break
+        if entry.pk in processed or entry.queue in blocked:
+            continue
+        if entry.next_attempt_at and entry.next_attempt_at > now:
+            blocked.add(entry.queue)
+            continue
+
+        if handlers is None and entry.operation in _group_operations:
+            group = _collect_group(entry, pending, now, max_rows)
+        else:
+            group = [entry]
+        claimed = []
+        for member in group:
+            if not _claim(member, now):
+                break
+            claimed.append(member)
+        if not claimed:
+            blocked.add(entry.queue)
+            continue
+        processed.update(member.pk for member in claimed)
+
+        try:
+            with _keep_lease(claimed):
+                if len(claimed) > 1:
+                    _, send_group, _ = _group_operations[entry.operation]
+                    if send_group([member.payload for member in claimed]) is False:
+                        raise OutboxError(
+                            f"La operacion agrupada '{entry.operation}' devolvio False.")
+                else:
+                    _run(entry.operation, entry.payload, handlers)
+        except Exception as exc:
+            blocked.add(entry.queue)
+            for member in claimed:
+                _record_failure(member, exc, now, max_attempts, result)
+        else:
+            OutboxEntry.objects.filter(
+                pk__in=[member.pk for member in claimed]).delete()
+            result["sent"] += len(claimed)
+            if len(claimed) < len(group):
+                # Otro worker tomo el resto del grupo; respetar su orden.
+                blocked.add(entry.queue)
+        now = timezone.now()
+
+    return result
+
+
+def retry_failed(queue=None):
+    """Devuelve a pendiente las entradas que agotaron sus reintentos."""
+    failed = OutboxEntry.objects.filter(status=OutboxEntry.FAILED)
+    if queue:
+        failed = failed.filter(queue=queue)
+    with transaction.atomic():
+        return failed.update(
+            status=OutboxEntry.PENDING, attempts=0, next_attempt_at=None,
+            locked_until=None)
+
+
+def outbox_stats():
+    """Profundidad y antiguedad de la cola, en total y por hoja destino."""
+    now = timezone.now()
+    stats = {"pending": 0, "failed": 0,
+             "oldest_pending_age_seconds": None, "queues": {}}
+    rows = (OutboxEntry.objects.order_by()
+            .values("queue", "status")
+            .annotate(total=Count("id"), oldest=Min("created_at")))
+    for row in rows:
+        queue_stats = stats["queues"].setdefault(
+            row["queue"],
+            {"pending": 0, "failed": 0, "oldest_pending_age_seconds": None})
+        queue_stats[row["status"]] = row["total"]
+        stats[row["status"]] += row["total"]
+        if row["status"] == OutboxEntry.PENDING:
+            age = (now - row["oldest"]).total_seconds()
+            queue_stats["oldest_pending_age_seconds"] = age
+            oldest = stats["oldest_pending_age_seconds"]
+            if oldest is None or age > oldest:
+                stats["oldest_pending_age_seconds"] = age
+    return stats
+
+
+# ==========================
+# FLUSHER EN SEGUNDO PLANO
+# ==========================
+def _flusher_loop():
+    interval = _setting("SHEETS_OUTBOX_INTERVAL", 5)
+    while True:
+        _wake_up.wait(interval)
+        _wake_up.clear()
+        try:
+            flush_outbox()
+        except Exception:
+            logger.exception("Error vaciando el outbox de Google Sheets.")
+        finally:
+            close_old_connections()
+
+
+def ensure_flusher():
+    """Arranca (una vez por proceso) el hilo que vacia el outbox."""
+    global _flusher
+    if not _setting("SHEETS_OUTBOX_AUTOFLUSH", True):
+        return
+    with _flusher_lock:
+        if _flusher is not None and _flusher.is_alive():
+            return
+        _flusher = threading.Thread(
+            target=_flusher_loop, name="sheets-outbox", daemon=True)
+        _flusher.start()
+
+
+# ==========================
+# OPERACIONES REGISTRADAS
+# ==========================
+@register_operation("insert_row")
+def _insert_row(payload):
+    from capig_form.services.google_sheets_service import insert_row_to_sheet
+
+    return insert_row_to_sheet(
+        payload["sheet_id"], payload["worksheet"], payload["row"])
+
+
+@register_group_operation(
+    "insert_row", group_by=lambda payload: (payload["sheet_id"], payload["worksheet"]))
+def _insert_rows(payloads):
+    from capig_form.services.google_sheets_service import insert_rows_to_sheet
+
+    first = payloads[0]
+    return insert_rows_to_sheet(
+        first["sheet_id"], first["worksheet"],
+        [payload["row"] for payload in payloads])
+
+
+@register_operation("nuevo_afiliado")
+def _nuevo_afiliado(payload):
+    from forms.afiliacion_handler import guardar_nuevo_afiliado_en_google_sheets
+
+    return guardar_nuevo_afiliado_en_google_sheets(payload)
+
+
+@register_operation("ventas_afiliado")
+def _ventas_afiliado(payload):
+    from forms.utils import guardar_ventas_afiliado
+
+    guardar_ventas_afiliado(payload)
+
+
+@register_operation("ventas_afiliado_bulk")
+def _ventas_afiliado_bulk(payload):
+    from forms.utils import guardar_ventas_afiliado_bulk
+
+    guardar_ventas_afiliado_bulk(payload["registros"])
+
+
+def _registros_de_ventas(payload):
+    return payload["registros"] if "registros" in payload else [payload]
+
+
+@register_group_operation("ventas_afiliado", group_by=lambda payload: "VENTAS_SOCIO",
+                          rows=lambda payload: len(_registros_de_ventas(payload)))
+@register_group_operation("ventas_afiliado_bulk", group_by=lambda payload: "VENTAS_SOCIO",
+                          rows=lambda payload: len(_registros_de_ventas(payload)))
+def _ventas_afiliado_grupo(payloads):
+    from forms.utils import guardar_ventas_afiliado_bulk
+
+    guardar_ventas_afiliado_bulk(
+        [data for payload in payloads for data in _registros_de_ventas(payload)])
@@ -0,0 +1,637 @@
+"""
+Indices en memoria de hojas de Google Sheets.
+
+Cada ``SheetIndex`` descarga su hoja una vez, guarda las filas como dicts y
+las indexa por una columna clave normalizada (el RUC). Las busquedas son un
+acceso a dict; cuando el TTL vence se sirven los datos actuales mientras un
+hilo actualiza el indice en segundo plano.
+
+Las hojas de afiliados son casi solo de agregado, asi que la actualizacion es
+incremental: una sola lectura trae el encabezado, una muestra de celdas de la
+columna clave y las filas nuevas al final. Si el encabezado o la muestra
+cambiaron (filas editadas, borradas u ordenadas a mitad de hoja) se hace una
+recarga completa; tambien cada SHEETS_INDEX_FULL_RELOAD_EVERY segundos, para
+recoger ediciones en columnas que no se muestrean.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from capig_form.services.google_sheets_service import (
+    _column_letters,
+    get_google_sheet,
+    read_columns,
+    run_parallel,
+    values_batch_get,
+)
+
+logger = logging.getLogger(__name__)
+
+# Celdas de la columna clave que se comparan en cada sincronizacion.
+SAMPLE_SIZE = 16
+
+_registry = {}
+
+
+def all_indexes():
+    """Indices creados en este proceso, por nombre de hoja."""
+    return dict(_registry)
+
+
+def _reset_locks_after_fork():
+    """
+    En el hijo de un fork: locks nuevos en cada indice. Si un hilo del padre
+    estaba actualizando, su lock quedaria tomado y el indice no se
+    actualizaria nunca.
+    """
+    for index in _registry.values():
+        index._lock = threading.Lock()
+        index._refresh_lock = threading.Lock()
+        index._refreshing = False
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_locks_after_fork)
+
+
+def refresh_many(indexes, source="auto"):
+    """
+    Recarga completa de varios indices con una sola llamada values.batchGet.
+    Con ``source="auto"`` los que tienen copia local al dia se cargan de ahi;
+    los indices con ``columns`` hacen su propia lectura proyectada.
+    Si la lectura falla se propaga la excepcion; cada indice conserva sus datos.
+    """
+    pending, projected = [], []
+    for index in indexes:
+        if source == "auto":
+            with index._refresh_lock:
+                if index._load_fresh_mirror():
+                    continue
+        # Las hojas proyectadas se leen aparte, solo sus columnas.
+        (projected if index.columns is not None else pending).append(index)
+
+    def _load_batch():
+        if not pending:
+            return
+        values = values_batch_get(
+            _sheet_id(), [(index.worksheet_name, None) for index in pending])
+        for index, rows in zip(pending, values):
+            with index._refresh_lock:
+                index._load(rows)
+            logger.info("Indice '%s' recargado (lectura conjunta): %s filas.",
+                        index.worksheet_name, len(index._records))
+
+    def _load_projected(index):
+        with index._refresh_lock:
+            index._load_projected()
+
+    # Lecturas independientes: la espera total es la de la mas lenta.
+    run_parallel([_load_batch] + [
+        lambda index=index: _load_projected(index) for index in projected])
+
+
+def ensure_fresh_many(*indexes):
+    """
+    Como ``SheetIndex.ensure_fresh`` para varios indices, pero los que nunca
+    se cargaron (o fueron invalidados) se leen juntos en una sola llamada.
+    """
+    cold = [index for index in indexes if index.age() is None]
+    if len(cold) > 1:
+        try:
+            refresh_many(cold)
+        except Exception:
+            logger.warning("Fallo la lectura conjunta de %s; se leen por separado.",
+                           [index.worksheet_name for index in cold], exc_info=True)
+    for index in indexes:
+        index.ensure_fresh()
+
+
+def _sheet_id():
+    sheet_id = os.getenv("SHEET_PATH") or getattr(settings, "SHEET_PATH", "")
+    if not sheet_id:
+        raise RuntimeError("SHEET_PATH no esta configurado.")
+    return sheet_id
+
+
+def _col_letter(col):
+    """1 -> A, 27 -> AA."""
+    letters = ""
+    while col > 0:
+        col, rem = divmod(col - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def _trim(row):
+    """Quita las celdas vacias al final de una fila."""
+    row = [str(cell) for cell in row]
+    while row and not row[-1].strip():
+        row.pop()
+    return row
+
+
+def _is_blank(row):
+    return not any(str(cell).strip() for cell in row)
+
+
+class SheetIndex:
+    def __init__(self, worksheet_name, head=1, key_column="RUC", normalize_key=str,
+                 mirror=True, columns=None):
+        self.worksheet_name = worksheet_name
+        self.head = head
+        self.key_column = key_column
+        self.normalize_key = normalize_key
+        self.header = []
+        self.header_row = head
+        self.version = 0
+        self._records = {}
+        self._rows_cache = None
+        self._by_key = {}
+        self._last_row = 0
+        self._loaded_at = None
+        self._full_loaded_at = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._refreshing = False
+        # Usar la copia local (SheetMirrorRow) cuando este al dia o Google falle.
+        self.mirror = mirror
+        # Columnas a leer (lista o funcion header -> nombres); None = todas.
+        # En hojas anchas evita bajar columnas que las consultas no usan.
+        self.columns = columns
+        # Momento (epoch) al que corresponden los datos cargados.
+        self._data_time = None
+        self.source = None
+        self.stats = {"full_reloads": 0, "incremental_syncs": 0, "tail_rows": 0,
+                      "mirror_loads": 0}
+        _registry[worksheet_name] = self
+
+    # ---------- configuracion ----------
+    @staticmethod
+    def _ttl():
+        return getattr(settings, "SHEETS_INDEX_TTL", 300)
+
+    @staticmethod
+    def _miss_refresh_interval():
+        return getattr(settings, "SHEETS_INDEX_MISS_REFRESH_INTERVAL", 2)
+
+    @staticmethod
+    def _full_reload_every():
+        return getattr(settings, "SHEETS_INDEX_FULL_RELOAD_EVERY", 3600)
+
+    # ---------- carga completa ----------
+    def _find_header_row(self, values):
+        """Usa la fila ``head``; si no tiene la columna clave, prueba la fila 1."""
+        for candidate in (self.head, 1):
+            if len(values) >= candidate and self.key_column in [
+                    str(cell).strip() for cell in values[candidate - 1]]:
+                return candidate
+        return self.head
+
+    def _projection(self, header):
+        if self.columns is None:
+            return None
+        names = self.columns(header) if callable(self.columns) else self.columns
+        return {self.key_column, *names}
+
+    def _record_for(self, header, row):
+        row = list(row) + [""] * (len(header) - len(row))
+        projection = self._projection(header)
+        if projection is None:
+            return dict(zip(header, row))
+        # Mismo criterio que read_columns en la carga proyectada: el nombre se
+        # compara sin espacios ni mayusculas ("RUC " o "Razon_Social").
+        positions = {}
+        for col, title in enumerate(header):
+            positions.setdefault(str(title).strip().upper(), col)
+        return {
+            name: row[positions[str(name).strip().upper()]]
+            if str(name).strip().upper() in positions else ""
+            for name in projection
+        }
+
+    def _set_data(self, header, header_row, records, last_row, data_time, source):
+        by_key = {}
+        for row_number, record in records.items():
+            key = self.normalize_key(record.get(self.key_column, ""))
+            if key:
+                # Igual que el next(...) anterior: gana la primera coincidencia.
+                by_key.setdefault(key, (row_number, record))
+
+        now = time.monotonic()
+        with self._lock:
+            self.header = header
+            self.header_row = header_row
+            self._records = records
+            self._rows_cache = None
+            self._by_key = by_key
+            self._last_row = last_row
+            self._loaded_at = now
+            self._full_loaded_at = now - max(time.time() - data_time, 0)
+            self._data_time = data_time
+            self.source = source
+            self.version += 1
+
+    def _load(self, values):
+        header_row = self._find_header_row(values)
+        header = [str(cell) for cell in values[header_row - 1]] if len(values) >= header_row else []
+        records = {}
+        for row_number, row in enumerate(values[header_row:], start=header_row + 1):
+            if not _is_blank(row):
+                records[row_number] = self._record_for(header, row)
+        self._set_data(header, header_row, records, max(len(values), header_row),
+                       time.time(), "google")
+        self.stats["full_reloads"] += 1
+
+    def _load_from_mirror(self, max_age=None, only_if_newer=False):
+        """Carga desde la copia local; False si no hay copia util."""
+        from forms.services.sheet_mirror import load_rows
+
+        snapshot = load_rows(self.worksheet_name, max_age=max_age)
+        if snapshot is None:
+            return False
+        synced = snapshot.synced_at.timestamp()
+        if only_if_newer and self._data_time is not None and synced <= self._data_time:
+            return False
+        records = {row_number: data for row_number, data in snapshot.rows}
+        last_row = max([snapshot.header_row] + list(records))
+        self._set_data(snapshot.header, snapshot.header_row, records, last_row,
+                       synced, "mirror")
+        self.stats["mirror_loads"] += 1
+        return True
+
+    def _mirror_enabled(self):
+        return self.mirror and getattr(settings, "SHEETS_MIRROR_ENABLED", True)
+
+    def _load_fresh_mirror(self):
+        """Carga la copia local si es mas nueva y no supera SHEETS_MIRROR_MAX_STALENESS."""
+        return self._mirror_enabled() and self._load_from_mirror(
+            max_age=getattr(settings, "SHEETS_MIRROR_MAX_STALENESS", 900),
+            only_if_newer=True)
+
+    def _load_projected(self):
+        """Recarga leyendo solo las columnas de ``self.columns`` (una llamada)."""
+        for header_row in dict.fromkeys((self.header_row, self.head, 1)):
+            result = read_columns(_sheet_id(), self.worksheet_name,
+                                  lambda header: sorted(self._projection(header)),
+                                  header_row=header_row)
+            if self.key_column in [col.strip() for col in result.header]:
+                break
+        length = len(result.columns[self.key_column])
+        records = {}
+        for offset in range(length):
+            record = {name: values[offset] for name, values in result.columns.items()}
+            if not _is_blank(record.values()):
+                records[result.first_row + offset] = record
+        self._set_data(result.header, result.header_row, records,
+                       max(result.first_row + length - 1, result.header_row),
+                       time.time(), "google")
+        self.stats["full_reloads"] += 1
+
+    def _full_reload(self, sheet):
+        if self.columns is not None:
+            self._load_projected()
+            logger.info("Indice '%s' recargado (solo columnas usadas): %s filas.",
+                        self.worksheet_name, len(self._records))
+            return
+        values = sheet.get_all_values(value_render_option="UNFORMATTED_VALUE")
+        self._load(values)
+        logger.info("Indice '%s' recargado completo: %s filas.",
+                    self.worksheet_name, len(self._records))
+
+    # ---------- sincronizacion incremental ----------
+    def _key_col(self):
+        stripped = [col.strip() for col in self.header]
+        if self.key_column not in stripped:
+            return None
+        return stripped.index(self.key_column) + 1
+
+    def _sample_rows(self):
+        first = self.header_row + 1
+        if self._last_row < first:
+            return []
+        step = max((self._last_row - first) // SAMPLE_SIZE, 1)
+        rows = list(range(first, self._last_row + 1, step))[:SAMPLE_SIZE]
+        if rows[-1] != self._last_row:
+            rows.append(self._last_row)
+        return rows
+
+    def _key_cell(self, row_number, key_col):
+        record = self._records.get(row_number)
+        if record is None:
+            return ""
+        # Los registros proyectados usan los nombres de ``columns``, no el titulo.
+        name = self.key_column if self.columns is not None else self.header[key_col - 1]
+        return str(record.get(name, "")).strip()
+
+    @staticmethod
+    def _digest(cells):
+        return hashlib.sha1("\x1f".join(cells).encode("utf-8")).hexdigest()
+
+    def _tail_plan(self):
+        """
+        Rangos de la lectura incremental: encabezado + muestra de la columna
+        clave + filas nuevas. None si la hoja no tiene la columna clave. En un
+        indice con ``columns`` las filas nuevas se piden solo en esas
+        columnas, un rango por columna.
+        """
+        key_col = self._key_col()
+        if key_col is None:
+            return None
+        letter = _col_letter(key_col)
+        width = _col_letter(max(len(_trim(self.header)), key_col))
+        sample_rows = self._sample_rows()
+        last_row = self._last_row
+
+        ranges = [f"A{self.header_row}:{width}{self.header_row}"]
+        ranges += [f"{letter}{row}" for row in sample_rows]
+        projection = self._projection(self.header)
+        if projection is None:
+            tail_columns = None
+            ranges.append(f"A{last_row + 1}:{width}")
+        else:
+            letters = _column_letters(self.header, sorted(projection))
+            tail_columns = list(letters)
+            ranges += [f"{letters[name]}{last_row + 1}:{letters[name]}"
+                       for name in tail_columns]
+        return {"ranges": ranges, "key_col": key_col, "sample_rows": sample_rows,
+                "last_row": last_row, "tail_columns": tail_columns}
+
+    def _tail_records(self, plan, tail_result):
+        """Registros de las filas nuevas (lista; None en las filas en blanco)."""
+        if plan["tail_columns"] is None:
+            rows = list(tail_result[0]) if tail_result else []
+            return [None if _is_blank(row) else self._record_for(self.header, row)
+                    for row in rows]
+        # Un rango por columna: cada uno trae [[valor], [valor], ...] y se corta
+        # en su ultima celda con datos.
+        columns = dict(zip(plan["tail_columns"], tail_result))
+        length = max((len(values) for values in columns.values()), default=0)
+        records = []
+        for offset in range(length):
+            record = {name: "" for name in self._projection(self.header)}
+            for name, values in columns.items():
+                if offset < len(values) and values[offset]:
+                    record[name] = values[offset][0]
+            records.append(None if _is_blank(record.values()) else record)
+        return records
+
+    def _apply_tail(self, plan, result):
+        """
+        Aplica el resultado de la lectura de ``_tail_plan``. Devuelve False si
+        detecta cambios que obligan a recargar completo.
+        """
+        key_col, sample_rows, last_row = plan["key_col"], plan["sample_rows"], plan["last_row"]
+        header_now = _trim(result[0][0]) if result[0] else []
+        if header_now != _trim(self.header):
+            logger.info("Indice '%s': el encabezado cambio.", self.worksheet_name)
+            return False
+
+        tail_start = 1 + len(sample_rows)
+        probed = [str(vr[0][0]).strip() if vr and vr[0] else ""
+                  for vr in result[1:tail_start]]
+        expected = [self._key_cell(row, key_col) for row in sample_rows]
+        if self._digest(probed) != self._digest(expected):
+            logger.info("Indice '%s': la muestra de '%s' cambio.",
+                        self.worksheet_name, self.key_column)
+            return False
+
+        tail = self._tail_records(plan, result[tail_start:])
+        with self._lock:
+            records = dict(self._records)
+            by_key = dict(self._by_key)
+            for offset, record in enumerate(tail, start=1):
+                if record is None:
+                    continue
+                row_number = last_row + offset
+                records[row_number] = record
+                key = self.normalize_key(record.get(self.key_column, ""))
+                if key and (key not in by_key or by_key[key][0] == row_number):
+                    by_key[key] = (row_number, record)
+            self._records = records
+            self._by_key = by_key
+            self._rows_cache = None
+            self._last_row = last_row + len(tail)
+            self._loaded_at = time.monotonic()
+            self._data_time = time.time()
+            if tail:
+                self.version += 1
+        self.stats["incremental_syncs"] += 1
+        self.stats["tail_rows"] += len(tail)
+        logger.info("Indice '%s' sincronizado: %s filas nuevas.",
+                    self.worksheet_name, len(tail))
+        return True
+
+    def _sync_tail(self, sheet):
+        """
+        Una lectura incremental; False si hay que recargar completo. Un 400
+        (``A{ultima+1}`` cae fuera de la grilla tras borrar filas) o una
+        respuesta con otra forma tambien obligan a recargar completo. Los
+        demas errores de la API (cuota agotada, 5xx tras los reintentos) se
+        propagan: ``refresh`` sirve la copia local en lugar de intentar la
+        lectura mas cara.
+        """
+        from gspread.exceptions import APIError
+
+        plan = self._tail_plan()
+        if plan is None:
+            return False
+        try:
+            result = sheet.batch_get(plan["ranges"], value_render_option="UNFORMATTED_VALUE")
+        except APIError as exc:
+            if getattr(exc, "code", None) != 400:
+                raise
+            logger.info("Indice '%s': rango incremental fuera de la hoja; se recarga completo.",
+                        self.worksheet_name, exc_info=True)
+            return False
+        try:
+            return self._apply_tail(plan, result)
+        except (IndexError, KeyError, TypeError, ValueError):
+            logger.info("Indice '%s': respuesta incremental inesperada; se recarga completo.",
+                        self.worksheet_name, exc_info=True)
+            return False
+
+    def _full_reload_due(self):
+        return (self._full_loaded_at is None
+                or time.monotonic() - self._full_loaded_at >= self._full_reload_every())
+
+    def refresh(self, if_older_than=None, full=False, source="auto"):
+        """
+        Actualiza el indice (una sola actualizacion simultanea por indice).
+        Con ``if_older_than`` no hace nada si otro hilo acaba de actualizarlo.
+        ``source="auto"`` prefiere la copia local si es mas nueva que los datos
+        actuales y no supera SHEETS_MIRROR_MAX_STALENESS; ``"google"`` siempre
+        consulta la hoja. Si Google falla se sirve la copia local aunque este
+        vieja (modo solo lectura).
+        """
+        with self._refresh_lock:
+            age = self.age()
+            if if_older_than is not None and age is not None and age < if_older_than:
+                return
+            use_mirror = self._mirror_enabled()
+            if source == "auto" and self._load_fresh_mirror():
+                return
+            try:
+                sheet = get_google_sheet(_sheet_id(), self.worksheet_name)
+                if full or self._full_reload_due() or not self._sync_tail(sheet):
+                    self._full_reload(sheet)
+            except Exception:
+                if use_mirror and self._load_from_mirror():
+                    logger.warning(
+                        "Google Sheets no disponible; indice '%s' servido desde la copia local.",
+                        self.worksheet_name, exc_info=True)
+                    return
+                raise
+
+    async def arefresh(self, if_older_than=None):
+        """
+        Variante asyncio de ``refresh(source="google")`` para las vistas ASGI.
+        La lectura incremental usa el cliente async y no ocupa un hilo; la
+        recarga completa (o el respaldo desde la copia local si Google falla)
+        se hace en un hilo con el ``refresh`` sincronico.
+        """
+        from capig_form.services import async_sheets_service as async_sheets
+
+        full = False
+        if self._refresh_lock.acquire(blocking=False):
+            try:
+                age = self.age()
+                if if_older_than is not None and age is not None and age < if_older_than:
+                    return
+                plan = None if self._full_reload_due() else self._tail_plan()
+                if plan is not None:
+                    result = await async_sheets.values_batch_get(
+                        _sheet_id(),
+                        [(self.worksheet_name, rng) for rng in plan["ranges"]])
+                    if self._apply_tail(plan, result):
+                        return
+                    full = True
+            except Exception:
+                logger.warning("Fallo la sincronizacion async del indice '%s'.",
+                               self.worksheet_name, exc_info=True)
+            finally:
+                self._refresh_lock.release()
+        # Otro hilo ya actualiza (refresh espera y respeta if_older_than) o
+        # hace falta una recarga completa.
+        await sync_to_async(self.refresh, thread_sensitive=False)(
+            if_older_than=None if full else if_older_than, full=full, source="google")
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception:
+            logger.exception(
+                "No se pudo actualizar el indice '%s'; se mantienen los datos previos.",
+                self.worksheet_name)
+        finally:
+            self._refreshing = False
+
+    def age(self):
+        """Segundos desde la ultima actualizacion (None si nunca se cargo)."""
+        if self._loaded_at is None:
+            return None
+        return time.monotonic() - self._loaded_at
+
+    def ensure_fresh(self):
+        """
+        Carga sincronicamente la primera vez; despues, si el TTL vencio, dispara
+        una actualizacion en segundo plano y sigue sirviendo los datos actuales.
+        """
+        age = self.age()
+        if age is None:
+            self.refresh()
+            return
+        if age < self._ttl() or self._refreshing:
+            return
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(
+            target=self._background_refresh,
+            name=f"sheet-index-{self.worksheet_name}",
+            daemon=True,
+        ).start()
+
+    def invalidate(self):
+        """Fuerza una actualizacion sincronica en el proximo acceso."""
+        with self._lock:
+            self._loaded_at = None
+
+    # ---------- consultas ----------
+    def get(self, key):
+        """
+        Devuelve ``(numero_de_fila, registro)`` para la clave o None. Ante un
+        fallo hace una unica actualizacion forzada, para encontrar filas recien
+        agregadas, salvo que el indice se haya actualizado hace un instante.
+        """
+        key = self.normalize_key(key)
+        if not key:
+            return None
+        self.ensure_fresh()
+        hit = self._by_key.get(key)
+        if hit is None:
+            self.refresh(if_older_than=self._miss_refresh_interval(), source="google")
+            hit = self._by_key.get(key)
+        return hit
+
+    async def aget(self, key):
+        """Como ``get`` pero sin bloquear el event loop."""
+        key = self.normalize_key(key)
+        if not key:
+            return None
+        if self.age() is None:
+            await sync_to_async(self.refresh, thread_sensitive=False)()
+        else:
+            # Con datos cargados solo dispara la actualizacion en segundo plano.
+            self.ensure_fresh()
+        hit = self._by_key.get(key)
+        if hit is None:
+            await self.arefresh(if_older_than=self._miss_refresh_interval())
+            hit = self._by_key.get(key)
+        return hit
+
+    def peek(self, key):
+        """Como ``get`` pero sin la actualizacion forzada ante un fallo."""
+        key = self.normalize_key(key)
+        if not key:
+            return None
+        self.ensure_fresh()
+        return self._by_key.get(key)
+
+    def rows(self):
+        """Lista de ``(numero_de_fila, registro)`` en orden de hoja."""
+        self.ensure_fresh()
+        rows = self._rows_cache
+        if rows is None:
+            with self._lock:
+                rows = sorted(self._records.items())
+                self._rows_cache = rows
+        return rows
+
+    def put(self, key, row_number, record):
+        """Refleja en el indice una fila que acabamos de escribir."""
+        if row_number is None:
+            # No sabemos en que fila quedo; mejor recargar en el proximo acceso.
+            self.invalidate()
+            return
+        key = self.normalize_key(key)
+        with self._lock:
+            existing = self._records.get(row_number)
+            if existing is not None:
+                existing.update(record)
+            else:
+                existing = dict(record)
+                self._records = {**self._records, row_number: existing}
+                self._rows_cache = None
+            if key and key not in self._by_key:
+                self._by_key[key] = (row_number, existing)
+            if self._data_time is not None:
+                # Los datos incluyen esta escritura: una copia local sincronizada
+                # antes no debe reemplazarlos (``_load_from_mirror(only_if_newer)``).
+                self._data_time = max(self._data_time, time.time())
+            self.version += 1
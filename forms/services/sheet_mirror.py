@@ -0,0 +1,223 @@
+"""
+Copia local (SQLite) de las hojas que la app consulta.
+
+``manage.py sync_sheets`` o el programador en segundo plano copian SOCIOS,
+ESTADO_SOCIO, VENTAS_SOCIO, SECTOR y la columna de empresas de la primera
+hoja a tablas indexadas (``SheetMirrorRow``). Los indices en memoria y las
+listas de los formularios leen de aqui mientras la copia no supere
+SHEETS_MIRROR_MAX_STALENESS, y siguen funcionando en modo solo lectura si
+Google no responde.
+"""
+import logging
+import random
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.utils import timezone
+
+from capig_form.services.google_sheets_service import (
+    get_google_sheet,
+    get_worksheet_by_index,
+    run_parallel,
+)
+from forms.models import SheetMirrorRow, SheetMirrorState
+from forms.services.sheet_index import _sheet_id, all_indexes, refresh_many
+
+logger = logging.getLogger(__name__)
+
+# Listas de una sola columna que usan los formularios.
+EMPRESAS = "EMPRESAS"  # primera hoja, columna B desde la fila 3
+SECTORES = "SECTOR"    # hoja SECTOR, columna A desde la fila 2
+
+MirrorSnapshot = namedtuple(
+    "MirrorSnapshot", ["header", "header_row", "rows", "synced_at"])
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def _age_seconds(synced_at):
+    return (timezone.now() - synced_at).total_seconds()
+
+
+# ==========================
+# LECTURA
+# ==========================
+def load_rows(worksheet, max_age=None):
+    """
+    Devuelve un ``MirrorSnapshot`` con las filas ``(numero_de_fila, dict)`` de
+    la hoja, o None si no hay copia (o es mas vieja que ``max_age`` segundos).
+    """
+    try:
+        state = SheetMirrorState.objects.get(worksheet=worksheet)
+        if max_age is not None and _age_seconds(state.synced_at) > max_age:
+            return None
+        rows = list(
+            SheetMirrorRow.objects.filter(worksheet=worksheet)
+            .order_by("row_number")
+            .values_list("row_number", "data")
+        )
+    except (SheetMirrorState.DoesNotExist, DatabaseError):
+        return None
+    return MirrorSnapshot(state.header, state.header_row, rows, state.synced_at)
+
+
+def last_synced_age():
+    """Segundos desde la sincronizacion mas vieja (None si nunca se sincronizo)."""
+    try:
+        states = list(SheetMirrorState.objects.values_list("synced_at", flat=True))
+    except DatabaseError:
+        return None
+    if not states:
+        return None
+    return max(_age_seconds(synced_at) for synced_at in states)
+
+
+# ==========================
+# ESCRITURA
+# ==========================
+def store_rows(worksheet, header, header_row, rows, key_for=None):
+    """Reemplaza la copia de una hoja en una sola transaccion."""
+    key_for = key_for or (lambda data: "")
+    objects = [
+        SheetMirrorRow(worksheet=worksheet, row_number=row_number,
+                       key=str(key_for(data))[:255], data=data)
+        for row_number, data in rows
+    ]
+    with transaction.atomic():
+        SheetMirrorRow.objects.filter(worksheet=worksheet).delete()
+        SheetMirrorRow.objects.bulk_create(objects, batch_size=500)
+        SheetMirrorState.objects.update_or_create(
+            worksheet=worksheet,
+            defaults={
+                "header": header,
+                "header_row": header_row,
+                "row_count": len(objects),
+                "synced_at": timezone.now(),
+            },
+        )
+    return len(objects)
+
+
+def _store_column(name, values, first_row):
+    rows = [
+        (row_number, {"valor": str(value).strip()})
+        for row_number, value in enumerate(values[first_row - 1:], start=first_row)
+        if str(value).strip()
+    ]
+    return store_rows(name, ["valor"], first_row - 1, rows,
+                      key_for=lambda data: data["valor"].lower())
+
+
+def store_list(name, values):
+    """Guarda una lista de referencia ya leida (valores en orden, sin vacios)."""
+    rows = [
+        (position, {"valor": str(value).strip()})
+        for position, value in enumerate(values, start=1)
+        if str(value).strip()
+    ]
+    return store_rows(name, ["valor"], 0, rows,
+                      key_for=lambda data: data["valor"].lower())
+
+
+def sync_sheets(names=None):
+    """
+    Copia desde Google las hojas indicadas (todas si ``names`` es None).
+    Devuelve ``{hoja: filas copiadas}``; una hoja que falla no detiene al resto.
+    """
+    # Importar utils registra los indices de ESTADO_SOCIO, SOCIOS y VENTAS_SOCIO.
+    import forms.utils  # noqa: F401
+
+    sheet_id = _sheet_id()
+    wanted = set(names) if names else None
+    result = {}
+
+    selected = {
+        name: index for name, index in all_indexes().items()
+        if wanted is None or name in wanted
+    }
+    # Todas las hojas en una sola lectura; si falla, cada una por separado.
+    try:
+        refresh_many(selected.values(), source="google")
+        batch_ok = True
+    except Exception:
+        logger.warning("Fallo la lectura conjunta; se sincroniza hoja por hoja.",
+                       exc_info=True)
+        batch_ok = False
+
+    for name, index in selected.items():
+        try:
+            if not batch_ok:
+                index.refresh(full=True, source="google")
+            if index.source != "google":
+                raise RuntimeError("Google Sheets no respondio; se conserva la copia actual.")
+            result[name] = store_rows(
+                name, index.header, index.header_row, index.rows(),
+                key_for=lambda data, index=index: index.normalize_key(
+                    data.get(index.key_column, "")),
+            )
+        except Exception:
+            logger.exception("No se pudo sincronizar la hoja '%s'.", name)
+
+    columns = {
+        EMPRESAS: lambda: (get_worksheet_by_index(sheet_id, 0).col_values(2), 3),
+        SECTORES: lambda: (get_google_sheet(sheet_id, "SECTOR").col_values(1), 2),
+    }
+    columns = {name: fetch for name, fetch in columns.items()
+               if wanted is None or name in wanted}
+
+    def _fetch(fetch):
+        try:
+            return fetch()
+        except Exception as exc:
+            return exc
+
+    # Las dos listas se leen a la vez.
+    fetched = run_parallel([lambda fetch=fetch: _fetch(fetch) for fetch in columns.values()])
+    for name, outcome in zip(columns, fetched):
+        try:
+            if isinstance(outcome, Exception):
+                raise outcome
+            values, first_row = outcome
+            result[name] = _store_column(name, values, first_row)
+        except Exception:
+            logger.exception("No se pudo sincronizar la lista '%s'.", name)
+
+    return result
+
+
+# ==========================
+# PROGRAMADOR EN SEGUNDO PLANO
+# ==========================
+def _scheduler_loop(interval):
+    # Desfase aleatorio para que los workers no sincronicen todos a la vez.
+    time.sleep(random.uniform(0, min(interval, 30)))
+    while True:
+        try:
+            age = last_synced_age()
+            # Otro worker pudo haber sincronizado hace poco.
+            if age is None or age >= interval:
+                sync_sheets()
+        except Exception:
+            logger.exception("Error en la sincronizacion periodica de la copia local.")
+        finally:
+            close_old_connections()
+        time.sleep(interval)
+
+
+def start_scheduler():
+    """Arranca la sincronizacion periodica si SHEETS_MIRROR_SYNC_INTERVAL > 0."""
+    global _scheduler
+    interval = getattr(settings, "SHEETS_MIRROR_SYNC_INTERVAL", 0)
+    if not interval or not getattr(settings, "SHEETS_MIRROR_ENABLED", True):
+        return
+    with _scheduler_lock:
+        if _scheduler is not None and _scheduler.is_alive():
+            return
+        _scheduler = threading.Thread(
+            target=_scheduler_loop, args=(interval,),
+            name="sheets-mirror", daemon=True)
+        _scheduler.start()
@@ -0,0 +1,169 @@
+"""
+Registro de esquemas de las hojas del libro.
+
+Cada ``SheetSchema`` sabe en que fila esta el encabezado de su hoja y como se
+llaman sus columnas, incluidas las variantes que aparecen en la practica
+(TELEFONO_EMPRESA_1/TELEFONO, NO._COLABORADORES, ANIO/AÑO/ANO, ...). Los
+alias se resuelven una vez por encabezado: el resultado (``CompiledSchema``)
+se cachea por la huella del encabezado y trae el constructor de filas y los
+lectores ya armados, asi que escribir o leer una fila no vuelve a normalizar
+ningun nombre de columna. Solo se recompila si el encabezado cambia.
+"""
+import threading
+
+from capig_form.services.google_sheets_service import get_header
+
+# Encabezados compilados que se guardan por esquema (versiones de la hoja).
+MAX_COMPILED = 8
+
+
+def normalizar_columna(col):
+    """Normaliza el nombre de columna para comparar."""
+    col = str(col).strip().upper().replace(" ", "_")
+    col = (
+        col.replace("Á", "A")
+        .replace("É", "E")
+        .replace("Í", "I")
+        .replace("Ó", "O")
+        .replace("Ú", "U")
+        .replace("Ñ", "N")
+    )
+    return col
+
+
+class CompiledSchema:
+    """Mapeo campo -> columnas de un encabezado concreto."""
+
+    def __init__(self, header, header_row, aliases):
+        self.header = list(header)
+        self.header_row = header_row
+        # Campo que llena cada columna (None = columna que no manejamos).
+        self._layout = []
+        # Campo -> nombres reales de columna, en orden de prioridad de alias.
+        self._keys = {}
+        # Campo -> primera columna (1-based).
+        self._columns = {}
+        for col, title in enumerate(self.header, start=1):
+            campo, prioridad = aliases.get(normalizar_columna(title), (None, 0))
+            self._layout.append(campo)
+            if campo is None:
+                continue
+            self._keys.setdefault(campo, []).append((prioridad, title))
+            self._columns.setdefault(campo, col)
+        self._keys = {
+            campo: [title for _, title in sorted(titles, key=lambda t: t[0])]
+            for campo, titles in self._keys.items()
+        }
+
+    def build_row(self, data):
+        """Fila del ancho del encabezado con los campos de ``data``; el resto vacio."""
+        return [data.get(campo, "") if campo else "" for campo in self._layout]
+
+    def column(self, campo):
+        """Numero de columna (1-based) del campo, o None si la hoja no lo tiene."""
+        return self._columns.get(campo)
+
+    def get(self, record, campo, default=""):
+        """
+        Valor del campo en un registro ``{columna: valor}``: el primer alias
+        con valor, en orden de prioridad.
+        """
+        for title in self._keys.get(campo, ()):
+            value = record.get(title)
+            if value not in ("", None):
+                return value
+        return default
+
+
+class SheetSchema:
+    def __init__(self, worksheet_name, header_rows, fields, key_field="ruc"):
+        """
+        ``fields`` es ``{campo: [alias, ...]}``; ``header_rows`` son las filas
+        candidatas para el encabezado, en orden (gana la que tiene la columna
+        de ``key_field``).
+        """
+        self.worksheet_name = worksheet_name
+        self.header_rows = tuple(header_rows)
+        self.key_field = key_field
+        self._aliases = {}
+        for campo, nombres in fields.items():
+            for prioridad, nombre in enumerate(nombres):
+                self._aliases.setdefault(normalizar_columna(nombre), (campo, prioridad))
+        self._compiled = {}
+        self._lock = threading.Lock()
+
+    def compile(self, header, header_row=None):
+        """Esquema compilado para ``header``; se reutiliza mientras no cambie."""
+        header_row = header_row or self.header_rows[0]
+        fingerprint = (header_row, tuple(header))
+        compiled = self._compiled.get(fingerprint)
+        if compiled is None:
+            compiled = CompiledSchema(header, header_row, self._aliases)
+            with self._lock:
+                if len(self._compiled) >= MAX_COMPILED:
+                    self._compiled.clear()
+                self._compiled[fingerprint] = compiled
+        return compiled
+
+    def load(self, sheet_id, fresh=False):
+        """
+        Esquema de la hoja a partir de su encabezado cacheado (sin lectura si
+        el cache esta vigente). Prueba las filas candidatas en orden. Antes de
+        escribir, ``fresh=True`` relee el encabezado (un solo rango por fila
+        candidata) para no armar filas con columnas que ya se movieron; si
+        cambio, se compila el nuevo.
+        """
+        compiled = None
+        for header_row in self.header_rows:
+            compiled = self.compile(
+                get_header(sheet_id, self.worksheet_name, header_row, fresh=fresh),
+                header_row)
+            if compiled.column(self.key_field):
+                return compiled
+        return compiled
+
+
+SOCIOS = SheetSchema("SOCIOS", header_rows=(2, 1), fields={
+    "razon_social": ["RAZON_SOCIAL"],
+    "ruc": ["RUC"],
+    "fecha_afiliacion": ["FECHA_AFILIACION"],
+    "ciudad": ["CIUDAD"],
+    "direccion": ["DIRECCION"],
+    "telefono": ["TELEFONO_EMPRESA_1", "TELEFONO_EMPRESA", "TELEFONO"],
+    "email": ["EMAIL"],
+    "representante": ["NOMBRE_REP_LEGAL"],
+    "cargo": ["CARGO"],
+    "genero": ["GENERO"],
+    "colaboradores": [
+        "NO._COLABORADORES", "NO_COLABORADORES", "NO.COLABORADORES",
+        "COLABORADORES", "NUM_COLABORADORES", "NUMERO_COLABORADORES",
+    ],
+    "sector": ["SECTOR"],
+    "tamano": ["TAMANO"],
+    "estado": ["ESTADO"],
+})
+
+ESTADO_SOCIO = SheetSchema("ESTADO_SOCIO", header_rows=(1,), fields={
+    "ruc": ["RUC"],
+    "razon_social": ["RAZON_SOCIAL"],
+    "fecha_afiliacion": ["FECHA_AFILIACION"],
+    "estado": ["ESTADO"],
+    "ciudad": ["CIUDAD"],
+    "actualizacion_estado": ["ACTUALIZACION_ESTADO"],
+})
+
+VENTAS_SOCIO = SheetSchema("VENTAS_SOCIO", header_rows=(2, 1), fields={
+    "ruc": ["RUC"],
+    "razon_social": ["RAZON_SOCIAL"],
+    "ciudad": ["CIUDAD"],
+    "fecha_afiliacion": ["FECHA_AFILIACION"],
+    "registro_ventas": ["REGISTRO_VENTAS"],
+    "comparativo": ["COMPARATIVO"],
+    "ventas_estimadas": [
+        "VENTAS_ESTIMADAS", "MONTO_ESTIMADO", "MONTO_VENTAS", "VENTAS_ESTIMADA",
+    ],
+    "observaciones": ["OBSERVACIONES"],
+    "fecha_registro": ["FECHA_REGISTRO", "FECHA"],
+    # AÑO se normaliza a ANO.
+    "anio": ["ANIO", "ANO"],
+})
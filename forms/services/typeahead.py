@@ -0,0 +1,174 @@
+"""
+Autocompletado de empresas por razon social o RUC.
+
+El indice se arma en memoria a partir de SOCIOS (razon social + RUC) y de la
+lista de empresas de la primera hoja, y se reconstruye solo cuando cambia
+alguna de las dos fuentes. Cada consulta es un par de accesos a dict:
+
+- por prefijo de palabra, sin distinguir acentos ni mayusculas
+  ("constru" encuentra "Constructora Núñez S.A."),
+- por prefijo de RUC si la consulta son solo digitos,
+- por trigramas como respaldo (subcadenas y errores de tipeo) cuando los
+  prefijos no encuentran nada.
+"""
+import heapq
+import logging
+import re
+import threading
+import unicodedata
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# Largo maximo de prefijo indexado; palabras mas largas se verifican aparte.
+MAX_PREFIX = 8
+# Minimo de digitos para buscar por RUC.
+MIN_RUC_PREFIX = 3
+# Fraccion de trigramas de la consulta que debe tener un resultado de respaldo.
+MIN_TRIGRAM_MATCH = 0.5
+
+_NO_ALFANUMERICO = re.compile(r"[^0-9a-z]+")
+
+Empresa = namedtuple("Empresa", ["razon_social", "ruc", "normalizado", "palabras"])
+
+# (indice, version de SOCIOS, lista de empresas usada): la lista se guarda
+# para comparar por identidad; obtener_empresas devuelve la misma mientras
+# no se actualice.
+_estado = (None, None, None)
+_index_lock = threading.Lock()
+
+
+def normalizar_texto(texto):
+    """Minusculas, sin acentos ni signos: "Núñez & Cía." -> "nunez cia"."""
+    texto = unicodedata.normalize("NFKD", str(texto or ""))
+    texto = "".join(c for c in texto if not unicodedata.combining(c)).lower()
+    return " ".join(_NO_ALFANUMERICO.sub(" ", texto).split())
+
+
+def _trigramas(texto):
+    texto = f"  {texto} "
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+class TypeaheadIndex:
+    def __init__(self, empresas):
+        """``empresas`` es una lista de pares ``(razon_social, ruc)``."""
+        self.empresas = []
+        self._prefijos = {}
+        self._rucs = {}
+        self._trigramas = {}
+        vistos = set()
+        for razon_social, ruc in empresas:
+            razon_social = str(razon_social or "").strip()
+            normalizado = normalizar_texto(razon_social)
+            if not normalizado or normalizado in vistos:
+                continue
+            vistos.add(normalizado)
+            empresa = Empresa(razon_social, ruc or "", normalizado,
+                              tuple(normalizado.split()))
+            pos = len(self.empresas)
+            self.empresas.append(empresa)
+            for palabra in empresa.palabras:
+                for largo in range(1, min(len(palabra), MAX_PREFIX) + 1):
+                    self._prefijos.setdefault(palabra[:largo], set()).add(pos)
+            for largo in range(MIN_RUC_PREFIX, len(empresa.ruc) + 1):
+                self._rucs.setdefault(empresa.ruc[:largo], set()).add(pos)
+            for trigrama in _trigramas(normalizado):
+                self._trigramas.setdefault(trigrama, []).append(pos)
+
+    def _por_prefijo(self, palabras):
+        conjuntos = [self._prefijos.get(p[:MAX_PREFIX], set()) for p in palabras]
+        conjuntos.sort(key=len)
+        candidatos = set(conjuntos[0])
+        for conjunto in conjuntos[1:]:
+            candidatos &= conjunto
+        largas = [p for p in palabras if len(p) > MAX_PREFIX]
+        if largas:
+            candidatos = {
+                pos for pos in candidatos
+                if all(any(w.startswith(p) for w in self.empresas[pos].palabras)
+                       for p in largas)
+            }
+        return candidatos
+
+    def _por_trigramas(self, consulta):
+        trigramas = _trigramas(consulta)
+        conteo = {}
+        for trigrama in trigramas:
+            for pos in self._trigramas.get(trigrama, ()):
+                conteo[pos] = conteo.get(pos, 0) + 1
+        minimo = max(1, int(len(trigramas) * MIN_TRIGRAM_MATCH))
+        return {pos: hits for pos, hits in conteo.items() if hits >= minimo}
+
+    def search(self, query, limit=10):
+        """
+        Hasta ``limit`` empresas ordenadas por relevancia: primero las que
+        empiezan con la consulta, luego las que la contienen como palabra, y
+        a igualdad los nombres mas cortos.
+        """
+        digitos = re.sub(r"\D", "", str(query or ""))
+        consulta = normalizar_texto(query)
+        if not consulta:
+            return []
+
+        if digitos and len(digitos) >= MIN_RUC_PREFIX and digitos == consulta.replace(" ", ""):
+            candidatos = self._rucs.get(digitos, set())
+            return [self.empresas[pos] for pos in heapq.nsmallest(
+                limit, candidatos, key=lambda pos: self.empresas[pos].ruc)]
+
+        candidatos = self._por_prefijo(consulta.split())
+        if candidatos:
+            def rango(pos):
+                empresa = self.empresas[pos]
+                return (not empresa.normalizado.startswith(consulta),
+                        len(empresa.normalizado), empresa.normalizado)
+            elegidos = heapq.nsmallest(limit, candidatos, key=rango)
+        else:
+            aciertos = self._por_trigramas(consulta)
+            elegidos = heapq.nsmallest(
+                limit, aciertos,
+                key=lambda pos: (-aciertos[pos], len(self.empresas[pos].normalizado)))
+        return [self.empresas[pos] for pos in elegidos]
+
+
+def get_index():
+    """
+    Indice actual; se reconstruye si SOCIOS o la lista de empresas cambiaron.
+    Si SOCIOS no se puede cargar (worker nuevo, Google caido y sin copia
+    local) se arma con lo que haya, la lista de empresas, y se completa
+    cuando SOCIOS cargue.
+    """
+    global _estado
+    from forms.utils import _socios_index, limpiar_ruc, obtener_empresas
+
+    try:
+        _socios_index.ensure_fresh()
+    except Exception:
+        logger.warning("Autocompletado sin SOCIOS: no se pudo cargar el indice.",
+                       exc_info=True)
+    empresas = obtener_empresas()
+    index, version, fuente = _estado
+    if index is not None and version == _socios_index.version and fuente is empresas:
+        return index
+    with _index_lock:
+        index, version, fuente = _estado
+        if index is None or version != _socios_index.version or fuente is not empresas:
+            version = _socios_index.version
+            # rows() volveria a intentar la carga que acaba de fallar.
+            socios = _socios_index.rows() if _socios_index.age() is not None else []
+            fuentes = [
+                (row.get("RAZON_SOCIAL", ""), limpiar_ruc(row.get("RUC", "")))
+                for _, row in socios
+            ]
+            fuentes += [(nombre, "") for nombre in empresas]
+            index = TypeaheadIndex(fuentes)
+            _estado = (index, version, empresas)
+    return index
+
+
+def buscar_empresas(query, limit=10):
+    """Resultados del autocompletado como dicts ``{razon_social, ruc}``."""
+    return [
+        {"razon_social": empresa.razon_social, "ruc": empresa.ruc}
+        for empresa in get_index().search(query, limit=limit)
+    ]
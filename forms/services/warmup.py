@@ -0,0 +1,178 @@
+"""
+Calentamiento del worker al arrancar.
+
+Autentica con Google, descubre las hojas del libro y carga los indices por
+RUC, las listas de los formularios y el indice del autocompletado, para que
+la primera peticion de cada worker no pague esas lecturas. gunicorn lo
+ejecuta en ``post_worker_init`` (y en el master con ``--preload``, ver
+``gunicorn.conf.py``); ``/ready/`` responde 503 mientras no termine.
+
+Cada paso se ejecuta aunque el anterior falle: si Google no responde, los
+indices igual se cargan desde la copia local. Un calentamiento fallido se
+reintenta desde ``/ready/`` cada SHEETS_WARMUP_RETRY_INTERVAL segundos.
+"""
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+
+_state = {"status": PENDING, "attempts": 0, "started_at": None, "finished_at": None, "steps": {}}
+_state_lock = threading.Lock()
+_thread = None
+
+
+def _reset_after_fork():
+    # El hilo de calentamiento del padre no existe en el hijo.
+    global _state_lock, _thread
+    _state_lock = threading.Lock()
+    _thread = None
+    if _state["status"] == RUNNING:
+        _state.update(status=PENDING, started_at=None, finished_at=None, steps={})
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _autenticar():
+    from google.auth.transport.requests import Request
+
+    from capig_form.services.google_sheets_service import get_credentials
+
+    creds = get_credentials()
+    if not creds.valid:
+        creds.refresh(Request())
+
+
+def _descubrir_hojas():
+    from capig_form.services.google_sheets_service import get_worksheet_by_index
+    from forms.services.sheet_index import _sheet_id
+
+    # Lista todas las hojas del libro y deja sus handles en cache.
+    get_worksheet_by_index(_sheet_id(), 0)
+
+
+def _cargar_indices():
+    import forms.utils  # noqa: F401 - registra los indices
+    from forms.services.sheet_index import all_indexes, ensure_fresh_many
+
+    ensure_fresh_many(*all_indexes().values())
+
+
+def _cargar_listas():
+    from forms.utils import obtener_empresas, obtener_sectores
+
+    obtener_empresas()
+    obtener_sectores()
+
+
+def _cargar_autocompletado():
+    from forms.services.typeahead import get_index
+
+    get_index()
+
+
+PASOS = (
+    ("auth", _autenticar),
+    ("hojas", _descubrir_hojas),
+    ("indices", _cargar_indices),
+    ("listas", _cargar_listas),
+    ("autocompletado", _cargar_autocompletado),
+)
+
+
+def hay_datos():
+    """
+    True si el worker tiene que servir: todos los indices por RUC y las listas
+    de los formularios cargados (de Google o de la copia local), los haya
+    cargado el calentamiento o una peticion.
+    """
+    from forms.services import sheet_mirror
+    from forms.services.sheet_index import all_indexes
+    from forms.utils import edades_listas
+
+    listas = edades_listas()
+    return (all(index.age() is not None for index in all_indexes().values())
+            and all(nombre in listas for nombre in (sheet_mirror.EMPRESAS, sheet_mirror.SECTORES)))
+
+
+def _run():
+    with _state_lock:
+        _state.update(status=RUNNING, started_at=time.time(), finished_at=None, steps={})
+    try:
+        for nombre, paso in PASOS:
+            start = time.monotonic()
+            try:
+                paso()
+                error = None
+            except Exception as exc:
+                logger.warning("Calentamiento: fallo el paso '%s'.", nombre, exc_info=True)
+                error = f"{type(exc).__name__}: {exc}"
+            with _state_lock:
+                _state["steps"][nombre] = {
+                    "ok": error is None,
+                    "seconds": round(time.monotonic() - start, 3),
+                    "error": error,
+                }
+    finally:
+        close_old_connections()
+
+    # Listo si hay datos que servir, aunque vengan de la copia local.
+    listo = hay_datos()
+    with _state_lock:
+        _state.update(status=DONE if listo else FAILED, finished_at=time.time())
+    logger.info("Calentamiento %s en %.1fs: %s", _state["status"],
+                _state["finished_at"] - _state["started_at"], _state["steps"])
+
+
+def warm_up(wait=None):
+    """
+    Arranca el calentamiento en un hilo (una vez por proceso a la vez) y
+    espera hasta ``wait`` segundos (None = SHEETS_WARMUP_TIMEOUT). Si no
+    termina a tiempo sigue en segundo plano. Devuelve el estado.
+    """
+    global _thread
+    if not getattr(settings, "SHEETS_WARMUP_ENABLED", True):
+        return get_state()
+    if wait is None:
+        wait = getattr(settings, "SHEETS_WARMUP_TIMEOUT", 60.0)
+    with _state_lock:
+        if _thread is None or not _thread.is_alive():
+            _state["status"] = RUNNING
+            _state["attempts"] += 1
+            _thread = threading.Thread(target=_run, name="sheets-warmup", daemon=True)
+            _thread.start()
+        thread = _thread
+    if wait:
+        thread.join(wait)
+    return get_state()
+
+
+def retry_due():
+    """
+    True si hay que (re)lanzar el calentamiento: nunca se lanzo en este
+    proceso, o fallo hace mas de SHEETS_WARMUP_RETRY_INTERVAL segundos.
+    """
+    if not getattr(settings, "SHEETS_WARMUP_ENABLED", True):
+        return False
+    with _state_lock:
+        status, finished_at = _state["status"], _state["finished_at"]
+    if status == PENDING:
+        return True
+    if status != FAILED:
+        return False
+    interval = getattr(settings, "SHEETS_WARMUP_RETRY_INTERVAL", 30.0)
+    return finished_at is None or time.time() - finished_at >= interval
+
+
+def get_state():
+    """Estado del calentamiento: status, momentos y duracion de cada paso."""
+    with _state_lock:
+        return dict(_state, steps=dict(_state["steps"]))
@@ -0,0 +1,107 @@
+"""
+Outbox de escrituras contra el Google Sheets falso: encolar y vaciar,
+reintento ante un 429, renovacion de la reserva y envio agrupado.
+"""
+import time
+from datetime import timedelta
+
+from django.test import override_settings
+from django.utils import timezone
+
+from fake_sheets import SPREADSHEET_ID
+from forms.models import OutboxEntry
+from forms.services import outbox
+
+HOJA = "ASESORIAS"
+
+
+def _fila(numero):
+    return ["2024-05-01", "10:00", f"09{numero:08d}001", f"EMPRESA {numero}", "ASESORIA"]
+
+
+def _encolar(numero, queue=HOJA):
+    payload = {"sheet_id": SPREADSHEET_ID, "worksheet": HOJA, "row": _fila(numero)}
+    assert outbox.submit("insert_row", payload, queue=queue) is True
+
+
+def _filas(sheets):
+    # Sin el encabezado.
+    return [row[:5] for row in sheets.spreadsheets[SPREADSHEET_ID].worksheet(HOJA).rows[1:]]
+
+
+def _escrituras(sheets):
+    return sum(count for (operation, worksheet), count in sheets.call_counts().items()
+               if worksheet == HOJA and operation in ("values_append", "values_update"))
+
+
+def test_encolar_y_vaciar_escribe_la_fila(sheets):
+    _encolar(1)
+    assert _filas(sheets) == []
+    assert OutboxEntry.objects.filter(status=OutboxEntry.PENDING).count() == 1
+
+    result = outbox.flush_outbox()
+
+    assert result == {"sent": 1, "retried": 0, "failed": 0}
+    assert _filas(sheets) == [_fila(1)]
+    assert not OutboxEntry.objects.exists()
+
+
+@override_settings(SHEETS_MAX_RETRIES=0)
+def test_429_reprograma_la_entrada_con_backoff(sheets):
+    # Cuota de escritura agotada: Google responde 429.
+    sheets.quotas["write"] = 1
+    sheets.quota_window = 3600
+    sheets._over_quota("write")  # consume la unica escritura de la ventana
+    _encolar(1)
+
+    result = outbox.flush_outbox()
+
+    assert sheets.throttled == 1
+    assert result == {"sent": 0, "retried": 1, "failed": 0}
+    entry = OutboxEntry.objects.get()
+    assert entry.status == OutboxEntry.PENDING
+    assert entry.attempts == 1
+    assert entry.next_attempt_at > timezone.now()
+    assert entry.locked_until is None
+    assert _filas(sheets) == []
+    # Antes de que venza el backoff no se reintenta.
+    assert outbox.flush_outbox()["sent"] == 0
+
+    sheets.quotas["write"] = None
+    OutboxEntry.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+    assert outbox.flush_outbox()["sent"] == 1
+    assert _filas(sheets) == [_fila(1)]
+
+
+def test_la_reserva_se_renueva_durante_un_envio_lento(sheets, monkeypatch):
+    monkeypatch.setattr(outbox, "_lease_seconds", lambda: 0.3)
+    envios, otro_worker = [], []
+
+    def envio_lento(payload):
+        envios.append(payload)
+        # Tarda mas que la reserva; mientras tanto otro worker vacia la cola.
+        if len(envios) == 1:
+            time.sleep(0.6)
+            otro_worker.append(outbox.flush_outbox(handlers={"insert_row": envio_lento}))
+        return outbox._insert_row(payload)
+
+    _encolar(1)
+    result = outbox.flush_outbox(handlers={"insert_row": envio_lento})
+
+    assert result["sent"] == 1
+    assert len(envios) == 1
+    assert otro_worker == [{"sent": 0, "retried": 0, "failed": 0}]
+    assert _filas(sheets) == [_fila(1)]
+
+
+@override_settings(SHEETS_BATCH_MAX_ROWS=3)
+def test_las_entradas_consecutivas_se_envian_juntas(sheets):
+    for numero in range(1, 6):
+        _encolar(numero)
+
+    result = outbox.flush_outbox()
+
+    assert result["sent"] == 5
+    # Dos escrituras: 3 filas y 2 filas, en orden de llegada.
+    assert _escrituras(sheets) == 2
+    assert _filas(sheets) == [_fila(numero) for numero in range(1, 6)]
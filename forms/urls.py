@@ -1,44 +1,43 @@
 from django.urls import path
-from .view.form_views import (
-    dashboard_view,
-    diag_form_view,
-    cap_form_view,
-    success_view,
-    success_afiliado_view,
-    success_estado_afiliado_view,
-    estado_afiliado_view,
-    nuevo_afiliado_view,
-    ventas_afiliado_view,
-    success_ventas_afiliado_view,
-)
+from django.conf import settings
+
+# Con FORMS_ASYNC_VIEWS las vistas que consultan Google Sheets son async
+# (servir con capig_form.asgi); si no, las sincronicas de siempre. Solo se
+# importa el modulo que se usa.
+if getattr(settings, "FORMS_ASYNC_VIEWS", False):
+    from .view import async_form_views as views
+else:
+    from .view import form_views as views
 
 app_name = 'forms'
 
 urlpatterns = [
     # === PÁGINA PRINCIPAL (Landing) ===
-    path("", dashboard_view, name="home"),
+    path("", views.dashboard_view, name="home"),
 
     # === DASHBOARD (Inicio con layout) ===
-    path("dashboard/", dashboard_view, name="dashboard"),
+    path("dashboard/", views.dashboard_view, name="dashboard"),
 
     # === SERVICIOS (Asesorías y Capacitaciones) ===
-    path('asesorias/', diag_form_view, name='diag_form'),
-    path('capacitacion/', cap_form_view, name='cap_form'),
-    path('exito/', success_view, name='success'),  # Éxito para servicios
+    path('asesorias/', views.diag_form_view, name='diag_form'),
+    path('capacitacion/', views.cap_form_view, name='cap_form'),
+    path('exito/', views.success_view, name='success'),  # Éxito para servicios
+    path('empresas/buscar/', views.empresas_autocomplete_view,
+         name='empresas_autocomplete'),  # JSON para Select2
 
     # === GESTIÓN DE AFILIADOS - Registro ===
-    path("registrar-afiliado/", nuevo_afiliado_view, name="nuevo_afiliado"),
-    path("exito-afiliado/", success_afiliado_view, name="success_afiliado"),
+    path("registrar-afiliado/", views.nuevo_afiliado_view, name="nuevo_afiliado"),
+    path("exito-afiliado/", views.success_afiliado_view, name="success_afiliado"),
 
     # === GESTIÓN DE AFILIADOS - Estado ===
-    path("estado-afiliado/", estado_afiliado_view,
+    path("estado-afiliado/", views.estado_afiliado_view,
          name="estado_afiliado"),  # Búsqueda y actualización
-    path("exito-estado-afiliado/", success_estado_afiliado_view,
+    path("exito-estado-afiliado/", views.success_estado_afiliado_view,
          name="success_estado_afiliado"),
 
     # === GESTIÓN DE AFILIADOS - Ventas ===
-    path("ventas-afiliado/", ventas_afiliado_view,
+    path("ventas-afiliado/", views.ventas_afiliado_view,
          name="ventas_afiliado"),  # Búsqueda y registro
-    path("exito-ventas-afiliado/", success_ventas_afiliado_view,
+    path("exito-ventas-afiliado/", views.success_ventas_afiliado_view,
          name="success_ventas_afiliado"),
 ]
@@ -1,16 +1,22 @@
 import os
 import logging
 import re
+import threading
+import time
 from datetime import datetime
-from typing import Dict
+from functools import lru_cache
+from typing import Dict, List
 
 from django.conf import settings
-from gspread.utils import rowcol_to_a1
-
+from django.db import close_old_connections
 from capig_form.services.google_sheets_service import (
+    get_column_data,
     get_google_sheet,
-    find_first_empty_row,
+    run_parallel,
+    write_rows,
 )
+from forms.services import sheet_mirror, sheet_schema
+from forms.services.sheet_index import SheetIndex, ensure_fresh_many
 
 # Encabezados mínimos usados en la hoja SOCIOS
 EXPECTED_BASE_HEADERS = [
@@ -40,167 +46,309 @@ def _get_estado_sheet():
     return get_google_sheet(sheet_id, "ESTADO_SOCIO")
 
 
-def _get_base_datos_sheet():
-    """Obtiene la hoja SOCIOS desde Google Sheets."""
-    sheet_id = os.getenv("SHEET_PATH") or getattr(settings, "SHEET_PATH", "")
-    if not sheet_id:
-        raise RuntimeError("SHEET_PATH no esta configurado.")
-    return get_google_sheet(sheet_id, "SOCIOS")
+def _columnas_socios(header):
+    """
+    Columnas de SOCIOS que usan las consultas: datos base, estado y las
+    columnas por año del historial de ventas. El resto (contacto, sector,
+    tamaño...) no se descarga.
+    """
+    return EXPECTED_BASE_HEADERS + ["ESTADO"] + [
+        col for col, _ in _columnas_anio(tuple(header))]
+
+
+# Indices en memoria por RUC: se cargan una vez por worker y se refrescan
+# en segundo plano cada SHEETS_INDEX_TTL segundos.
+_estado_index = SheetIndex("ESTADO_SOCIO", head=1, normalize_key=limpiar_ruc)
+_socios_index = SheetIndex("SOCIOS", head=2, normalize_key=limpiar_ruc,
+                           columns=lambda header: _columnas_socios(header))
+_ventas_index = SheetIndex("VENTAS_SOCIO", head=2, normalize_key=limpiar_ruc)
+
+
+def _afiliado_desde_fila(row, estado="", fila_estado=None):
+    """Datos del afiliado que usan las vistas a partir de una fila de la hoja."""
+    return {
+        "razon_social": row.get("RAZON_SOCIAL", ""),
+        "ciudad": row.get("CIUDAD", ""),
+        "fecha_afiliacion": row.get("FECHA_AFILIACION", ""),
+        "estado": estado,
+        "fila_estado": fila_estado,
+    }
+
+
+def _resultado_busqueda(hit, base):
+    """Combina el resultado de ESTADO_SOCIO (``hit``) con el de SOCIOS (``base``)."""
+    if hit:
+        return _afiliado_desde_fila(hit[1], hit[1].get("ESTADO", ""), hit[0])
+    if not base:
+        return None
+    return _afiliado_desde_fila(base[1])
+
+
+def buscar_afiliado_por_ruc(ruc):
+    """
+    Busca primero en ESTADO_SOCIO; si no esta, completa desde SOCIOS.
+    ``fila_estado`` es la fila del RUC en ESTADO_SOCIO (None si no tiene),
+    para que ``actualizar_estado_afiliado`` no tenga que buscarla otra vez.
+    """
+    ruc = limpiar_ruc(ruc)
+    # Si ninguna de las dos hojas esta cargada, se cargan juntas.
+    ensure_fresh_many(_estado_index, _socios_index)
+
+    hit = _estado_index.peek(ruc)
+    base = None
+    if hit is None:
+        # Sin fila en ESTADO_SOCIO hay que releerla por si es nueva y, si el
+        # RUC tampoco esta en SOCIOS, releer SOCIOS: ambas lecturas a la vez.
+        hit, base = run_parallel([
+            lambda: _estado_index.get(ruc),
+            lambda: _socios_index.get(ruc),
+        ])
+    return _resultado_busqueda(hit, base)
+
+
+def _columna_ruc(header):
+    """Letra de la columna RUC en ``header`` (None si no esta)."""
+    from gspread.utils import rowcol_to_a1
+
+    col = sheet_schema.ESTADO_SOCIO.compile(header).column("ruc")
+    if col is None:
+        return None
+    return rowcol_to_a1(1, col)[:-1]
 
 
-def _get_all_records_flexible(sheet, head=2):
+def _ubicar_en_estado(sheet, ruc):
     """
-    Lee registros intentando con el head indicado y, si falla (sheet vacío
-    o encabezados cambiados), vuelve a head=1. Devuelve lista vacía si nada funciona.
+    Una sola lectura de ESTADO_SOCIO: encabezado y columna RUC.
+    Devuelve ``(header, fila)``; ``fila`` es None si el RUC no esta.
     """
-    for h in (head, 1):
-        try:
-            return sheet.get_all_records(
-                head=h,
-                value_render_option="UNFORMATTED_VALUE",
-                numericise_ignore=["all"],
-            )
-        except Exception:
+    columna = _columna_ruc(_estado_index.header) or "A"
+    encabezado, rucs = sheet.batch_get(["1:1", f"{columna}2:{columna}"])
+    header = list(encabezado[0]) if encabezado else []
+    if _columna_ruc(header) not in (None, columna):
+        # La columna RUC se movio desde la ultima carga del indice.
+        _estado_index.invalidate()
+        hit = _estado_index.get(ruc)
+        return _estado_index.header, (hit[0] if hit else None)
+
+    for offset, valores in enumerate(rucs):
+        if valores and limpiar_ruc(valores[0]) == ruc:
+            return header, offset + 2
+    return header, None
+
+
+def _encabezado_si_coincide(encabezado, celda, columna, ruc):
+    """
+    Resultado de leer el encabezado y la celda RUC de una fila: devuelve el
+    encabezado si la columna RUC no se movio y la celda tiene ``ruc``; None
+    si la fila ya no es la del RUC (filas borradas u ordenadas).
+    """
+    header = list(encabezado[0]) if encabezado else []
+    if _columna_ruc(header) != columna:
+        return None
+    valor = celda[0][0] if celda and celda[0] else ""
+    return header if limpiar_ruc(valor) == ruc else None
+
+
+def _verificar_fila_estado(sheet, ruc, fila):
+    """
+    Comprueba la ``fila_estado`` de una busqueda con una sola lectura
+    (encabezado y celda RUC de esa fila). Devuelve el encabezado actual, o
+    None si hay que volver a ubicar el RUC.
+    """
+    columna = _columna_ruc(_estado_index.header)
+    if columna is None:
+        return None
+    encabezado, celda = sheet.batch_get(["1:1", f"{columna}{fila}"])
+    return _encabezado_si_coincide(encabezado, celda, columna, ruc)
+
+
+def _cambios_de_estado(esquema, header, fila, nuevo_estado, ahora):
+    """
+    Celdas a escribir en una fila existente de ESTADO_SOCIO: devuelve
+    ``(rangos, cambios)`` con los rangos A1 y el registro ``{columna: valor}``.
+    """
+    from gspread.utils import rowcol_to_a1
+
+    valores = {"estado": nuevo_estado, "actualizacion_estado": ahora}
+    cambios = {}
+    rangos = []
+    for campo, valor in valores.items():
+        col = esquema.column(campo)
+        if col is None:
             continue
-    return []
+        rangos.append((rowcol_to_a1(fila, col), valor))
+        cambios[header[col - 1]] = valor
+    return rangos, cambios
+
+
+def _fila_de_estado(esquema, header, ruc, afiliado, nuevo_estado, ahora):
+    """Fila nueva de ESTADO_SOCIO con los datos del afiliado y el estado."""
+    valores = {
+        "ruc": ruc,
+        "razon_social": afiliado.get("razon_social", ""),
+        "fecha_afiliacion": afiliado.get("fecha_afiliacion", ""),
+        "estado": nuevo_estado,
+        "ciudad": afiliado.get("ciudad", ""),
+        "actualizacion_estado": ahora,
+    }
+    if header:
+        return esquema.build_row(valores)
+    # Orden esperado: RUC | RAZON_SOCIAL | FECHA_AFILIACION | ESTADO | CIUDAD | ACTUALIZACION_ESTADO
+    return list(valores.values())
 
 
-def buscar_afiliado_por_ruc(ruc):
+def actualizar_estado_afiliado(ruc, nuevo_estado, afiliado=None):
     """
-    Busca primero en ESTADO_SOCIO; si falta info, completa desde SOCIOS.
+    Upsert del estado en ESTADO_SOCIO: un solo ``batch_update`` con ESTADO y
+    ACTUALIZACION_ESTADO si el RUC ya tiene fila, o un solo append si no.
+
+    ``afiliado`` es el resultado de ``buscar_afiliado_por_ruc``; su
+    ``fila_estado`` se comprueba leyendo solo el encabezado y la celda RUC de
+    esa fila. Sin el, o si la fila ya no tiene el RUC, se hace una lectura
+    del encabezado y la columna RUC.
     """
     ruc = limpiar_ruc(ruc)
+    sheet = _get_estado_sheet()
+    ahora = datetime.now().strftime("%Y-%m-%d %H:%M")
+
+    header_original = None
+    if afiliado is not None and afiliado.get("fila_estado") and _estado_index.header:
+        fila = afiliado["fila_estado"]
+        header_original = _verificar_fila_estado(sheet, ruc, fila)
+    if header_original is None:
+        header_original, fila = _ubicar_en_estado(sheet, ruc)
+    esquema = sheet_schema.ESTADO_SOCIO.compile(header_original)
+
+    if fila:
+        rangos, cambios = _cambios_de_estado(
+            esquema, header_original, fila, nuevo_estado, ahora)
+        if rangos:
+            sheet.batch_update(
+                [{"range": rango, "values": [[valor]]} for rango, valor in rangos],
+                value_input_option="USER_ENTERED")
+        _estado_index.put(ruc, fila, cambios)
+        return
+
+    # Si no se encontro el RUC, agregar nueva fila con los datos que ya trajo
+    # la busqueda (o los de SOCIOS) y el estado actualizado.
+    if afiliado is None:
+        base = _socios_index.get(ruc)
+        afiliado = _afiliado_desde_fila(base[1] if base else {})
+    new_row = _fila_de_estado(esquema, header_original, ruc, afiliado, nuevo_estado, ahora)
+
+    fila = write_rows(sheet, [new_row])
+    if fila:
+        _estado_index.put(ruc, fila, dict(zip(header_original, new_row)))
 
-    estado_sheet = _get_estado_sheet()
-    estado_rows = _get_all_records_flexible(estado_sheet, head=1)
-
-    afiliado = next(
-        (row for row in estado_rows if limpiar_ruc(row.get("RUC", "")) == ruc),
-        None,
-    )
 
-    if afiliado and all(
-        afiliado.get(key) for key in ["RAZON_SOCIAL", "CIUDAD", "FECHA_AFILIACION", "ESTADO"]
-    ):
-        return {
-            "razon_social": afiliado.get("RAZON_SOCIAL", ""),
-            "ciudad": afiliado.get("CIUDAD", ""),
-            "fecha_afiliacion": afiliado.get("FECHA_AFILIACION", ""),
-            "estado": afiliado.get("ESTADO", ""),
-        }
-
-    base_sheet = _get_base_datos_sheet()
-    base_rows = _get_all_records_flexible(base_sheet, head=2)
-
-    base_row = next(
-        (row for row in base_rows if limpiar_ruc(row.get("RUC", "")) == ruc),
-        None,
-    )
+def buscar_afiliado_por_ruc_base_datos(ruc):
+    """Busca un afiliado únicamente en la hoja SOCIOS."""
+    # La vista de ventas consulta despues VENTAS_SOCIO: se cargan juntas.
+    ensure_fresh_many(_socios_index, _ventas_index)
+    return _afiliado_base(_socios_index.get(ruc))
 
-    if afiliado:
-        return {
-            "razon_social": afiliado.get("RAZON_SOCIAL", ""),
-            "ciudad": afiliado.get("CIUDAD", ""),
-            "fecha_afiliacion": afiliado.get("FECHA_AFILIACION", ""),
-            "estado": afiliado.get("ESTADO", ""),
-        }
 
-    if not base_row:
+def _afiliado_base(hit):
+    if not hit:
         return None
-
+    row = hit[1]
     return {
-        "razon_social": base_row.get("RAZON_SOCIAL", ""),
-        "ciudad": base_row.get("CIUDAD", ""),
-        "fecha_afiliacion": base_row.get("FECHA_AFILIACION", ""),
-        "estado": "",
+        "razon_social": row.get("RAZON_SOCIAL", ""),
+        "ciudad": row.get("CIUDAD", ""),
+        "fecha_afiliacion": row.get("FECHA_AFILIACION", ""),
     }
 
 
-def actualizar_estado_afiliado(ruc, nuevo_estado):
-    sheet = _get_estado_sheet()
-    data = sheet.get_all_records(
-        value_render_option="UNFORMATTED_VALUE",
-        numericise_ignore=["all"],
+# ==========================
+# HISTORIAL DE VENTAS POR RUC
+# ==========================
+# RUC -> ventas ya combinadas con las columnas por año de SOCIOS y ordenadas.
+# Se reconstruye solo cuando cambia la version de alguno de los dos indices.
+_historial_lock = threading.Lock()
+_historial = {"versiones": None, "por_ruc": {}}
+
+
+@lru_cache(maxsize=8)
+def _columnas_anio(header):
+    """Columnas de SOCIOS con nombre de año (ej. 2019, 2020), una vez por encabezado."""
+    return tuple(
+        (col, col.strip()) for col in header
+        if col and re.fullmatch(r"\d{4}", col.strip())
     )
-    header = [col.strip().upper() for col in sheet.row_values(1)]
 
-    def _col_index(nombre):
-        try:
-            return header.index(nombre) + 1
-        except ValueError:
-            return None
-
-    col_estado = _col_index("ESTADO")
-    col_actualizacion = _col_index("ACTUALIZACION_ESTADO")
-    encontrado = False
-
-    for idx, row in enumerate(data, start=2):
-        if limpiar_ruc(row.get("RUC", "")) == limpiar_ruc(ruc):
-            encontrado = True
-            if col_estado:
-                sheet.update_cell(idx, col_estado, nuevo_estado)
-            if col_actualizacion:
-                sheet.update_cell(
-                    idx,
-                    col_actualizacion,
-                    datetime.now().strftime("%Y-%m-%d %H:%M"),
-                )
-            break
-
-    # Si no se encontro el RUC, agregar nueva fila con datos base y estado actualizado
-    if not encontrado:
-        base_sheet = _get_base_datos_sheet()
-        base_rows = _get_all_records_flexible(base_sheet, head=2)
-        base_row = next(
-            (row for row in base_rows if limpiar_ruc(
-                row.get("RUC", "")) == limpiar_ruc(ruc)),
-            {},
-        )
-        # Orden esperado: RUC | RAZON_SOCIAL | FECHA_AFILIACION | ESTADO | CIUDAD | ACTUALIZACION_ESTADO
-        new_row = [
-            limpiar_ruc(ruc),
-            base_row.get("RAZON_SOCIAL", ""),
-            base_row.get("FECHA_AFILIACION", ""),
-            nuevo_estado,
-            base_row.get("CIUDAD", ""),
-            datetime.now().strftime("%Y-%m-%d %H:%M"),
-        ]
-
-        header_len = max(len(header), len(new_row))
-        # Buscar la primera fila realmente vacía (sin celdas con texto)
-        values = sheet.get_all_values(value_render_option="UNFORMATTED_VALUE")
-        target_row = None
-        for idx, row in enumerate(values[1:], start=2):
-            if not any((cell or "").strip() for cell in row):
-                target_row = idx
-                break
-        if target_row is None:
-            target_row = len(values) + 1
-
-        # Ajustar tamaño al header
-        if len(new_row) < header_len:
-            new_row += [""] * (header_len - len(new_row))
-        elif len(new_row) > header_len:
-            new_row = new_row[:header_len]
-
-        start_cell = rowcol_to_a1(target_row, 1)
-        end_cell = rowcol_to_a1(target_row, header_len)
-        sheet.update(f"{start_cell}:{end_cell}", [new_row], value_input_option="USER_ENTERED")
 
+def _venta_desde_fila(row, esquema):
+    # Los alias (ANIO/AÑO/ANO, MONTO_ESTIMADO/VENTAS_ESTIMADAS...) ya vienen
+    # resueltos en el esquema compilado del encabezado de VENTAS_SOCIO.
+    return {
+        "anio": str(esquema.get(row, "anio")).strip(),
+        "comparativo": esquema.get(row, "comparativo"),
+        "ventas_estimadas": esquema.get(row, "ventas_estimadas"),
+        "fecha_registro": esquema.get(row, "fecha_registro"),
+    }
 
-def buscar_afiliado_por_ruc_base_datos(ruc):
-    """Busca un afiliado únicamente en la hoja SOCIOS."""
-    ruc = limpiar_ruc(ruc)
-    sheet = _get_base_datos_sheet()
-    rows = _get_all_records_flexible(sheet, head=2)
-    for row in rows:
-        if limpiar_ruc(row.get("RUC", "")) == ruc:
-            return {
-                "razon_social": row.get("RAZON_SOCIAL", ""),
-                "ciudad": row.get("CIUDAD", ""),
-                "fecha_afiliacion": row.get("FECHA_AFILIACION", ""),
-            }
-    return None
+
+def _construir_historial(con_socios=True):
+    por_ruc = {}
+    esquema = sheet_schema.VENTAS_SOCIO.compile(
+        _ventas_index.header, _ventas_index.header_row)
+    for _, row in _ventas_index.rows():
+        ruc = limpiar_ruc(row.get("RUC", ""))
+        if ruc:
+            por_ruc.setdefault(ruc, []).append(_venta_desde_fila(row, esquema))
+
+    # Fallback: columnas por año en SOCIOS para los años sin registro en VENTAS_SOCIO
+    columnas = _columnas_anio(tuple(_socios_index.header)) if con_socios else ()
+    if columnas:
+        vistos = set()
+        for _, row in _socios_index.rows():
+            ruc = limpiar_ruc(row.get("RUC", ""))
+            # Como _socios_index.get, solo cuenta la primera fila de cada RUC.
+            if not ruc or ruc in vistos:
+                continue
+            vistos.add(ruc)
+            ventas = por_ruc.get(ruc, [])
+            existing_years = {v["anio"] for v in ventas if v["anio"]}
+            for key, anio in columnas:
+                if anio in existing_years:
+                    continue
+                value = row.get(key)
+                val_str = value.strip() if isinstance(value, str) else value
+                if val_str in ("", None):
+                    continue
+                ventas.append({
+                    "anio": anio,
+                    "comparativo": "",
+                    "ventas_estimadas": val_str,
+                    "fecha_registro": "",
+                })
+            if ventas:
+                por_ruc[ruc] = ventas
+
+    # Ordenar desc por año
+    for ventas in por_ruc.values():
+        ventas.sort(key=lambda v: v.get("anio") or "", reverse=True)
+    return por_ruc
+
+
+def _historial_ventas():
+    try:
+        ensure_fresh_many(_ventas_index, _socios_index)
+    except Exception:
+        # Sin VENTAS_SOCIO no hay historial; sin SOCIOS solo falta el fallback
+        # por año y se muestra igual lo registrado en VENTAS_SOCIO.
+        if _ventas_index.age() is None:
+            raise
+        logging.warning("No se pudo leer SOCIOS; historial de ventas sin columnas por año.",
+                        exc_info=True)
+    con_socios = _socios_index.age() is not None
+    versiones = (_ventas_index.version, _socios_index.version if con_socios else None)
+    if _historial["versiones"] != versiones:
+        with _historial_lock:
+            if _historial["versiones"] != versiones:
+                _historial["por_ruc"] = _construir_historial(con_socios)
+                _historial["versiones"] = versiones
+    return _historial["por_ruc"]
 
 
 def obtener_ventas_por_ruc(ruc):
@@ -214,91 +362,18 @@ def obtener_ventas_por_ruc(ruc):
         return []
 
     try:
-        sheet = get_google_sheet(sheet_id, "VENTAS_SOCIO")
+        ventas = _historial_ventas().get(ruc_norm, [])
     except Exception:
         return []
-
-    rows = _get_all_records_flexible(sheet, head=2)
-    ventas = []
-    for row in rows:
-        if limpiar_ruc(row.get("RUC", "")) != ruc_norm:
-            continue
-        anio = str(row.get("ANIO") or row.get("AÑO")
-                   or row.get("ANO") or "").strip()
-        comparativo = row.get("COMPARATIVO", "")
-        ventas_estimadas = (
-            row.get("VENTAS_ESTIMADAS")
-            or row.get("MONTO_ESTIMADO")
-            or row.get("MONTO_VENTAS")
-            or row.get("VENTAS_ESTIMADA")
-            or ""
-        )
-        fecha_registro = row.get("FECHA_REGISTRO", "") or row.get("FECHA", "")
-        ventas.append(
-            {
-                "anio": anio,
-                "comparativo": comparativo,
-                "ventas_estimadas": ventas_estimadas,
-                "fecha_registro": fecha_registro,
-            }
-        )
-
-    # Fallback: buscar columnas por año (ej. 2019, 2020) en la hoja SOCIOS
-    try:
-        base_sheet = get_google_sheet(sheet_id, "SOCIOS")
-        base_rows = _get_all_records_flexible(base_sheet, head=2)
-    except Exception:
-        base_rows = []
-
-    if base_rows:
-        try:
-            base_row = next(
-                (row for row in base_rows if limpiar_ruc(
-                    row.get("RUC", "")) == ruc_norm),
-                None,
-            )
-        except Exception:
-            base_row = None
-        if base_row:
-            existing_years = {v.get("anio") for v in ventas if v.get("anio")}
-            for key, value in base_row.items():
-                key_str = (key or "").strip()
-                if not key_str or not re.fullmatch(r"\d{4}", key_str):
-                    continue
-                if key_str in existing_years:
-                    continue
-                val_str = (value or "").strip() if isinstance(
-                    value, str) else value
-                if val_str in ("", None):
-                    continue
-                ventas.append(
-                    {
-                        "anio": key_str,
-                        "comparativo": "",
-                        "ventas_estimadas": val_str,
-                        "fecha_registro": "",
-                    }
-                )
-
-    # Ordenar desc por año si es numérico
-    ventas.sort(key=lambda v: v.get("anio") or "", reverse=True)
-    return ventas
+    return [dict(venta) for venta in ventas]
 
 
-def guardar_ventas_afiliado(data: Dict[str, str]):
+def _fila_ventas(data: Dict[str, str]):
     """
-    Inserta un registro en la hoja VENTAS_SOCIO con el orden exacto:
+    Fila de VENTAS_SOCIO con el orden exacto:
     RUC | RAZON_SOCIAL | CIUDAD | FECHA_AFILIACION | REGISTRO_VENTAS |
     COMPARATIVO | MONTO_ESTIMADO | OBSERVACIONES | FECHA_REGISTRO | ANIO
     """
-    logging.info("Datos recibidos para guardar ventas: %s", data)
-
-    sheet_id = os.getenv("SHEET_PATH") or getattr(settings, "SHEET_PATH", "")
-    if not sheet_id:
-        raise RuntimeError("SHEET_PATH no esta configurado.")
-
-    sheet = get_google_sheet(sheet_id, "VENTAS_SOCIO")
-
     fila = [
         data.get("ruc", ""),
         data.get("razon_social", ""),
@@ -308,22 +383,159 @@ def guardar_ventas_afiliado(data: Dict[str, str]):
         data.get("comparativo", ""),
         data.get("ventas_estimadas", ""),
         data.get("observaciones", ""),
-        datetime.now().strftime("%Y-%m-%d %H:%M"),
+        # Si viene del outbox, conservar la hora en que se envio el formulario.
+        data.get("fecha_registro") or datetime.now().strftime("%Y-%m-%d %H:%M"),
         data.get("anio", ""),
     ]
 
     if len(fila) != 10:
         raise ValueError(f"Fila con columnas inesperadas: {fila}")
+    return fila
+
+
+def guardar_ventas_afiliado_bulk(registros: List[Dict[str, str]]):
+    """
+    Inserta varios registros (uno por año) en VENTAS_SOCIO como filas
+    contiguas en una sola escritura, y da formato de fecha solo a esas filas.
+    El costo no depende de cuantos años se registren ni del largo de la hoja.
+    """
+    if not registros:
+        return
+    logging.info("Datos recibidos para guardar ventas: %s", registros)
+
+    sheet_id = os.getenv("SHEET_PATH") or getattr(settings, "SHEET_PATH", "")
+    if not sheet_id:
+        raise RuntimeError("SHEET_PATH no esta configurado.")
+
+    sheet = get_google_sheet(sheet_id, "VENTAS_SOCIO")
+    filas = [_fila_ventas(data) for data in registros]
 
-    # Inserta asegurando que se respeten las primeras columnas (A-J) en la siguiente fila disponible
-    next_row = find_first_empty_row(sheet, start_row=2)
-    start = f"A{next_row}"
-    end = f"J{next_row}"
-    sheet.update(f"{start}:{end}", [fila], value_input_option="USER_ENTERED")
+    # Inserta asegurando que se respeten las primeras columnas (A-J) en filas nuevas
+    first_row = write_rows(sheet, filas)
+    if not first_row:
+        return
     try:
-        # Forzar formato de fecha dd/MM/YYYY en la columna D a partir de la fila 2
-        sheet.format(f"D2:D{next_row}", {"numberFormat": {
+        # Formato de fecha dd/MM/YYYY en la columna D, solo en las filas nuevas
+        sheet.format(f"D{first_row}:D{first_row + len(filas) - 1}", {"numberFormat": {
                      "type": "DATE", "pattern": "dd/MM/yyyy"}})
     except Exception:
         logging.warning(
             "No se pudo aplicar formato de fecha a la columna D en VENTAS_SOCIO.")
+
+
+def guardar_ventas_afiliado(data: Dict[str, str]):
+    """Inserta un registro en la hoja VENTAS_SOCIO (ver ``_fila_ventas``)."""
+    guardar_ventas_afiliado_bulk([data])
+
+
+# ==========================
+# LISTAS DE REFERENCIA
+# ==========================
+# Stale-while-revalidate: se sirve la ultima lista buena al instante y, si
+# tiene mas de SHEETS_REFERENCE_TTL segundos, se actualiza en segundo plano.
+# La copia compartida entre workers es la copia local (SheetMirrorRow); si
+# Google falla o devuelve la lista vacia se conserva la ultima buena.
+_listas = {}
+_listas_lock = threading.Lock()
+_listas_refrescando = set()
+
+
+def _lista_desde_copia(nombre):
+    """``(valores, epoch de los datos)`` desde la copia local, o None."""
+    if not getattr(settings, "SHEETS_MIRROR_ENABLED", True):
+        return None
+    snapshot = sheet_mirror.load_rows(nombre)
+    if snapshot is None or not snapshot.rows:
+        return None
+    valores = [data.get("valor", "") for _, data in snapshot.rows]
+    return valores, snapshot.synced_at.timestamp()
+
+
+def _refrescar_lista(nombre, leer_google):
+    """Lee la lista desde Google y la publica; None si no hubo datos nuevos."""
+    try:
+        valores = leer_google()
+    except Exception:
+        logging.exception("No se pudo leer la lista '%s' desde Google Sheets.", nombre)
+        return None
+    if not valores:
+        logging.warning("La lista '%s' llego vacia; se conserva la anterior.", nombre)
+        return None
+    with _listas_lock:
+        _listas[nombre] = (valores, time.time())
+    if getattr(settings, "SHEETS_MIRROR_ENABLED", True):
+        try:
+            sheet_mirror.store_list(nombre, valores)
+        except Exception:
+            logging.exception("No se pudo guardar la lista '%s' en la copia local.", nombre)
+    return valores
+
+
+def _refrescar_en_segundo_plano(nombre, leer_google):
+    with _listas_lock:
+        if nombre in _listas_refrescando:
+            return
+        _listas_refrescando.add(nombre)
+
+    def _refrescar():
+        try:
+            _refrescar_lista(nombre, leer_google)
+        finally:
+            with _listas_lock:
+                _listas_refrescando.discard(nombre)
+            close_old_connections()
+
+    threading.Thread(target=_refrescar, name=f"lista-{nombre}", daemon=True).start()
+
+
+def _lista_de_referencia(nombre, leer_google):
+    """
+    Lista para un <select>. Solo se espera a Google si no hay ninguna copia
+    (primer arranque); en los demas casos responde sin llamadas a la API.
+    """
+    ttl = getattr(settings, "SHEETS_REFERENCE_TTL", 300)
+    actual = _listas.get(nombre)
+    if actual is None or time.time() - actual[1] >= ttl:
+        # Otro worker (o sync_sheets) pudo haberla actualizado ya.
+        copia = _lista_desde_copia(nombre)
+        if copia is not None and (actual is None or copia[1] > actual[1]):
+            actual = copia
+            with _listas_lock:
+                _listas[nombre] = actual
+
+    if actual is None:
+        return _refrescar_lista(nombre, leer_google) or []
+
+    valores, cargado_en = actual
+    if time.time() - cargado_en >= ttl:
+        _refrescar_en_segundo_plano(nombre, leer_google)
+    return valores
+
+
+def obtener_empresas():
+    """Razones sociales de la primera hoja (columna B desde B3)."""
+    sheet_id = os.getenv("SHEET_PATH") or getattr(settings, "SHEET_PATH", "")
+    return _lista_de_referencia(
+        sheet_mirror.EMPRESAS,
+        lambda: get_column_data(
+            sheet_id, worksheet_index=0, column='B', start_row=3, raise_errors=True),
+    )
+
+
+def obtener_sectores():
+    """Sectores desde la hoja 'SECTOR' (columna A, desde A2)."""
+    sheet_id = os.getenv("SHEET_PATH") or getattr(settings, "SHEET_PATH", "")
+
+    def _leer():
+        # get_google_sheet ya compara el titulo sin mayusculas ni espacios extra.
+        valores = get_google_sheet(sheet_id, "SECTOR").col_values(1)
+        # Saltar encabezado (fila 1) y limpiar vacios
+        return [val.strip() for val in valores[1:] if val.strip()]
+
+    return _lista_de_referencia(sheet_mirror.SECTORES, _leer)
+
+
+def edades_listas():
+    """Segundos desde los datos de cada lista cargada en este worker."""
+    ahora = time.time()
+    return {nombre: ahora - cargado_en for nombre, (_, cargado_en) in dict(_listas).items()}
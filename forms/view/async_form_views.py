@@ -0,0 +1,182 @@
+"""
+Vistas async de los formularios, para servir la app por ASGI
+(``FORMS_ASYNC_VIEWS = True``).
+
+Mismo comportamiento que ``form_views``: las busquedas y el upsert de estado
+esperan a Google sin ocupar un hilo (``forms.async_utils``) y los envios van
+al outbox. Lo que toca la base de datos (outbox, sesion, render con mensajes)
+se ejecuta con ``sync_to_async``.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.http import HttpResponseNotAllowed
+from django.shortcuts import redirect
+
+from forms.async_utils import (
+    aactualizar_estado_afiliado,
+    abuscar_afiliado_por_ruc,
+    abuscar_afiliado_por_ruc_base_datos,
+    aobtener_ventas_por_ruc,
+)
+from forms.services import outbox
+from forms.services.typeahead import buscar_empresas
+from forms.utils import obtener_sectores
+from forms.view.form_views import (  # noqa: F401 - vistas sin Sheets, se reutilizan
+    CAP_SHEET,
+    DIAG_SHEET,
+    ERROR_GUARDADO,
+    ERROR_VENTAS,
+    _completar_contexto_ventas,
+    _contexto_ventas,
+    _datos_nuevo_afiliado,
+    _insercion_capacitacion,
+    _insercion_diagnostico,
+    _parametros_autocompletado,
+    _registros_ventas,
+    _respuesta_select2,
+    _resumen_estado,
+    custom_404_view,
+    dashboard_view,
+    render,
+    success_afiliado_view,
+    success_estado_afiliado_view,
+    success_view,
+    success_ventas_afiliado_view,
+)
+
+_arender = sync_to_async(render)
+_asubmit = sync_to_async(outbox.submit)
+
+
+def _require_methods(methods):
+    """``require_http_methods`` para vistas async (el de Django 4.2 es solo sincronico)."""
+    def decorator(view):
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            if request.method not in methods:
+                return HttpResponseNotAllowed(methods)
+            return await view(request, *args, **kwargs)
+        return inner
+    return decorator
+
+
+@_require_methods(["GET", "POST"])
+async def diag_form_view(request):
+    """Vista para el formulario de diagnóstico"""
+    if request.method == "POST":
+        success = await _asubmit(
+            "insert_row", _insercion_diagnostico(request.POST), queue=DIAG_SHEET)
+        if success:
+            return redirect('forms:success')
+        messages.error(request, ERROR_GUARDADO)
+
+    return await _arender(request, 'diag_form.html', {
+        'razon_social': request.POST.get('razon_social', ''),
+    })
+
+
+@_require_methods(["GET", "POST"])
+async def cap_form_view(request):
+    """Vista para el formulario de capacitación"""
+    if request.method == "POST":
+        success = await _asubmit(
+            "insert_row", _insercion_capacitacion(request.POST), queue=CAP_SHEET)
+        if success:
+            return redirect('forms:success')
+        messages.error(request, ERROR_GUARDADO)
+
+    return await _arender(request, 'cap_form.html', {
+        'razon_social': request.POST.get('razon_social', ''),
+    })
+
+
+@_require_methods(["GET"])
+async def empresas_autocomplete_view(request):
+    """Autocompletado de razon social / RUC en formato Select2."""
+    query, limit = _parametros_autocompletado(request)
+    if len(query) < 2:
+        return _respuesta_select2([])
+    # El indice se arma en memoria; solo la primera carga lee la copia local.
+    resultados = await sync_to_async(buscar_empresas, thread_sensitive=False)(
+        query, limit=limit)
+    return _respuesta_select2(resultados)
+
+
+@_require_methods(["GET", "POST"])
+async def estado_afiliado_view(request):
+    """Consulta y actualiza el estado de un afiliado."""
+    context = {}
+
+    if request.method == "POST":
+        ruc = request.POST.get("ruc")
+        nuevo_estado = request.POST.get("estado")
+
+        afiliado = await abuscar_afiliado_por_ruc(ruc)
+
+        if afiliado:
+            if nuevo_estado:
+                await aactualizar_estado_afiliado(ruc, nuevo_estado, afiliado=afiliado)
+                # La sesion se guarda en la base de datos.
+                await sync_to_async(request.session.__setitem__)(
+                    'estado_update', _resumen_estado(afiliado, ruc, nuevo_estado))
+                return redirect("forms:success_estado_afiliado")
+            context["afiliado"] = afiliado
+        else:
+            context["no_encontrado"] = True
+
+    return await _arender(request, "estado_afiliado.html", context)
+
+
+@_require_methods(["GET", "POST"])
+async def nuevo_afiliado_view(request):
+    """Formulario para registrar un nuevo afiliado en la hoja BASE DE DATOS."""
+    sectores = await sync_to_async(obtener_sectores, thread_sensitive=False)()
+
+    if request.method == "POST":
+        try:
+            encolado = await _asubmit(
+                "nuevo_afiliado", _datos_nuevo_afiliado(request.POST), queue="SOCIOS")
+            if not encolado:
+                raise RuntimeError("no se pudo guardar en Google Sheets")
+            messages.success(request, "Afiliado registrado correctamente.")
+        except Exception as exc:
+            messages.error(request, f"Error al registrar: {exc}")
+
+    return await _arender(request, "afiliado_form.html", {"sectores": sectores})
+
+
+@_require_methods(["GET", "POST"])
+async def ventas_afiliado_view(request):
+    """Formulario para registrar las ventas de un afiliado (busqueda y envio separados)."""
+    context = _contexto_ventas(request.POST)
+
+    if request.method == "POST":
+        ruc = request.POST.get("ruc", "").strip()
+        afiliado = await abuscar_afiliado_por_ruc_base_datos(ruc)
+
+        if afiliado:
+            _completar_contexto_ventas(
+                context, request.POST, afiliado, await aobtener_ventas_por_ruc(ruc))
+
+            # Fase 1: solo se busco por RUC, aun no se responde el formulario
+            if not request.POST.get("registro_ventas"):
+                return await _arender(request, "ventas_afiliado.html", context)
+
+            # Fase 2: ya respondio preguntas -> guardar
+            registros, error = _registros_ventas(request.POST, afiliado)
+            if error:
+                messages.error(request, error)
+                return await _arender(request, "ventas_afiliado.html", context)
+
+            guardado = await _asubmit(
+                "ventas_afiliado_bulk", {"registros": registros}, queue="VENTAS_SOCIO")
+            if not guardado:
+                messages.error(request, ERROR_VENTAS)
+                return await _arender(request, "ventas_afiliado.html", context)
+            return redirect("forms:success_ventas_afiliado")
+        else:
+            context["no_encontrado"] = True
+
+    return await _arender(request, "ventas_afiliado.html", context)
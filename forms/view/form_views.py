@@ -1,4 +1,6 @@
-from django.shortcuts import render, redirect
+from django import shortcuts
+from django.shortcuts import redirect
+from django.http import JsonResponse
 from django.contrib import messages
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.http import require_GET
@@ -9,24 +11,32 @@ import pytz
 import json
 import re
 
-from capig_form.services.google_sheets_service import (
-    _get_client,
-    get_column_data,
-    get_google_sheet,
-    insert_row_to_sheet,
-)
-from forms.afiliacion_handler import guardar_nuevo_afiliado_en_google_sheets
+from capig_form.services import request_timing
+from forms.services import outbox
+from forms.services.typeahead import buscar_empresas
 from forms.utils import (
     buscar_afiliado_por_ruc,
     actualizar_estado_afiliado,
     buscar_afiliado_por_ruc_base_datos,
-    guardar_ventas_afiliado,
+    obtener_sectores,
     obtener_ventas_por_ruc,
 )
 
 VENTA_KEY_PATTERN = re.compile(r"ventas\[(\d+)\]\[(\w+)\]")
 
 
+def render(request, template_name, context=None, **kwargs):
+    """``django.shortcuts.render`` contando el tramo "render" de Server-Timing."""
+    with request_timing.span("render"):
+        return shortcuts.render(request, template_name, context, **kwargs)
+
+
+# Hojas de servicios
+DIAG_SHEET = 'ASESORIAS'
+CAP_SHEET = 'CAPACITACIONES'
+ERROR_GUARDADO = 'Hubo un error al guardar los datos. Por favor, intente nuevamente.'
+
+
 def _entrada_venta_vacia():
     """Estructura base para renderizar un bloque de ventas."""
     return {"anio": "", "comparativo": "", "ventas_estimadas": ""}
@@ -50,31 +60,6 @@ def dashboard_view(request):
     return render(request, 'dashboard.html')
 
 
-def _obtener_sectores():
-    """Devuelve la lista de sectores desde la hoja 'SECTOR' (columna A, desde A2)."""
-    try:
-        sheet = get_google_sheet(settings.SHEET_PATH, "SECTOR")
-    except Exception:
-        # Intentar encontrar la hoja por nombre, aunque tenga espacios o diferencias de may?sculas/min?sculas
-        try:
-            client = _get_client()
-            spreadsheet = client.open_by_key(settings.SHEET_PATH)
-            sheet = next((ws for ws in spreadsheet.worksheets()
-                         if ws.title.strip().lower() == "sector"), None)
-            if not sheet:
-                return []
-        except Exception:
-            return []
-
-    try:
-        valores = sheet.col_values(1)
-        # Saltar encabezado (fila 1) y limpiar vac?os
-        sectores = [val.strip() for val in valores[1:] if val.strip()]
-        return sectores
-    except Exception:
-        return []
-
-
 def _codigo_seguridad_valido(request):
     """Valida el código de seguridad de 6 dígitos enviado en el POST."""
     codigo = (request.POST.get("security_code") or "").strip()
@@ -97,99 +82,111 @@ def _to_iso_date(fecha_str: str) -> str:
     return fecha_str
 
 
+def _fecha_hora_ecuador():
+    now_ecuador = datetime.now(pytz.timezone('America/Guayaquil'))
+    return now_ecuador.strftime('%Y-%m-%d'), now_ecuador.strftime('%H:%M:%S')
+
+
+def _insercion_diagnostico(post):
+    """Payload de ``insert_row`` para una asesoria (hoja ASESORIAS)."""
+    se_diagnostico = post.get('se_diagnostico') == 'true'
+    fecha_str, hora_str = _fecha_hora_ecuador()
+    return {
+        "sheet_id": settings.SHEET_PATH,
+        "worksheet": DIAG_SHEET,
+        "row": [
+            post.get('razon_social'),
+            post.get('tipo_diagnostico'),
+            post.get('subtipo_diagnostico', ''),
+            post.get('otros_subtipo', ''),
+            'Sí' if se_diagnostico else 'No',
+            fecha_str,
+            hora_str,
+        ],
+    }
+
+
+def _insercion_capacitacion(post):
+    """Payload de ``insert_row`` para una capacitacion (hoja CAPACITACIONES)."""
+    fecha_str, hora_str = _fecha_hora_ecuador()
+    return {
+        "sheet_id": settings.SHEET_PATH,
+        "worksheet": CAP_SHEET,
+        "row": [
+            post.get('razon_social'),
+            post.get('nombre_capacitacion'),
+            post.get('tipo_capacitacion'),
+            post.get('valor_pago'),
+            fecha_str,
+            hora_str,
+        ],
+    }
+
+
 @require_http_methods(["GET", "POST"])
 def diag_form_view(request):
     """Vista para el formulario de diagnóstico"""
     if request.method == "POST":
-        # Nombre de hoja actualizado
-        SHEET_NAME = 'ASESORIAS'
-
-        razon_social = request.POST.get('razon_social')
-        tipo_diagnostico = request.POST.get('tipo_diagnostico')
-        subtipo_diagnostico = request.POST.get('subtipo_diagnostico', '')
-        otros_subtipo = request.POST.get('otros_subtipo', '')
-        se_diagnostico = request.POST.get('se_diagnostico') == 'true'
-
-        ecuador_tz = pytz.timezone('America/Guayaquil')
-        now_ecuador = datetime.now(ecuador_tz)
-        fecha_str = now_ecuador.strftime('%Y-%m-%d')
-        hora_str = now_ecuador.strftime('%H:%M:%S')
-
-        success = insert_row_to_sheet(settings.SHEET_PATH, SHEET_NAME, [
-            razon_social,
-            tipo_diagnostico,
-            subtipo_diagnostico,
-            otros_subtipo,
-            'Sí' if se_diagnostico else 'No',
-            fecha_str,
-            hora_str,
-        ])
+        success = outbox.submit(
+            "insert_row", _insercion_diagnostico(request.POST), queue=DIAG_SHEET)
 
         if success:
             return redirect('forms:success')
         else:
-            messages.error(
-                request, 'Hubo un error al guardar los datos. Por favor, intente nuevamente.')
-
-    empresas = get_column_data(
-        settings.SHEET_PATH, worksheet_index=0, column='B', start_row=3)
+            messages.error(request, ERROR_GUARDADO)
 
-    if not empresas:
-        empresas = [
-            'Empresa Ejemplo S.A.',
-            'Corporación ABC Ltda.',
-            'Inversiones XYZ S.A.S.',
-            'Grupo Empresarial 123',
-            'Soluciones Tecnológicas DEF'
-        ]
-
-    return render(request, 'diag_form.html', {'empresas': empresas})
+    # Las opciones se piden al endpoint de autocompletado mientras se escribe;
+    # solo se conserva la razon social elegida si el formulario se re-renderiza.
+    return render(request, 'diag_form.html', {
+        'razon_social': request.POST.get('razon_social', ''),
+    })
 
 
 @require_http_methods(["GET", "POST"])
 def cap_form_view(request):
     """Vista para el formulario de capacitación"""
     if request.method == "POST":
-        SHEET_NAME = 'CAPACITACIONES'
-
-        razon_social = request.POST.get('razon_social')
-        nombre_capacitacion = request.POST.get('nombre_capacitacion')
-        tipo_capacitacion = request.POST.get('tipo_capacitacion')
-        valor_pago = request.POST.get('valor_pago')
-
-        ecuador_tz = pytz.timezone('America/Guayaquil')
-        now_ecuador = datetime.now(ecuador_tz)
-        fecha_str = now_ecuador.strftime('%Y-%m-%d')
-        hora_str = now_ecuador.strftime('%H:%M:%S')
-
-        success = insert_row_to_sheet(settings.SHEET_PATH, SHEET_NAME, [
-            razon_social,
-            nombre_capacitacion,
-            tipo_capacitacion,
-            valor_pago,
-            fecha_str,
-            hora_str,
-        ])
+        success = outbox.submit(
+            "insert_row", _insercion_capacitacion(request.POST), queue=CAP_SHEET)
 
         if success:
             return redirect('forms:success')
         else:
-            messages.error(
-                request, 'Hubo un error al guardar los datos. Por favor, intente nuevamente.')
+            messages.error(request, ERROR_GUARDADO)
 
-    empresas = get_column_data(
-        settings.SHEET_PATH, worksheet_index=0, column='B', start_row=3)
+    # Las opciones se piden al endpoint de autocompletado mientras se escribe;
+    # solo se conserva la razon social elegida si el formulario se re-renderiza.
+    return render(request, 'cap_form.html', {
+        'razon_social': request.POST.get('razon_social', ''),
+    })
 
-    if not empresas:
-        empresas = [
-            'Empresa Ejemplo S.A.',
-            'Corporación ABC Ltda.',
-            'Inversiones XYZ S.A.S.',
-            'Grupo Empresarial 123',
-            'Soluciones Tecnológicas DEF'
-        ]
 
-    return render(request, 'cap_form.html', {'empresas': empresas})
+@require_GET
+def empresas_autocomplete_view(request):
+    """
+    Autocompletado de razon social / RUC para los Select2 de asesorias y
+    capacitaciones. Responde en el formato de Select2: {"results": [...]}.
+    """
+    query, limit = _parametros_autocompletado(request)
+    if len(query) < 2:
+        return JsonResponse({"results": []})
+    return _respuesta_select2(buscar_empresas(query, limit=limit))
+
+
+def _parametros_autocompletado(request):
+    query = request.GET.get("q", "").strip()
+    try:
+        limit = min(max(int(request.GET.get("limit", 20)), 1), 50)
+    except ValueError:
+        limit = 20
+    return query, limit
+
+
+def _respuesta_select2(resultados):
+    return JsonResponse({"results": [
+        {"id": item["razon_social"], "text": item["razon_social"], "ruc": item["ruc"]}
+        for item in resultados
+    ]})
 
 
 def success_view(request):
@@ -208,6 +205,15 @@ def custom_404_view(request, exception):
     return render(request, '404.html', status=404)
 
 
+def _resumen_estado(afiliado, ruc, nuevo_estado):
+    return {
+        'razon_social': afiliado.get('razon_social', 'N/A'),
+        'ruc': ruc,
+        'estado_anterior': afiliado.get('estado', 'N/A'),
+        'estado_nuevo': nuevo_estado
+    }
+
+
 @require_http_methods(["GET", "POST"])
 def estado_afiliado_view(request):
     """Consulta y actualiza el estado de un afiliado."""
@@ -221,14 +227,10 @@ def estado_afiliado_view(request):
 
         if afiliado:
             if nuevo_estado:
-                actualizar_estado_afiliado(ruc, nuevo_estado)
+                actualizar_estado_afiliado(ruc, nuevo_estado, afiliado=afiliado)
                 # Guardar info en sesión para mostrarla en success
-                request.session['estado_update'] = {
-                    'razon_social': afiliado.get('razon_social', 'N/A'),
-                    'ruc': ruc,
-                    'estado_anterior': afiliado.get('estado', 'N/A'),
-                    'estado_nuevo': nuevo_estado
-                }
+                request.session['estado_update'] = _resumen_estado(
+                    afiliado, ruc, nuevo_estado)
                 return redirect("forms:success_estado_afiliado")
             context["afiliado"] = afiliado
         else:
@@ -246,47 +248,33 @@ def success_estado_afiliado_view(request):
     return render(request, "success_estado_afiliado.html", context)
 
 
+NUEVO_AFILIADO_CAMPOS = (
+    "razon_social", "ruc", "ciudad", "direccion", "telefono", "email",
+    "representante", "cargo", "genero", "colaboradores", "sector", "tamano",
+    "estado",
+)
+
+
+def _datos_nuevo_afiliado(post):
+    """Payload de ``nuevo_afiliado`` con la fecha de hoy en Guayaquil."""
+    data = {campo: post.get(campo, "").strip() for campo in NUEVO_AFILIADO_CAMPOS}
+    # Fecha actual en zona horaria Guayaquil
+    guayaquil = pytz.timezone("America/Guayaquil")
+    data["fecha_afiliacion"] = now().astimezone(guayaquil).date().isoformat()
+    return data
+
+
 @require_http_methods(["GET", "POST"])
 def nuevo_afiliado_view(request):
     """Formulario para registrar un nuevo afiliado en la hoja BASE DE DATOS."""
-    sectores = _obtener_sectores()
+    sectores = obtener_sectores()
 
     if request.method == "POST":
-        razon_social = request.POST.get("razon_social", "").strip()
-        ruc = request.POST.get("ruc", "").strip()
-        ciudad = request.POST.get("ciudad", "").strip()
-        direccion = request.POST.get("direccion", "").strip()
-        telefono = request.POST.get("telefono", "").strip()
-        email = request.POST.get("email", "").strip()
-        representante = request.POST.get("representante", "").strip()
-        cargo = request.POST.get("cargo", "").strip()
-        genero = request.POST.get("genero", "").strip()
-        colaboradores = request.POST.get("colaboradores", "").strip()
-        sector = request.POST.get("sector", "").strip()
-        tamano = request.POST.get("tamano", "").strip()
-        estado = request.POST.get("estado", "").strip()
-
-        # Fecha actual en zona horaria Guayaquil
-        guayaquil = pytz.timezone("America/Guayaquil")
-        fecha_afiliacion = now().astimezone(guayaquil).date().isoformat()
-
         try:
-            guardar_nuevo_afiliado_en_google_sheets({
-                "razon_social": razon_social,
-                "ruc": ruc,
-                "fecha_afiliacion": fecha_afiliacion,
-                "ciudad": ciudad,
-                "direccion": direccion,
-                "telefono": telefono,
-                "email": email,
-                "representante": representante,
-                "cargo": cargo,
-                "genero": genero,
-                "colaboradores": colaboradores,
-                "sector": sector,
-                "tamano": tamano,
-                "estado": estado,
-            })
+            encolado = outbox.submit(
+                "nuevo_afiliado", _datos_nuevo_afiliado(request.POST), queue="SOCIOS")
+            if not encolado:
+                raise RuntimeError("no se pudo guardar en Google Sheets")
             messages.success(request, "Afiliado registrado correctamente.")
         except Exception as exc:
             messages.error(request, f"Error al registrar: {exc}")
@@ -294,90 +282,115 @@ def nuevo_afiliado_view(request):
     return render(request, "afiliado_form.html", {"sectores": sectores})
 
 
-@require_http_methods(["GET", "POST"])
-def ventas_afiliado_view(request):
-    """Formulario para registrar las ventas de un afiliado (busqueda y envio separados)."""
-    context = {
+def _contexto_ventas(post):
+    """Contexto inicial del formulario de ventas."""
+    return {
         "ventas_data": [_entrada_venta_vacia()],
-        "ruc": request.POST.get("ruc", "").strip(),
-        "registro_ventas": request.POST.get("registro_ventas", "").strip(),
-        "observaciones": request.POST.get("observaciones", "").strip(),
+        "ruc": post.get("ruc", "").strip(),
+        "registro_ventas": post.get("registro_ventas", "").strip(),
+        "observaciones": post.get("observaciones", "").strip(),
         "ventas_previas": [],
         "ventas_previas_years": [],
         "ventas_previas_json": "[]",
     }
 
+
+def _completar_contexto_ventas(context, post, afiliado, ventas_previas):
+    """Agrega al contexto el afiliado encontrado y su historial de ventas."""
+    years_previas = sorted(
+        {v["anio"] for v in ventas_previas if v.get("anio")},
+        reverse=True,
+    )
+    context["afiliado"] = afiliado
+    context["ruc"] = post.get("ruc", "").strip()
+    context["registro_ventas"] = post.get("registro_ventas")
+    context["ventas_data"] = _parsear_bloques_ventas(post) or [_entrada_venta_vacia()]
+    context["observaciones"] = post.get("observaciones", "").strip()
+    context["ventas_previas"] = ventas_previas
+    context["ventas_previas_years"] = years_previas
+    context["ventas_previas_json"] = json.dumps(
+        ventas_previas, ensure_ascii=False)
+
+
+def _registros_ventas(post, afiliado):
+    """
+    Registros a guardar en VENTAS_SOCIO (uno por año declarado). Devuelve
+    ``(registros, error)``; si ``error`` no es None hay que re-renderizar.
+    """
+    ruc = post.get("ruc", "").strip()
+    registro_ventas = post.get("registro_ventas")
+    ventas_bloques = _parsear_bloques_ventas(post)
+    rv_norm = (registro_ventas or "").strip().lower()
+    es_si = rv_norm in {"si", "sí", "s\u00ed", "s"}
+
+    base_data = {
+        "ruc": ruc,
+        "razon_social": afiliado["razon_social"],
+        "ciudad": afiliado["ciudad"],
+        # Enviamos ISO para que Sheets lo interprete como fecha, el formato de visualizacion se manejara en la hoja.
+        "fecha_afiliacion": _to_iso_date(afiliado["fecha_afiliacion"]),
+        "registro_ventas": registro_ventas,
+        "observaciones": post.get("observaciones", "").strip(),
+        "fecha_registro": datetime.now().strftime("%Y-%m-%d %H:%M"),
+    }
+
+    if not es_si:
+        return [{
+            **base_data,
+            "comparativo": "",
+            "ventas_estimadas": "",
+            "anio": str(datetime.now().year),
+        }], None
+
+    if not ventas_bloques:
+        return None, "Agrega al menos un registro de ventas anual."
+
+    registros = []
+    for bloque in ventas_bloques:
+        anio = (bloque.get("anio") or "").strip()
+        if not anio:
+            return None, "Selecciona el anio para cada registro de ventas."
+
+        registros.append({
+            **base_data,
+            "comparativo": bloque.get("comparativo", ""),
+            "ventas_estimadas": bloque.get("ventas_estimadas", ""),
+            "anio": anio,
+        })
+    return registros, None
+
+
+ERROR_VENTAS = "Hubo un error al guardar las ventas. Por favor, intente nuevamente."
+
+
+@require_http_methods(["GET", "POST"])
+def ventas_afiliado_view(request):
+    """Formulario para registrar las ventas de un afiliado (busqueda y envio separados)."""
+    context = _contexto_ventas(request.POST)
+
     if request.method == "POST":
         ruc = request.POST.get("ruc", "").strip()
-        registro_ventas = request.POST.get("registro_ventas")
-        observaciones = request.POST.get("observaciones", "").strip()
-        ventas_bloques = _parsear_bloques_ventas(request.POST)
-
         afiliado = buscar_afiliado_por_ruc_base_datos(ruc)
 
         if afiliado:
-            ventas_previas = obtener_ventas_por_ruc(ruc)
-            years_previas = sorted(
-                {v["anio"] for v in ventas_previas if v.get("anio")},
-                reverse=True,
-            )
-            context["afiliado"] = afiliado
-            context["ruc"] = ruc
-            context["registro_ventas"] = registro_ventas
-            context["ventas_data"] = ventas_bloques or [_entrada_venta_vacia()]
-            context["observaciones"] = observaciones
-            context["ventas_previas"] = ventas_previas
-            context["ventas_previas_years"] = years_previas
-            context["ventas_previas_json"] = json.dumps(
-                ventas_previas, ensure_ascii=False)
+            _completar_contexto_ventas(
+                context, request.POST, afiliado, obtener_ventas_por_ruc(ruc))
 
             # Fase 1: solo se busco por RUC, aun no se responde el formulario
-            if not registro_ventas:
+            if not request.POST.get("registro_ventas"):
                 return render(request, "ventas_afiliado.html", context)
 
             # Fase 2: ya respondio preguntas -> guardar
-            rv_norm = (registro_ventas or "").strip().lower()
-            es_si = rv_norm in {"si", "sí", "s\u00ed", "s"}
-
-            base_data = {
-                "ruc": ruc,
-                "razon_social": afiliado["razon_social"],
-                "ciudad": afiliado["ciudad"],
-                # Enviamos ISO para que Sheets lo interprete como fecha, el formato de visualizacion se manejara en la hoja.
-                "fecha_afiliacion": _to_iso_date(afiliado["fecha_afiliacion"]),
-                "registro_ventas": registro_ventas,
-                "observaciones": observaciones,
-                "fecha_registro": datetime.now().strftime("%Y-%m-%d %H:%M"),
-            }
-
-            if es_si:
-                if not ventas_bloques:
-                    messages.error(
-                        request, "Agrega al menos un registro de ventas anual.")
-                    return render(request, "ventas_afiliado.html", context)
-
-                for bloque in ventas_bloques:
-                    anio = (bloque.get("anio") or "").strip()
-                    if not anio:
-                        messages.error(
-                            request, "Selecciona el anio para cada registro de ventas.")
-                        return render(request, "ventas_afiliado.html", context)
-
-                    data = {
-                        **base_data,
-                        "comparativo": bloque.get("comparativo", ""),
-                        "ventas_estimadas": bloque.get("ventas_estimadas", ""),
-                        "anio": anio,
-                    }
-                    guardar_ventas_afiliado(data)
-            else:
-                data = {
-                    **base_data,
-                    "comparativo": "",
-                    "ventas_estimadas": "",
-                    "anio": str(datetime.now().year),
-                }
-                guardar_ventas_afiliado(data)
+            registros, error = _registros_ventas(request.POST, afiliado)
+            if error:
+                messages.error(request, error)
+                return render(request, "ventas_afiliado.html", context)
+
+            guardado = outbox.submit(
+                "ventas_afiliado_bulk", {"registros": registros}, queue="VENTAS_SOCIO")
+            if not guardado:
+                messages.error(request, ERROR_VENTAS)
+                return render(request, "ventas_afiliado.html", context)
             return redirect("forms:success_ventas_afiliado")
         else:
             context["no_encontrado"] = True
@@ -0,0 +1,72 @@
+"""
+Hooks de gunicorn (se carga solo desde el directorio de trabajo; las opciones
+de linea de comandos del Procfile siguen aplicando).
+
+Cada worker se calienta en ``post_worker_init``, antes de aceptar
+conexiones: autentica con Google y carga indices y listas (ver
+``forms.services.warmup``). La espera maxima es SHEETS_WARMUP_TIMEOUT; si
+Google tarda mas, el worker empieza a atender y el calentamiento sigue en
+segundo plano (``/ready/`` responde 503 hasta que termine).
+
+Con ``--preload`` el master no calienta: un calentamiento que supera el
+plazo sigue en un hilo, y un fork con ese hilo a mitad de una lectura dejaria
+a los workers con locks tomados para siempre. Por si acaso, los modulos con
+locks los reemplazan en el hijo (``os.register_at_fork``).
+
+Los hilos en segundo plano (flusher del outbox y sincronizacion de la copia
+local) se arrancan en cada worker, nunca en el master: asi no se hace fork
+con un hilo a mitad de una escritura ni el master vacia el outbox. Fuera de
+gunicorn el flusher arranca con la primera escritura encolada.
+
+Si SHEETS_METRICS_DIR esta definido, las metricas de Prometheus se escriben
+ahi por worker; el master vacia el directorio al arrancar y descarta los
+archivos de los workers que terminan. El valor se lee de los settings de
+Django (entorno y .env), igual que en los workers.
+"""
+import glob
+import os
+
+
+def _metrics_dir():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "capig_form.settings")
+    from capig_form.services.sheets_metrics import metrics_dir
+
+    return metrics_dir()
+
+
+def on_starting(server):
+    directory = _metrics_dir()
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    # Metricas de una ejecucion anterior.
+    for path in glob.glob(os.path.join(directory, "*.db")):
+        os.remove(path)
+
+
+def child_exit(server, worker):
+    from capig_form.services.sheets_metrics import mark_process_dead
+
+    mark_process_dead(worker.pid)
+
+
+def _warm_up():
+    from forms.services.warmup import warm_up
+
+    return warm_up()
+
+
+def _start_background_threads():
+    from forms.services.outbox import ensure_flusher
+    from forms.services.sheet_mirror import start_scheduler
+
+    # Vacia las escrituras que quedaron pendientes antes del reinicio.
+    ensure_flusher()
+    start_scheduler()
+
+
+def post_worker_init(worker):
+    _start_background_threads()
+    state = _warm_up()
+    worker.log.info("Worker %s calentado: %s (%s)", worker.pid, state["status"],
+                    {paso: info["ok"] for paso, info in state["steps"].items()})